@@ -1,12 +1,8 @@
-import json
-from typing import List, Optional
-import google.generativeai as genai
-from app import config
+import json, hashlib, threading
+from typing import Any, Dict, Iterator, List, Optional, Set
+from app import config, embed_cache, llm
 from app.models import AISummary
 
-# Configure Gemini once
-genai.configure(api_key=config.GEMINI_API_KEY)
-
 SYSTEM_JSON = """You are an executive assistant.
 Return STRICT JSON with keys:
 summary_160 (<=160 chars),
@@ -19,45 +15,30 @@ confidence (0..1).
 Consider explicit deadlines, mentions of the user, and whether the sender is waiting on the user.
 """
 
+# Stored summaries are tagged with this; changing the prompt or model invalidates them.
+SUMMARY_VERSION = hashlib.sha1(f"{config.GEN_MODEL}\n{SYSTEM_JSON}".encode()).hexdigest()[:12]
+
 def embed_batch(texts: List[str]) -> List[List[float]]:
-    vecs = []
-    for t in texts:
-        r = genai.embed_content(model=config.EMBED_MODEL, content=t)
-        vecs.append(r.get("embedding") or r["embedding"])
-    return vecs
-
-def generate_text(prompt: str, temperature: float = 0.2, max_output_tokens: int = 400) -> str:
-    model = genai.GenerativeModel(config.GEN_MODEL)
-    resp = model.generate_content(
-        prompt,
-        generation_config=genai.types.GenerationConfig(
-            temperature=temperature,
-            max_output_tokens=max_output_tokens
-        )
-    )
-    if not resp or not getattr(resp, "text", ""):
-        raise ValueError("LLM returned empty.")
-    return resp.text
-
-def generate_json(prompt: str, temperature: float = 0.2, max_output_tokens: int = 400) -> dict:
-    model = genai.GenerativeModel(config.GEN_MODEL)
-    resp = model.generate_content(
-        prompt,
-        generation_config=genai.types.GenerationConfig(
-            temperature=temperature,
-            max_output_tokens=max_output_tokens,
-            response_mime_type="application/json"
-        )
-    )
-    if not resp or not getattr(resp, "text", ""):
-        raise ValueError("LLM returned empty.")
+    return embed_cache.embed_cached(texts)
+
+def generate_text(prompt: str, temperature: float = 0.2, max_output_tokens: int = 400, site: str = "default") -> str:
+    return llm.generate(prompt, site, temperature=temperature, max_output_tokens=max_output_tokens)
+
+def generate_text_stream(prompt: str, temperature: float = 0.2, max_output_tokens: int = 400,
+                         site: str = "default") -> Iterator[str]:
+    """Like generate_text, but yields text pieces as the model produces them."""
+    return llm.stream(prompt, site, temperature=temperature, max_output_tokens=max_output_tokens)
+
+def generate_json(prompt: str, temperature: float = 0.2, max_output_tokens: int = 400, site: str = "default") -> dict:
+    text = llm.generate(prompt, site, temperature=temperature, max_output_tokens=max_output_tokens, json_mode=True)
     try:
-        return json.loads(resp.text)
+        return json.loads(text)
     except Exception:
-        cleaned = resp.text.strip().strip("`").replace("json\n", "").strip()
+        cleaned = text.strip().strip("`").replace("json\n", "").strip()
         return json.loads(cleaned)
 
-def gemini_summarize(message_text: str, subject: Optional[str], sender: Optional[str]) -> AISummary:
+def gemini_summarize(message_text: str, subject: Optional[str], sender: Optional[str],
+                     site: str = "inbox.summary") -> AISummary:
     prompt = f"""{SYSTEM_JSON}
 
 Message:
@@ -66,9 +47,89 @@ Subject: {subject or ""}
 From: {sender or ""}
 Body: {message_text}
 >>>"""
-    data = generate_json(prompt, temperature=0.2, max_output_tokens=300)
+    data = generate_json(prompt, temperature=0.2, max_output_tokens=300, site=site)
     return AISummary(**data)
 
+# ---------- batched summaries ----------
+# Many emails/tasks per call: SYSTEM_JSON once, then every item tagged with its id. Items
+# the model drops or returns invalid get one more batched try, then a single-item call.
+
+BATCH_JSON = SYSTEM_JSON + """
+You will get several items, each starting with a line "### id: <id>". Summarize each one on its own.
+Return STRICT JSON: {"items": [{"id": "<id>", <the keys above>}]} with exactly one entry per item.
+"""
+OUTPUT_TOKENS_PER_ITEM = 160
+
+_lock = threading.Lock()
+_counters = {"batches": 0, "batched_items": 0, "retried_items": 0, "single_fallbacks": 0, "failed_items": 0}
+
+def _bump(**deltas):
+    with _lock:
+        for k, v in deltas.items():
+            _counters[k] += v
+
+def _block(item: Dict[str, Any]) -> str:
+    return (f"### id: {item['id']}\nSubject: {item.get('subject') or ''}\nFrom: {item.get('sender') or ''}\n"
+            f"Body: {(item.get('text') or '')[:config.SUMMARY_ITEM_CHARS]}\n")
+
+def summary_batches(items: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Pack items ({id, text, subject, sender}) into batches of at most SUMMARY_BATCH items
+    and SUMMARY_BATCH_CHARS of prompt."""
+    out: List[List[Dict[str, Any]]] = []
+    cur, size = [], len(BATCH_JSON)
+    for item in items:
+        n = len(_block(item))
+        if cur and (len(cur) >= max(1, config.SUMMARY_BATCH) or size + n > config.SUMMARY_BATCH_CHARS):
+            out.append(cur)
+            cur, size = [], len(BATCH_JSON)
+        cur.append(item)
+        size += n
+    if cur:
+        out.append(cur)
+    return out
+
+def _parse_batch(data: Any, ids: Set[str]) -> Dict[str, AISummary]:
+    got: Dict[str, AISummary] = {}
+    for row in (data.get("items") if isinstance(data, dict) else data) or []:
+        if not isinstance(row, dict) or str(row.get("id")) not in ids:
+            continue
+        try:
+            got[str(row["id"])] = AISummary(**{k: v for k, v in row.items() if k != "id"})
+        except Exception:
+            continue  # fails validation: retried below
+    return got
+
+def gemini_summarize_batch(items: List[Dict[str, Any]], site: str = "inbox.summary") -> Dict[str, Optional[AISummary]]:
+    """Summaries for one batch (see summary_batches), by item id; None where every attempt failed."""
+    out: Dict[str, Optional[AISummary]] = {}
+    todo = list(items)
+    for attempt in range(2):
+        if len(todo) < 2:
+            break
+        prompt = BATCH_JSON + "\nItems:\n<<<\n" + "\n".join(_block(i) for i in todo) + ">>>"
+        _bump(batches=1, batched_items=len(todo), retried_items=len(todo) if attempt else 0)
+        try:
+            data = generate_json(prompt, temperature=0.2, max_output_tokens=OUTPUT_TOKENS_PER_ITEM * len(todo) + 100,
+                                 site=f"{site}.batch")
+            out.update(_parse_batch(data, {str(i["id"]) for i in todo}))
+        except Exception:
+            pass  # malformed JSON or a failed call: same as every item missing
+        todo = [i for i in todo if str(i["id"]) not in out]
+    for item in todo:
+        _bump(single_fallbacks=1)
+        try:
+            out[str(item["id"])] = gemini_summarize(item.get("text") or "", item.get("subject"), item.get("sender"), site=site)
+        except Exception:
+            _bump(failed_items=1)
+            out[str(item["id"])] = None
+    return out
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        out: Dict[str, Any] = dict(_counters)
+    out["avg_batch_size"] = round(out["batched_items"] / out["batches"], 2) if out["batches"] else None
+    return out
+
 def parse_slack_send(query: str) -> dict:
     """
     Turn a natural instruction like:
@@ -92,4 +153,4 @@ Rules:
 - Put only the final message in 'text' (no extra quotes).
 - If multiple recipients, include them all in targets.
 """
-    return generate_json(prompt, temperature=0, max_output_tokens=200)
+    return generate_json(prompt, temperature=0, max_output_tokens=200, site="slack.parse")
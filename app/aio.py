@@ -0,0 +1,35 @@
+import asyncio, multiprocessing, threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+from starlette.concurrency import run_in_threadpool
+from app import config
+
+_lock = threading.Lock()
+_cpu_pool: Optional[ProcessPoolExecutor] = None
+
+def cpu_pool() -> ProcessPoolExecutor:
+    """Process pool for CPU-heavy steps (PDF/HTML parsing, chunking). Spawned, not forked,
+    so workers don't inherit the server's threads or gRPC state."""
+    global _cpu_pool
+    with _lock:  # first callers can race in from several threads
+        if _cpu_pool is None:
+            _cpu_pool = ProcessPoolExecutor(max_workers=config.CPU_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _cpu_pool
+
+async def run_io(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run blocking I/O (Gemini SDK, Chroma, SQLite) on the threadpool, off the event loop."""
+    return await run_in_threadpool(fn, *args, **kwargs)
+
+async def run_cpu(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a picklable, module-level function in the process pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_pool(), partial(fn, *args, **kwargs))
+
+def shutdown():
+    global _cpu_pool
+    with _lock:
+        pool, _cpu_pool = _cpu_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
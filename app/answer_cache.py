@@ -0,0 +1,94 @@
+import math, operator, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Set
+from app import config
+from app.embed_cache import normalize
+from app.models import KBAnswer
+
+# In-process cache of /kb/query answers, scoped per user. A cached answer is reused when
+#   - the new question is the same text, or its embedding is within ANSWER_CACHE_THRESHOLD
+#     cosine of the cached question's, and
+#   - retrieval picked exactly the same chunk ids (ids are content-addressed, so same text).
+# Any change to a user's documents drops all of that user's entries. Bounded by
+# ANSWER_CACHE_SIZE (LRU) and ANSWER_CACHE_TTL.
+
+class _Entry(NamedTuple):
+    user_id: str
+    text: str
+    vec: Optional[List[float]]   # unit-normalized query embedding; None for lexical-only queries
+    chunk_ids: tuple
+    answer: KBAnswer
+    created: float
+
+_lock = threading.Lock()
+_entries: "OrderedDict[int, _Entry]" = OrderedDict()
+_by_user: Dict[str, Set[int]] = {}
+_next_id = 0
+_counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evicted": 0, "expired": 0, "invalidated": 0}
+
+def _unit(vec: Sequence[float]) -> List[float]:
+    n = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return [x / n for x in vec]
+
+def _drop(eid: int):
+    e = _entries.pop(eid)
+    ids = _by_user.get(e.user_id)
+    if ids is not None:
+        ids.discard(eid)
+        if not ids:
+            del _by_user[e.user_id]
+
+def lookup(user_id: str, q: str, qvec: Optional[Sequence[float]], chunk_ids: Sequence[str]) -> Optional[KBAnswer]:
+    text, ids, now = normalize(q).lower(), tuple(chunk_ids), time.time()
+    unit = _unit(qvec) if qvec is not None else None
+    with _lock:
+        best, best_sim, exact = None, config.ANSWER_CACHE_THRESHOLD, False
+        for eid in list(_by_user.get(user_id, ())):
+            e = _entries[eid]
+            if now - e.created > config.ANSWER_CACHE_TTL:
+                _drop(eid)
+                _counters["expired"] += 1
+                continue
+            if e.chunk_ids != ids:
+                continue
+            if e.text == text:
+                best, exact = eid, True
+                break
+            if unit is not None and e.vec is not None:
+                sim = sum(map(operator.mul, unit, e.vec))
+                if sim >= best_sim:
+                    best, best_sim = eid, sim
+        if best is None:
+            _counters["misses"] += 1
+            return None
+        _entries.move_to_end(best)
+        _counters["exact_hits" if exact else "semantic_hits"] += 1
+        return _entries[best].answer
+
+def put(user_id: str, q: str, qvec: Optional[Sequence[float]], chunk_ids: Sequence[str], answer: KBAnswer):
+    global _next_id
+    entry = _Entry(user_id, normalize(q).lower(), _unit(qvec) if qvec is not None else None,
+                   tuple(chunk_ids), answer, time.time())
+    with _lock:
+        _next_id += 1
+        _entries[_next_id] = entry
+        _by_user.setdefault(user_id, set()).add(_next_id)
+        while len(_entries) > config.ANSWER_CACHE_SIZE:
+            _drop(next(iter(_entries)))
+            _counters["evicted"] += 1
+
+def invalidate(user_id: str):
+    """Called whenever the user's KB documents change."""
+    with _lock:
+        for eid in list(_by_user.get(user_id, ())):
+            _drop(eid)
+            _counters["invalidated"] += 1
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        out: Dict[str, Any] = dict(_counters)
+        out["entries"] = len(_entries)
+    hits = out["exact_hits"] + out["semantic_hits"]
+    lookups = hits + out["misses"]
+    out["hit_rate"] = round(hits / lookups, 4) if lookups else None
+    return out
@@ -0,0 +1,49 @@
+"""
+Import a directory or a zip/tar archive into a user's KB:
+
+    python -m app.bulk_cli ./wiki-export.zip --user-id alice
+
+Interrupt it any time; running the same command again resumes where it stopped. Writes
+straight to the local store, so run it while the server is stopped (or POST the archive to
+/kb/bulk instead).
+"""
+import argparse, sys, time
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.bulk_cli", description="Bulk-import documents into the KB.")
+    ap.add_argument("path", help="directory, .zip, or .tar / .tar.gz archive")
+    ap.add_argument("--user-id", default="demo")
+    ap.add_argument("--every", type=float, default=2.0, help="seconds between progress lines")
+    args = ap.parse_args(argv)
+
+    # imported here, not at the top: pool workers re-import this module on spawn and must
+    # not open the vector store
+    from app import aio, bulk_ingest
+
+    run_id = bulk_ingest.open_path(args.path, args.user_id)
+    last = [0.0]
+
+    def line(r) -> str:
+        return (f"[{r.status}] docs {r.docs_done} new/updated, {r.docs_unchanged} unchanged, {r.docs_failed} failed"
+                f" | chunks {r.chunks_done} | {r.docs_per_sec or 0} docs/s, {r.chunks_per_sec or 0} chunks/s")
+
+    def report(r):
+        if time.monotonic() - last[0] >= args.every:
+            last[0] = time.monotonic()
+            print(line(r), flush=True)
+
+    print(f"run {run_id}: {args.path}", flush=True)
+    try:
+        r = bulk_ingest.run(run_id, report=report)
+    except KeyboardInterrupt:
+        r = bulk_ingest.get(run_id)
+        print("interrupted; run the same command again to resume", file=sys.stderr)
+    finally:
+        aio.shutdown()
+    print(line(r), flush=True)
+    if r.error:
+        print(r.error, file=sys.stderr)
+    return 0 if r.status == "done" else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+import hashlib, os, queue, shutil, tarfile, threading, time, uuid, zipfile
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+from app import ai, aio, chunker, config, db, ingest, kb_store, utils
+from app.chunker import Chunk
+from app.models import BulkIngestRun
+
+# Bulk import of a zip/tar archive or a directory into one user's KB, as a pipeline:
+#   read:   members are streamed out of the archive one at a time into a scratch file
+#   parse:  parse + chunk in the process pool, up to BULK_PARSE_AHEAD members in flight
+#   store:  fresh chunks from consecutive documents are buffered and written BULK_BATCH at
+#           a time (one embed call, one kb_store.add), so small documents don't each pay
+#           for a round trip; a document is registered once all its chunks are stored
+# Every finished member is recorded, so an interrupted run resumes with the next one. Doc
+# ids are derived from (run, member), which lets a resumed document reuse whatever chunks
+# of it were already stored. Sources are member paths, so importing a newer export of the
+# same tree updates documents in place and skips unchanged ones.
+
+EXTENSIONS = (".pdf", ".txt", ".md", ".markdown", ".rst", ".html", ".htm")
+TERMINAL = ("done", "failed")
+BULK_DIR = os.path.join(config.DATA_DIR, "bulk")
+
+_lock = threading.Lock()
+_q: "queue.Queue[str]" = queue.Queue()
+_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+_conn = db.connect("bulk.sqlite3")
+_conn.execute("""CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    docs_done INTEGER NOT NULL DEFAULT 0,
+    docs_unchanged INTEGER NOT NULL DEFAULT 0,
+    docs_failed INTEGER NOT NULL DEFAULT 0,
+    chunks_done INTEGER NOT NULL DEFAULT 0,
+    elapsed_ms INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL
+)""")
+_conn.execute("""CREATE TABLE IF NOT EXISTS members (
+    run_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    doc_id TEXT,
+    chunks INTEGER,
+    error TEXT,
+    PRIMARY KEY (run_id, name)
+)""")
+
+def _run_dir(run_id: str) -> str:
+    return os.path.join(BULK_DIR, run_id)
+
+def _row(run_id: str) -> Optional[Dict[str, Any]]:
+    with _lock:
+        cur = _conn.execute("SELECT * FROM runs WHERE id=?", (run_id,))
+        row = cur.fetchone()
+        cols = [c[0] for c in cur.description]
+    return dict(zip(cols, row)) if row else None
+
+def _update(run_id: str, **fields):
+    fields["updated_at"] = utils.now_ms()
+    cols = ", ".join(f"{k}=?" for k in fields)
+    with _lock:
+        _conn.execute(f"UPDATE runs SET {cols} WHERE id=?", (*fields.values(), run_id))
+
+def _insert(run_id: str, kind: str, user_id: str, source: str, path: str):
+    now = utils.now_ms()
+    with _lock:
+        _conn.execute("INSERT OR IGNORE INTO runs(id, kind, user_id, source, path, status, created_at, updated_at) "
+                      "VALUES (?,?,?,?,?,?,?,?)", (run_id, kind, user_id, source, path, "queued", now, now))
+
+def _finished(run_id: str) -> Set[str]:
+    with _lock:
+        return {r[0] for r in _conn.execute("SELECT name FROM members WHERE run_id=?", (run_id,))}
+
+# ---------- members ----------
+def _wanted(name: str) -> bool:
+    base = os.path.basename(name.rstrip("/"))
+    return (name.lower().endswith(EXTENSIONS) and not base.startswith(".")
+            and not name.startswith("__MACOSX/"))
+
+def _spool(fileobj, scratch: str, seq: int, name: str) -> str:
+    # scratch names are ours; archive member paths never touch the filesystem
+    path = os.path.join(scratch, f"{seq:06d}{os.path.splitext(name)[1].lower()}")
+    with open(path, "wb") as f:
+        shutil.copyfileobj(fileobj, f, 1 << 20)
+    return path
+
+def members(path: str, scratch: str, skip: Set[str]) -> Iterator[Tuple[str, str, bool]]:
+    """(member name, file to parse, is a scratch copy) for each importable member not in `skip`,
+    read lazily so at most the in-flight members are on disk at once."""
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for fn in sorted(files):
+                full = os.path.join(root, fn)
+                name = os.path.relpath(full, path).replace(os.sep, "/")
+                if _wanted(name) and name not in skip:
+                    yield name, full, False
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for seq, info in enumerate(zf.infolist()):
+                if not info.is_dir() and _wanted(info.filename) and info.filename not in skip:
+                    with zf.open(info) as src:
+                        yield info.filename, _spool(src, scratch, seq, info.filename), True
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path, "r|*") as tf:  # stream mode: one forward pass, gz/bz2/xz included
+            for seq, info in enumerate(tf):
+                if info.isfile() and _wanted(info.name) and info.name not in skip:
+                    yield info.name, _spool(tf.extractfile(info), scratch, seq, info.name), True
+    else:
+        raise ValueError("Expected a directory, a .zip, or a .tar / .tar.gz archive.")
+
+# ---------- store stage ----------
+class _Batcher:
+    """
+    Buffers fresh chunks across documents and writes them BULK_BATCH at a time. Each buffered
+    document holds its ingest.doc_lock until it is finished (registered in kb_docs), so a
+    concurrent upload of the same source waits for it.
+    """
+    def __init__(self, run_id: str, user_id: str):
+        self.run_id, self.user_id = run_id, user_id
+        self.buf: List[Tuple[int, int]] = []          # (doc seq, chunk index)
+        self.docs: Dict[int, Tuple[str, ingest.Plan, List[Chunk], threading.Lock]] = {}
+        self.left: Dict[int, int] = {}
+        self.seq = 0
+
+    def holds(self, name: Optional[str] = None, digest: Optional[str] = None) -> bool:
+        """Whether a buffered (not yet registered) document has this source or content."""
+        return any(n == name or p.digest == digest for n, p, _, _ in self.docs.values())
+
+    def add(self, name: str, p: ingest.Plan, chunks: List[Chunk], lock: threading.Lock):
+        """Takes over `lock`: released once the document is finished, or by abandon()."""
+        self.seq += 1
+        self.docs[self.seq] = (name, p, chunks, lock)
+        self.left[self.seq] = len(p.fresh)
+        ingest.refresh_kept(p)
+        if not p.fresh:  # everything already stored (a resumed document)
+            self._complete(self.seq)
+            return
+        self.buf.extend((self.seq, i) for i in p.fresh)
+        self.flush(final=False)
+
+    def _complete(self, d: int):
+        name, p, chunks, lock = self.docs.pop(d)
+        del self.left[d]
+        try:
+            _done(self.run_id, name, "done", p.doc_id, len(chunks), finish=(p, len(chunks)))
+        finally:
+            lock.release()
+
+    def abandon(self):
+        """Drop buffered documents without registering them (they are redone on resume)."""
+        for _, _, _, lock in self.docs.values():
+            lock.release()
+        self.docs.clear()
+        self.left.clear()
+        self.buf = []
+
+    def flush(self, final: bool):
+        size = max(1, config.BULK_BATCH)
+        while len(self.buf) >= size or (final and self.buf):
+            part, self.buf = self.buf[:size], self.buf[size:]
+            texts = [self.docs[d][2][i].text for d, i in part]
+            kb_store.add(self.user_id, [self.docs[d][1].ids[i] for d, i in part], texts,
+                         [self.docs[d][1].metas[i] for d, i in part], ai.embed_batch(texts))
+            for d, _ in part:
+                self.left[d] -= 1
+            for d in [d for d in self.left if self.left[d] == 0]:
+                self._complete(d)
+
+def _done(run_id: str, name: str, status: str, doc_id: Optional[str] = None, chunks: int = 0,
+          error: Optional[str] = None, finish: Optional[Tuple[ingest.Plan, int]] = None):
+    if finish:
+        ingest.finish(*finish)
+    col = {"done": "docs_done", "unchanged": "docs_unchanged", "failed": "docs_failed"}[status]
+    with _lock:
+        _conn.execute("INSERT OR REPLACE INTO members(run_id, name, status, doc_id, chunks, error) VALUES (?,?,?,?,?,?)",
+                      (run_id, name, status, doc_id, chunks, error))
+        _conn.execute(f"UPDATE runs SET {col}={col}+1, chunks_done=chunks_done+? WHERE id=?",
+                      (chunks if status == "done" else 0, run_id))
+
+# ---------- run ----------
+def run(run_id: str, stop: Optional[threading.Event] = None,
+        report: Optional[Callable[[BulkIngestRun], None]] = None) -> Optional[BulkIngestRun]:
+    """Import (or resume) a run, blocking. Stops between members when `stop` is set, leaving
+    the run queued; `report` gets the run's progress after every member."""
+    row = _row(run_id)
+    if not row or row["status"] == "done":
+        return get(run_id)
+    user_id = row["user_id"]
+    scratch = os.path.join(_run_dir(run_id), "work")
+    shutil.rmtree(scratch, ignore_errors=True)
+    os.makedirs(scratch, exist_ok=True)
+    _update(run_id, status="running", error=None)
+    pool = aio.cpu_pool()
+    ahead = config.BULK_PARSE_AHEAD or 2 * config.CPU_WORKERS
+    pending: Deque[Tuple[str, Future, Optional[str]]] = deque()
+    batch = _Batcher(run_id, user_id)
+    clock = [time.monotonic()]
+
+    def tick():
+        now = time.monotonic()
+        with _lock:
+            _conn.execute("UPDATE runs SET elapsed_ms=elapsed_ms+?, updated_at=? WHERE id=?",
+                          (int((now - clock[0]) * 1000), utils.now_ms(), run_id))
+        clock[0] = now
+        if report:
+            report(get(run_id))
+
+    def _plan(name: str, chunks: List[Chunk]) -> ingest.Plan:
+        return ingest.plan(chunks, os.path.basename(name), user_id, source=name,
+                           doc_id=str(uuid.uuid5(uuid.NAMESPACE_URL, f"{run_id}/{name}")))
+
+    def take():
+        name, fut, tmp = pending.popleft()
+        try:
+            chunks, err = fut.result(), "No text extracted."
+        except Exception as e:
+            chunks, err = [], f"parse failed: {e}"
+        finally:
+            if tmp:
+                os.remove(tmp)
+        if not chunks:
+            _done(run_id, name, "failed", error=err)
+        else:
+            if batch.holds(name=name):  # a repeated member name: finish the earlier one first
+                batch.flush(final=True)
+            lock = ingest.doc_lock(user_id, name)
+            lock.acquire()  # held through finish, so plan() and the kb_docs entry can't race an upload
+            owned = True
+            try:
+                p = _plan(name, chunks)
+                if batch.holds(digest=p.digest):
+                    # identical content earlier in this run, not registered yet: register it,
+                    # then plan again so this member dedups against it
+                    batch.flush(final=True)
+                    p = _plan(name, chunks)
+                if p.same:
+                    _done(run_id, name, "unchanged", p.doc_id, finish=(p, len(chunks)))
+                else:
+                    owned = False
+                    batch.add(name, p, chunks, lock)
+            finally:
+                if owned:
+                    lock.release()
+        tick()
+
+    stopped = False
+    try:
+        for name, src, temp in members(row["path"], scratch, _finished(run_id)):
+            pending.append((name, pool.submit(chunker.chunk_file, src, name, False), src if temp else None))
+            while len(pending) >= ahead:
+                take()
+            if stop is not None and stop.is_set():
+                stopped = True
+                break
+        while pending and not stopped:
+            take()
+        if not stopped:
+            batch.flush(final=True)
+            tick()
+        # documents still buffered on a stop were not recorded, so they are redone on resume
+        _update(run_id, status="queued" if stopped else "done")
+        if not stopped:
+            shutil.rmtree(_run_dir(run_id), ignore_errors=True)  # uploaded archive + scratch
+    except KeyboardInterrupt:
+        _update(run_id, status="queued")
+        raise
+    except Exception as e:
+        _update(run_id, status="failed", error=str(e))
+    finally:
+        for _, fut, _ in pending:
+            fut.cancel()
+        batch.abandon()
+        shutil.rmtree(scratch, ignore_errors=True)
+    return get(run_id)
+
+# ---------- submit ----------
+def submit_upload(fileobj, filename: str, user_id: str) -> str:
+    """Spool an uploaded archive and queue it for the background runner (blocking)."""
+    run_id = str(uuid.uuid4())
+    os.makedirs(_run_dir(run_id), exist_ok=True)
+    path = os.path.join(_run_dir(run_id), "archive")
+    with open(path, "wb") as f:
+        shutil.copyfileobj(fileobj, f, 1 << 20)
+    if not (zipfile.is_zipfile(path) or tarfile.is_tarfile(path)):
+        shutil.rmtree(_run_dir(run_id), ignore_errors=True)
+        raise ValueError("Expected a .zip or a .tar / .tar.gz archive.")
+    _insert(run_id, "upload", user_id, filename or "archive", path)
+    _q.put(run_id)
+    return run_id
+
+def open_path(path: str, user_id: str) -> str:
+    """Run id for importing a local directory or archive. The same path (unchanged, for an
+    archive) maps to the same run: an unfinished one resumes, a finished one starts over
+    (documents that didn't change are skipped)."""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    ident = f"{path}\x1f{user_id}" if os.path.isdir(path) else f"{path}\x1f{user_id}\x1f{st.st_size}\x1f{st.st_mtime_ns}"
+    run_id = hashlib.sha1(ident.encode("utf-8")).hexdigest()[:32]
+    _insert(run_id, "path", user_id, path, path)
+    with _lock:
+        if _conn.execute("SELECT status FROM runs WHERE id=?", (run_id,)).fetchone()[0] == "done":
+            _conn.execute("DELETE FROM members WHERE run_id=?", (run_id,))
+            _conn.execute("UPDATE runs SET status='queued', docs_done=0, docs_unchanged=0, docs_failed=0, "
+                          "chunks_done=0, elapsed_ms=0, updated_at=? WHERE id=?", (utils.now_ms(), run_id))
+    return run_id
+
+def resume(run_id: str) -> bool:
+    """Re-queue a failed or stopped upload run; False if there's nothing left to resume."""
+    row = _row(run_id)
+    if not row or row["kind"] != "upload" or row["status"] == "done" or not os.path.exists(row["path"]):
+        return False
+    _q.put(run_id)
+    return True
+
+# ---------- background runner (uploads) ----------
+def _runner():
+    while not _stop.is_set():
+        try:
+            run_id = _q.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        row = _row(run_id)
+        if row and row["status"] != "done":  # failed runs only get here through resume()
+            run(run_id, stop=_stop)
+
+def start():
+    global _thread
+    if _thread is not None:
+        return
+    _stop.clear()
+    with _lock:
+        rows = _conn.execute("SELECT id FROM runs WHERE kind='upload' AND status NOT IN (?, ?) ORDER BY created_at",
+                             TERMINAL).fetchall()
+    for (run_id,) in rows:
+        _q.put(run_id)
+    _thread = threading.Thread(target=_runner, name="bulk-ingest", daemon=True)
+    _thread.start()
+
+def stop():
+    _stop.set()
+
+# ---------- status ----------
+def get(run_id: str) -> Optional[BulkIngestRun]:
+    row = _row(run_id)
+    if not row:
+        return None
+    secs = row["elapsed_ms"] / 1000.0
+    docs = row["docs_done"] + row["docs_unchanged"]
+    return BulkIngestRun(
+        run_id=row["id"],
+        status=row["status"],
+        source=row["source"],
+        docs_done=row["docs_done"],
+        docs_unchanged=row["docs_unchanged"],
+        docs_failed=row["docs_failed"],
+        chunks_done=row["chunks_done"],
+        docs_per_sec=round(docs / secs, 2) if secs > 0 else None,
+        chunks_per_sec=round(row["chunks_done"] / secs, 2) if secs > 0 else None,
+        error=row["error"],
+        created_at=row["created_at"],
+        updated_at=row["updated_at"],
+    )
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        by_status = dict(_conn.execute("SELECT status, COUNT(*) FROM runs GROUP BY status").fetchall())
+    return {"by_status": by_status, "queue": _q.qsize()}
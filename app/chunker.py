@@ -0,0 +1,141 @@
+import os, re
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Tuple
+from app import utils
+
+CHUNKER = os.getenv("CHUNKER", "sentence")                         # "sentence" | "fixed"
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "300"))       # ~1200 chars of English
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+
+class Chunk(NamedTuple):
+    text: str
+    start: int   # character offsets into the concatenated input stream
+    end: int
+
+def approx_tokens(s: str) -> int:
+    """~4 chars/token for Gemini-family tokenizers on English; cheap and monotonic."""
+    return (len(s) + 3) // 4
+
+class Chunker:
+    def chunks(self, stream: Iterable[str]) -> Iterator[Chunk]:
+        raise NotImplementedError
+
+class FixedChunker(Chunker):
+    """The original fixed window (size chars, overlap chars), fed from a stream."""
+    def __init__(self, size: int = 1200, overlap: int = 200):
+        self.size, self.overlap = size, overlap
+
+    def chunks(self, stream: Iterable[str]) -> Iterator[Chunk]:
+        buf, base = "", 0
+        for piece in stream:
+            buf += piece
+            while len(buf) >= self.size + 1:
+                text = buf[:self.size]
+                if text.strip():
+                    yield Chunk(text, base, base + self.size)
+                step = self.size - self.overlap
+                buf, base = buf[step:], base + step
+        if buf.strip():
+            yield Chunk(buf, base, base + len(buf))
+
+# paragraph breaks, or sentence-ending punctuation (plus closing quotes/brackets) followed by space
+_BOUNDARY = re.compile(r"\n\s*\n|(?<=[.!?])[\"')\]]*\s+")
+
+class SentenceChunker(Chunker):
+    """
+    Packs whole sentences/paragraphs into chunks of at most `max_tokens`, carrying the last
+    ~`overlap_tokens` worth of sentences into the next chunk. Single pass over the stream:
+    only the unfinished tail sentence and the chunk being built are buffered.
+    """
+    def __init__(self, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                 count_tokens: Callable[[str], int] = approx_tokens):
+        self.max_tokens = max(1, max_tokens)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+        self.count = count_tokens
+        # hard cap for boundary-free text, so the tail buffer can't grow without bound
+        self._max_chars = self.max_tokens * 8
+
+    def _segments(self, stream: Iterable[str]) -> Iterator[Tuple[int, int, str]]:
+        buf, base = "", 0
+        for piece in stream:
+            buf += piece
+            pos = 0
+            for m in _BOUNDARY.finditer(buf):
+                if m.end() == len(buf):  # more whitespace may follow in the next piece
+                    break
+                yield base + pos, base + m.end(), buf[pos:m.end()]
+                pos = m.end()
+            while len(buf) - pos > self._max_chars:
+                cut = pos + self._max_chars
+                ws = buf.rfind(" ", pos, cut)
+                cut = ws + 1 if ws > pos else cut
+                yield base + pos, base + cut, buf[pos:cut]
+                pos = cut
+            buf, base = buf[pos:], base + pos
+        if buf:
+            yield base, base + len(buf), buf
+
+    def _split_long(self, start: int, text: str) -> Iterator[Chunk]:
+        # a single sentence over budget: cut at whitespace near the char budget
+        limit = max(1, self.max_tokens * 4)
+        pos = 0
+        while pos < len(text):
+            cut = min(len(text), pos + limit)
+            if cut < len(text):
+                ws = text.rfind(" ", pos, cut)
+                cut = ws + 1 if ws > pos else cut
+            yield from self._emit([(start + pos, start + cut, text[pos:cut])])
+            pos = cut
+
+    @staticmethod
+    def _emit(segs: List[Tuple[int, int, str]]) -> Iterator[Chunk]:
+        raw = "".join(s[2] for s in segs)
+        text = raw.strip()
+        if text:
+            lead = len(raw) - len(raw.lstrip())
+            start = segs[0][0] + lead
+            yield Chunk(text, start, start + len(text))
+
+    def chunks(self, stream: Iterable[str]) -> Iterator[Chunk]:
+        cur: List[Tuple[int, int, str, int]] = []
+        cur_tokens = 0
+        for start, end, text in self._segments(stream):
+            n = self.count(text)
+            if n > self.max_tokens:
+                if cur:
+                    yield from self._emit([c[:3] for c in cur])
+                    cur, cur_tokens = [], 0
+                yield from self._split_long(start, text)
+                continue
+            if cur and cur_tokens + n > self.max_tokens:
+                yield from self._emit([c[:3] for c in cur])
+                # carry trailing sentences as overlap
+                keep, kept = [], 0
+                for c in reversed(cur):
+                    if kept + c[3] > self.overlap_tokens:
+                        break
+                    keep.append(c); kept += c[3]
+                keep.reverse()
+                while keep and kept + n > self.max_tokens:
+                    kept -= keep.pop(0)[3]
+                cur, cur_tokens = keep, kept
+            cur.append((start, end, text, n))
+            cur_tokens += n
+        if cur:
+            yield from self._emit([c[:3] for c in cur])
+
+def get_chunker() -> Chunker:
+    if CHUNKER == "fixed":
+        return FixedChunker()
+    return SentenceChunker()
+
+def chunk_stream(stream: Iterable[str]) -> Iterator[Chunk]:
+    return get_chunker().chunks(stream)
+
+def chunk_file(path: str, filename: str, parallel: bool = True) -> List[Chunk]:
+    """Stream extracted text (PDF pages / text blocks) straight into the chunker. Module-level
+    so bulk imports can run it in the CPU process pool (with parallel=False)."""
+    return list(chunk_stream(utils.iter_file_text(path, filename, parallel)))
+
+def chunk_text(text: str) -> List[Chunk]:
+    """Module-level (picklable) entry point for the CPU process pool."""
+    return list(chunk_stream([text]))
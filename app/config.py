@@ -5,22 +5,83 @@ load_dotenv()
 APP_TITLE = "WorkInFlow (Gmail + Personal KB)"
 APP_VERSION = "1.0"
 
+# Local state (caches, job queues, indexes)
+DATA_DIR = os.getenv("DATA_DIR", "./data")
+
 # Gemini
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     raise RuntimeError("Set GEMINI_API_KEY in your environment (or .env).")
 GEN_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
 EMBED_MODEL = os.getenv("GEMBED_MODEL", "models/text-embedding-004")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))     # batchEmbedContents max is 100
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_RPM = float(os.getenv("EMBED_RPM", "1500"))                 # requests/minute budget
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+EMBED_CACHE_LRU_SIZE = int(os.getenv("EMBED_CACHE_LRU_SIZE", "10000"))    # in-process tier
+EMBED_CACHE_MAX_ROWS = int(os.getenv("EMBED_CACHE_MAX_ROWS", "500000"))    # on-disk tier
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))         # generate calls in flight, process-wide
+LLM_RPM = float(os.getenv("LLM_RPM", "600"))                      # generate requests/minute budget
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))          # on 429 / 5xx
+SUMMARY_BATCH = int(os.getenv("SUMMARY_BATCH", "10"))             # emails/tasks per summary call; 1 = no batching
+SUMMARY_BATCH_CHARS = int(os.getenv("SUMMARY_BATCH_CHARS", "24000"))  # prompt budget per batch (~4 chars/token)
+SUMMARY_ITEM_CHARS = int(os.getenv("SUMMARY_ITEM_CHARS", "3000"))     # each item's body is cut to this
+TRIAGE = os.getenv("TRIAGE", "true").lower() == "true"                # local pre-classifier before the LLM
+TRIAGE_THRESHOLD = float(os.getenv("TRIAGE_THRESHOLD", "0.85"))       # P(low-value) needed to skip the LLM
+TRIAGE_MODEL = os.getenv("TRIAGE_MODEL", "true").lower() == "true"    # use weights from /gmail/triage/train
+TRIAGE_MIN_EXAMPLES = int(os.getenv("TRIAGE_MIN_EXAMPLES", "200"))    # LLM-labelled mail needed to train
+TRIAGE_MAX_EXAMPLES = int(os.getenv("TRIAGE_MAX_EXAMPLES", "5000"))   # newest examples kept
+
+# CPU process pool (PDF/HTML parsing, chunking)
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+# Background ingestion jobs (/kb/jobs/*)
+INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", "2"))   # fetch/parse/chunk stage
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "2"))   # embed/store stage
+INGEST_BATCH = int(os.getenv("INGEST_BATCH", "64"))                   # chunks per checkpoint
+
+# Bulk import of archives / directories (/kb/bulk, python -m app.bulk_cli)
+BULK_BATCH = int(os.getenv("BULK_BATCH", "512"))              # chunks per embed call + kb_store write, across docs
+BULK_PARSE_AHEAD = int(os.getenv("BULK_PARSE_AHEAD", "0"))    # members parsing at once; 0 = 2 x CPU_WORKERS
+
+# KB link fetching (/kb/link, /kb/link/bulk, URL jobs)
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "15"))
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(5 << 20)))      # larger pages are refused
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "16"))          # in-flight fetches overall
+FETCH_PER_HOST = int(os.getenv("FETCH_PER_HOST", "4"))                 # in-flight fetches per host
+FETCH_CACHE_MAX_ROWS = int(os.getenv("FETCH_CACHE_MAX_ROWS", "5000"))  # cached pages (ETag/Last-Modified)
+FETCH_BULK_MAX = int(os.getenv("FETCH_BULK_MAX", "500"))               # URLs per /kb/link/bulk call
 
 # Gmail
 SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
 GOOGLE_CREDENTIALS_FILE = os.getenv("GOOGLE_CREDENTIALS_FILE", "credentials.json")
 GOOGLE_TOKEN_FILE = os.getenv("GOOGLE_TOKEN_FILE", "token.json")
+INBOX_SUMMARY_WORKERS = int(os.getenv("INBOX_SUMMARY_WORKERS", "8"))  # concurrent LLM summaries
+# Background sync: serve /gmail/recent from a local index kept fresh via users.history.list
+GMAIL_SYNC = os.getenv("GMAIL_SYNC", "false").lower() == "true"
+GMAIL_SYNC_INTERVAL = float(os.getenv("GMAIL_SYNC_INTERVAL", "60"))   # seconds between delta pulls
+GMAIL_SYNC_DEPTH = int(os.getenv("GMAIL_SYNC_DEPTH", "100"))          # messages seeded on a full sync
+GMAIL_SYNC_KEEP = int(os.getenv("GMAIL_SYNC_KEEP", "2000"))           # newest messages kept locally
 
 # Chroma
-CHROMA_PERSIST = os.getenv("CHROMA_PERSIST", "false").lower() == "true"
+CHROMA_PERSIST = os.getenv("CHROMA_PERSIST", "true").lower() == "true"
 CHROMA_DIR = os.getenv("CHROMA_DIR", "./chroma")
-KB_COLLECTION = os.getenv("KB_COLLECTION", "knowledge_base")
+KB_COLLECTION = os.getenv("KB_COLLECTION", "knowledge_base")   # shard name prefix
+KB_BACKEND = os.getenv("KB_BACKEND", "chroma")                 # key into kb_store.BACKENDS
+KB_SHARDS = int(os.getenv("KB_SHARDS", "0"))                   # 0 = one shard per user, N = hash users into N
+KB_OPEN_SHARDS = int(os.getenv("KB_OPEN_SHARDS", "64"))        # shard handles kept open (LRU)
+KB_MEMORY_LIMIT_MB = int(os.getenv("KB_MEMORY_LIMIT_MB", "0")) # persistent Chroma index cache cap, 0 = unbounded
+KB_RETRIEVAL = os.getenv("KB_RETRIEVAL", "hybrid")   # default /kb/query mode: hybrid | vector | lexical
+KB_RRF_K = int(os.getenv("KB_RRF_K", "60"))          # reciprocal-rank fusion damping constant
+# /kb/query answer cache: reuse an answer for a near-identical question over the same chunks
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))               # entries, LRU
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))               # seconds
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))   # min query cosine
+# /kb/flashcards map-reduce: sections are generated in parallel, then merged down to n cards
+FLASHCARD_SECTION_CHARS = int(os.getenv("FLASHCARD_SECTION_CHARS", "8000"))   # minimum section size
+FLASHCARD_MAX_SECTIONS = int(os.getenv("FLASHCARD_MAX_SECTIONS", "12"))       # larger docs get larger sections
+FLASHCARD_WORKERS = int(os.getenv("FLASHCARD_WORKERS", "4"))
+FLASHCARD_DEADLINE = float(os.getenv("FLASHCARD_DEADLINE", "30"))             # seconds for the map step
 
 # CORS
 ALLOWED_ORIGINS = os.getenv(
@@ -32,3 +93,7 @@ ALLOWED_ORIGINS = os.getenv(
 JIRA_BASE_URL = os.getenv("JIRA_BASE_URL")  # e.g., https://your-domain.atlassian.net
 JIRA_EMAIL = os.getenv("JIRA_EMAIL")
 JIRA_API_TOKEN = os.getenv("JIRA_API_TOKEN")
+JIRA_SEARCH_PATH = os.getenv("JIRA_SEARCH_PATH", "/rest/api/3/search")  # or /rest/api/3/search/jql
+JIRA_PAGE_SIZE = int(os.getenv("JIRA_PAGE_SIZE", "50"))
+PM_ENRICH_WORKERS = int(os.getenv("PM_ENRICH_WORKERS", "8"))        # concurrent task summaries
+PM_ENRICH_DEADLINE = float(os.getenv("PM_ENRICH_DEADLINE", "10"))   # seconds per /pm/tasks request
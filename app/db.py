@@ -0,0 +1,14 @@
+import os, sqlite3
+from app import config
+
+def connect(filename: str, directory: str = None) -> sqlite3.Connection:
+    """
+    Open a SQLite file under DATA_DIR (or `directory`) for shared use across threads.
+    Callers serialize access with their own lock; WAL keeps readers off the writer's back.
+    """
+    directory = directory or config.DATA_DIR
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(directory, filename), check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
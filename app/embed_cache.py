@@ -0,0 +1,120 @@
+import hashlib, threading, time
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any
+from app import config, db, embedder
+
+# Two tiers keyed by sha256(EMBED_MODEL, normalized text):
+#   - in-process LRU (EMBED_CACHE_LRU_SIZE entries)
+#   - SQLite file under DATA_DIR that survives restarts (EMBED_CACHE_MAX_ROWS rows, LRU by last_used)
+
+_lock = threading.Lock()
+_lru: "OrderedDict[str, List[float]]" = OrderedDict()
+_counters = {"lru_hits": 0, "disk_hits": 0, "misses": 0, "evicted": 0}
+
+_conn = db.connect("embed_cache.sqlite3")
+_conn.execute("""CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    vec BLOB NOT NULL,
+    last_used INTEGER NOT NULL
+)""")
+_conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+_rows = _conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+def normalize(text: str) -> str:
+    return " ".join((text or "").split())
+
+def cache_key(text: str, model: str = None) -> str:
+    model = model or config.EMBED_MODEL
+    return hashlib.sha256(f"{model}\0{normalize(text)}".encode("utf-8")).hexdigest()
+
+def _pack(vec: List[float]) -> bytes:
+    return array("f", vec).tobytes()
+
+def _unpack(blob: bytes) -> List[float]:
+    a = array("f"); a.frombytes(blob)
+    return a.tolist()
+
+def _lru_put(key: str, vec: List[float]):
+    _lru[key] = vec
+    _lru.move_to_end(key)
+    while len(_lru) > config.EMBED_CACHE_LRU_SIZE:
+        _lru.popitem(last=False)
+
+def get_many(texts: List[str]) -> List[Optional[List[float]]]:
+    keys = [cache_key(t) for t in texts]
+    out: List[Optional[List[float]]] = [None] * len(keys)
+    with _lock:
+        missing = {}
+        for i, k in enumerate(keys):
+            vec = _lru.get(k)
+            if vec is not None:
+                _lru.move_to_end(k)
+                out[i] = vec
+                _counters["lru_hits"] += 1
+            else:
+                missing.setdefault(k, []).append(i)
+        if missing:
+            found = {}
+            ks = list(missing)
+            for j in range(0, len(ks), 500):  # stay under SQLite's host-parameter limit
+                part = ks[j:j + 500]
+                q = f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(part))})"
+                found.update({k: _unpack(v) for k, v in _conn.execute(q, part)})
+            if found:
+                now = int(time.time())
+                _conn.executemany("UPDATE embeddings SET last_used=? WHERE key=?", [(now, k) for k in found])
+            for k, idxs in missing.items():
+                vec = found.get(k)
+                if vec is None:
+                    _counters["misses"] += len(idxs)
+                    continue
+                _lru_put(k, vec)
+                _counters["disk_hits"] += len(idxs)
+                for i in idxs:
+                    out[i] = vec
+    return out
+
+def put_many(texts: List[str], vecs: List[List[float]]):
+    global _rows
+    now = int(time.time())
+    rows = [(cache_key(t), config.EMBED_MODEL, _pack(v), now) for t, v in zip(texts, vecs)]
+    with _lock:
+        for (k, _m, _b, _t), v in zip(rows, vecs):
+            _lru_put(k, v)
+        before = _conn.total_changes
+        _conn.executemany("INSERT OR IGNORE INTO embeddings(key, model, vec, last_used) VALUES (?,?,?,?)", rows)
+        _rows += _conn.total_changes - before
+        if _rows > config.EMBED_CACHE_MAX_ROWS:
+            # evict down to 90% of the cap in one pass
+            drop = _rows - int(config.EMBED_CACHE_MAX_ROWS * 0.9)
+            _conn.execute("DELETE FROM embeddings WHERE key IN "
+                          "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (drop,))
+            _counters["evicted"] += drop
+            _rows -= drop
+
+def embed_cached(texts: List[str]) -> List[List[float]]:
+    """Embed `texts`, only sending cache misses (deduplicated) to the provider."""
+    vecs = get_many(texts)
+    pending: Dict[str, List[int]] = {}
+    for i, v in enumerate(vecs):
+        if v is None:
+            pending.setdefault(cache_key(texts[i]), []).append(i)
+    if pending:
+        firsts = [idxs[0] for idxs in pending.values()]
+        fresh, _report = embedder.embed_texts([texts[i] for i in firsts])
+        put_many([texts[i] for i in firsts], fresh)
+        for idxs, v in zip(pending.values(), fresh):
+            for i in idxs:
+                vecs[i] = v
+    return vecs  # type: ignore[return-value]
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        out: Dict[str, Any] = dict(_counters)
+        out["lru_entries"] = len(_lru)
+        out["disk_entries"] = _rows
+    lookups = out["lru_hits"] + out["disk_hits"] + out["misses"]
+    out["hit_rate"] = round((out["lru_hits"] + out["disk_hits"]) / lookups, 4) if lookups else None
+    return out
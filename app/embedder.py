@@ -0,0 +1,84 @@
+import time, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple
+import google.generativeai as genai
+from google.api_core import exceptions as gexc
+from app import config
+from app.ratelimit import TokenBucket
+
+# One bucket + pool per process: every ingest shares the same provider budget.
+_bucket = TokenBucket(rate=config.EMBED_RPM / 60.0, capacity=max(1, config.EMBED_CONCURRENCY))
+_pool = ThreadPoolExecutor(max_workers=max(1, config.EMBED_CONCURRENCY), thread_name_prefix="embed")
+
+_RETRYABLE = (gexc.ResourceExhausted, gexc.ServiceUnavailable, gexc.DeadlineExceeded, gexc.InternalServerError)
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "texts": 0, "retries": 0, "throttled": 0}
+_recent_latency_ms: deque = deque(maxlen=200)
+
+def _batches(texts: List[str], size: int) -> List[Tuple[int, List[str]]]:
+    size = max(1, size)
+    return [(i, texts[i:i + size]) for i in range(0, len(texts), size)]
+
+def _embed_batch_request(batch: List[str]) -> Tuple[List[List[float]], Dict[str, Any]]:
+    attempt, backoff = 0, 1.0
+    while True:
+        _bucket.acquire()
+        t0 = time.perf_counter()
+        try:
+            r = genai.embed_content(model=config.EMBED_MODEL, content=batch)
+        except _RETRYABLE as e:
+            attempt += 1
+            with _stats_lock:
+                _stats["retries"] += 1
+                if isinstance(e, gexc.ResourceExhausted):
+                    _stats["throttled"] += 1
+            if attempt > config.EMBED_MAX_RETRIES:
+                raise
+            # stall the shared bucket so sibling workers back off too
+            _bucket.penalize(backoff)
+            backoff = min(backoff * 2, 30.0)
+            continue
+        latency_ms = (time.perf_counter() - t0) * 1000
+        vecs = r.get("embedding") or r["embedding"]
+        if vecs and not isinstance(vecs[0], list):  # single-item responses come back flat
+            vecs = [vecs]
+        if len(vecs) != len(batch):
+            raise ValueError(f"Embedding count mismatch: sent {len(batch)}, got {len(vecs)}.")
+        return vecs, {"size": len(batch), "latency_ms": round(latency_ms, 1), "retries": attempt}
+
+def embed_texts(texts: List[str]) -> Tuple[List[List[float]], List[Dict[str, Any]]]:
+    """
+    Embed `texts` in provider-sized batches, EMBED_CONCURRENCY requests at a time.
+    Returns vectors in input order plus a per-batch report (size, latency_ms, retries).
+    """
+    if not texts:
+        return [], []
+    batches = _batches(list(texts), config.EMBED_BATCH_SIZE)
+    futures = [(start, _pool.submit(_embed_batch_request, batch)) for start, batch in batches]
+
+    vecs: List[List[float]] = [None] * len(texts)  # type: ignore[list-item]
+    report: List[Dict[str, Any]] = []
+    for n, (start, fut) in enumerate(futures):
+        batch_vecs, info = fut.result()
+        vecs[start:start + len(batch_vecs)] = batch_vecs
+        report.append({"batch": n, "start": start, **info})
+
+    with _stats_lock:
+        _stats["requests"] += len(report)
+        _stats["texts"] += len(texts)
+        _recent_latency_ms.extend(r["latency_ms"] for r in report)
+    return vecs, report
+
+def stats() -> Dict[str, Any]:
+    with _stats_lock:
+        lat = sorted(_recent_latency_ms)
+        out = dict(_stats)
+    if lat:
+        out["batch_latency_ms"] = {
+            "p50": lat[len(lat) // 2],
+            "p95": lat[min(len(lat) - 1, int(len(lat) * 0.95))],
+            "max": lat[-1],
+        }
+    return out
@@ -0,0 +1,171 @@
+import asyncio, threading
+from typing import Dict, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+import httpx
+from app import aio, config, db, utils
+
+# Page fetcher for KB links: pooled httpx clients, an on-disk cache of extracted text
+# revalidated with conditional GETs (If-None-Match / If-Modified-Since), a streamed
+# download capped at FETCH_MAX_BYTES, and per-host + overall concurrency limits.
+# A 304 reuses the cached text, so neither the body nor the HTML extraction is repeated.
+
+EXTRACT_VERSION = 2   # bump when utils.html_to_text output changes; older cached text is ignored
+
+class FetchError(Exception):
+    pass
+
+class Page(NamedTuple):
+    url: str
+    text: str            # "title\n\nbody", as produced by utils.html_to_text
+    not_modified: bool   # the server answered 304 and the cached text was used
+
+_lock = threading.Lock()
+_counters = {"fetched": 0, "not_modified": 0, "errors": 0, "bytes": 0}
+
+_conn = db.connect("http_cache.sqlite3")
+_conn.execute("""CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    version INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    fetched_at INTEGER NOT NULL
+)""")
+_conn.execute("CREATE INDEX IF NOT EXISTS pages_fetched_at ON pages(fetched_at)")
+
+_limits = httpx.Limits(max_connections=max(1, config.FETCH_CONCURRENCY),
+                       max_keepalive_connections=max(1, config.FETCH_CONCURRENCY))
+_sync_client = httpx.Client(timeout=config.FETCH_TIMEOUT, follow_redirects=True, limits=_limits)
+_async_client: Optional[httpx.AsyncClient] = None
+_all_sem: Optional[asyncio.Semaphore] = None
+_host_sems: Dict[str, asyncio.Semaphore] = {}
+_host_locks: Dict[str, threading.Semaphore] = {}
+
+def async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(timeout=config.FETCH_TIMEOUT, follow_redirects=True, limits=_limits)
+    return _async_client
+
+async def aclose():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+def _count(key: str, n: int = 1):
+    with _lock:
+        _counters[key] += n
+
+# ---------- cache ----------
+def _cached(url: str) -> Optional[Tuple[Optional[str], Optional[str], str]]:
+    with _lock:
+        row = _conn.execute("SELECT etag, last_modified, text FROM pages WHERE url=? AND version=?",
+                            (url, EXTRACT_VERSION)).fetchone()
+    return row
+
+def _validators(row) -> Dict[str, str]:
+    headers = {}
+    if row and row[0]:
+        headers["If-None-Match"] = row[0]
+    if row and row[1]:
+        headers["If-Modified-Since"] = row[1]
+    return headers
+
+def _store(url: str, headers: httpx.Headers, text: str):
+    etag, lm = headers.get("etag"), headers.get("last-modified")
+    with _lock:
+        if etag or lm:
+            _conn.execute("INSERT OR REPLACE INTO pages(url, etag, last_modified, version, text, fetched_at) "
+                          "VALUES (?,?,?,?,?,?)", (url, etag, lm, EXTRACT_VERSION, text, utils.now_ms()))
+        else:
+            _conn.execute("DELETE FROM pages WHERE url=?", (url,))  # nothing to revalidate with
+        _conn.execute("DELETE FROM pages WHERE url IN (SELECT url FROM pages ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+                      (config.FETCH_CACHE_MAX_ROWS,))
+
+def _touch(url: str):
+    with _lock:
+        _conn.execute("UPDATE pages SET fetched_at=? WHERE url=?", (utils.now_ms(), url))
+
+def _check_size(resp: httpx.Response):
+    declared = resp.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > config.FETCH_MAX_BYTES:
+        raise FetchError(f"page is {declared} bytes, over the {config.FETCH_MAX_BYTES}-byte limit")
+
+def _append(buf: bytearray, chunk: bytes):
+    buf += chunk
+    if len(buf) > config.FETCH_MAX_BYTES:
+        raise FetchError(f"page exceeds the {config.FETCH_MAX_BYTES}-byte limit")
+
+def _decode(resp: httpx.Response, body: bytes) -> str:
+    return body.decode(resp.charset_encoding or "utf-8", errors="replace")
+
+# ---------- async (routes) ----------
+def _host_sem(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc.lower()
+    sem = _host_sems.get(host)
+    if sem is None:
+        sem = _host_sems[host] = asyncio.Semaphore(max(1, config.FETCH_PER_HOST))
+    return sem
+
+async def fetch_async(url: str) -> Page:
+    global _all_sem
+    if _all_sem is None:
+        _all_sem = asyncio.Semaphore(max(1, config.FETCH_CONCURRENCY))
+    row = await aio.run_io(_cached, url)
+    try:
+        async with _all_sem, _host_sem(url):
+            async with async_client().stream("GET", url, headers=_validators(row)) as resp:
+                if resp.status_code == 304 and row:
+                    await aio.run_io(_touch, url)
+                    _count("not_modified")
+                    return Page(url, row[2], True)
+                resp.raise_for_status()
+                _check_size(resp)
+                buf = bytearray()
+                async for chunk in resp.aiter_bytes():
+                    _append(buf, chunk)
+    except (httpx.HTTPError, httpx.InvalidURL) as e:
+        _count("errors")
+        raise FetchError(str(e)) from e
+    except FetchError:
+        _count("errors")
+        raise
+    _count("fetched"); _count("bytes", len(buf))
+    text = await aio.run_cpu(utils.html_to_text, _decode(resp, bytes(buf)), url)
+    await aio.run_io(_store, url, resp.headers, text)
+    return Page(url, text, False)
+
+# ---------- sync (job workers) ----------
+def fetch(url: str) -> Page:
+    host = urlsplit(url).netloc.lower()
+    with _lock:
+        gate = _host_locks.setdefault(host, threading.Semaphore(max(1, config.FETCH_PER_HOST)))
+    row = _cached(url)
+    try:
+        with gate, _sync_client.stream("GET", url, headers=_validators(row)) as resp:
+            if resp.status_code == 304 and row:
+                _touch(url)
+                _count("not_modified")
+                return Page(url, row[2], True)
+            resp.raise_for_status()
+            _check_size(resp)
+            buf = bytearray()
+            for chunk in resp.iter_bytes():
+                _append(buf, chunk)
+    except (httpx.HTTPError, httpx.InvalidURL) as e:
+        _count("errors")
+        raise FetchError(str(e)) from e
+    except FetchError:
+        _count("errors")
+        raise
+    _count("fetched"); _count("bytes", len(buf))
+    text = aio.cpu_pool().submit(utils.html_to_text, _decode(resp, bytes(buf)), url).result()
+    _store(url, resp.headers, text)
+    return Page(url, text, False)
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        out = dict(_counters)
+        out["cached_pages"] = _conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+    return out
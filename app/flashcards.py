@@ -0,0 +1,156 @@
+import hashlib, json, math, re, threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+from app import ai, config, db, kb_store, utils
+from app.models import FlashcardSet
+
+# Map-reduce flashcards over a whole KB document:
+#   1. chunks sorted by `order`, overlaps cut using their char_start/char_end offsets
+#   2. map:    the text is split into at most FLASHCARD_MAX_SECTIONS sections, each asked
+#              for a few candidate cards in parallel (bounded by FLASHCARD_DEADLINE)
+#   3. reduce: near-duplicate questions dropped, then one call ranks the rest down to n
+# Results are cached per (doc_id, n, content hash); chunk ids are content-addressed, so the
+# hash changes whenever the document is re-ingested with different text.
+
+_pool = ThreadPoolExecutor(max_workers=max(1, config.FLASHCARD_WORKERS), thread_name_prefix="flashcards")
+_lock = threading.Lock()
+
+_conn = db.connect("flashcards.sqlite3")
+_conn.execute("""CREATE TABLE IF NOT EXISTS flashcards (
+    doc_id TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    cards TEXT NOT NULL,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (doc_id, n)
+)""")
+
+MAP_PROMPT = (
+    "Create {k} compact flashcards from this section of \"{title}\" (part {i} of {total}). "
+    "Focus on key definitions, decisions, and cause-effect.\n"
+    'Return JSON: {{ "cards": [{{"q":"...","a":"..."}}] }}\n'
+    "CONTENT:\n{text}\n"
+)
+REDUCE_PROMPT = (
+    "Below are candidate flashcards drawn from every part of \"{title}\". Pick the {n} best: "
+    "accurate, non-overlapping, and together covering the whole document.\n"
+    'Return JSON: {{ "keep": [<candidate numbers, best first>] }}\n'
+    "CANDIDATES:\n{cands}\n"
+)
+
+def _overlap(prev: str, nxt: str, limit: int = 400) -> int:
+    """Length of the longest suffix of `prev` that `nxt` starts with (chunks without offsets)."""
+    for k in range(min(limit, len(prev), len(nxt)), 0, -1):
+        if prev.endswith(nxt[:k]):
+            return k
+    return 0
+
+def document_text(docs: List[str], metas: List[Dict[str, Any]]) -> List[str]:
+    """The document's chunks in order, each with the part it shares with its predecessor removed."""
+    rows = sorted(zip(docs, metas), key=lambda r: int((r[1] or {}).get("order", 0)))
+    pieces, prev_raw, prev_end = [], None, None
+    for raw, meta in rows:
+        raw, meta = raw or "", meta or {}
+        start, end = meta.get("char_start"), meta.get("char_end")
+        if prev_end is not None and start is not None:
+            text = raw[max(0, prev_end - start):]
+        elif prev_raw is not None:
+            text = raw[_overlap(prev_raw, raw):]
+        else:
+            text = raw
+        if text.strip():
+            pieces.append(text)
+        prev_raw, prev_end = raw, end
+    return pieces
+
+def sections(pieces: List[str]) -> List[str]:
+    total = sum(len(p) for p in pieces)
+    size = max(config.FLASHCARD_SECTION_CHARS, math.ceil(total / max(1, config.FLASHCARD_MAX_SECTIONS)))
+    out, cur, cur_len = [], [], 0
+    for p in pieces:
+        if cur and cur_len + len(p) > size:
+            out.append("\n".join(cur)); cur, cur_len = [], 0
+        cur.append(p); cur_len += len(p)
+    if cur:
+        out.append("\n".join(cur))
+    return out
+
+def _map(title: str, text: str, i: int, total: int, k: int) -> List[Dict[str, str]]:
+    data = ai.generate_json(MAP_PROMPT.format(k=k, title=title, i=i, total=total, text=text),
+                            temperature=0.3, max_output_tokens=100 * k + 200, site="flashcards.map")
+    return [{"q": str(c["q"]).strip(), "a": str(c["a"]).strip()}
+            for c in data.get("cards", []) if isinstance(c, dict) and c.get("q") and c.get("a")]
+
+_WORD = re.compile(r"\w+")
+
+def _dedupe(cards: List[Dict[str, str]], threshold: float = 0.8) -> List[Dict[str, str]]:
+    kept, seen = [], []
+    for c in cards:
+        words = set(_WORD.findall(c["q"].lower()))
+        if any(len(words & s) / max(1, len(words | s)) >= threshold for s in seen):
+            continue
+        kept.append(c); seen.append(words)
+    return kept
+
+def _interleave(per_section: List[List[Dict[str, str]]]) -> List[Dict[str, str]]:
+    """Round-robin across sections, so any prefix covers the document evenly."""
+    out = []
+    for row in range(max((len(s) for s in per_section), default=0)):
+        out.extend(s[row] for s in per_section if row < len(s))
+    return out
+
+def _reduce(title: str, cands: List[Dict[str, str]], n: int) -> List[Dict[str, str]]:
+    if len(cands) <= n:
+        return cands
+    listing = "\n".join(f"{i}. Q: {c['q']} | A: {c['a'][:200]}" for i, c in enumerate(cands, 1))
+    try:
+        data = ai.generate_json(REDUCE_PROMPT.format(title=title, n=n, cands=listing),
+                                temperature=0.0, max_output_tokens=300, site="flashcards.reduce")
+        picked = []
+        for i in data.get("keep", []):
+            if isinstance(i, int) and 1 <= i <= len(cands) and cands[i - 1] not in picked:
+                picked.append(cands[i - 1])
+        # top up from the interleaved order if the model returned too few
+        picked += [c for c in cands if c not in picked][:max(0, n - len(picked))]
+        return picked[:n]
+    except Exception:
+        return cands[:n]
+
+def _cached(doc_id: str, n: int, content_hash: str) -> Optional[List[Dict[str, str]]]:
+    with _lock:
+        row = _conn.execute("SELECT content_hash, cards FROM flashcards WHERE doc_id=? AND n=?", (doc_id, n)).fetchone()
+    return json.loads(row[1]) if row and row[0] == content_hash else None
+
+def generate(doc_id: str, user_id: str, n: int = 10) -> Optional[FlashcardSet]:
+    """None if the document doesn't exist for this user."""
+    res = kb_store.get(user_id, doc_id=doc_id)
+    docs = res.get("documents") or []
+    metas = res.get("metadatas") or []
+    if not docs:
+        return None
+    title = (metas[0].get("title") if metas and isinstance(metas[0], dict) else None) or "Untitled"
+    digest = hashlib.sha256("\n".join([config.GEN_MODEL, *sorted(res.get("ids") or [])]).encode("utf-8")).hexdigest()
+    hit = _cached(doc_id, n, digest)
+    if hit is not None:
+        return FlashcardSet(source_title=title, cards=hit)
+
+    secs = sections(document_text(docs, metas))
+    if not secs:
+        return FlashcardSet(source_title=title, cards=[])
+    k = max(2, math.ceil(n * 1.5 / len(secs)))
+    futs = [_pool.submit(_map, title, s, i, len(secs), k) for i, s in enumerate(secs, 1)]
+    done, _ = wait(futs, timeout=config.FLASHCARD_DEADLINE)
+    per_section = []
+    for f in futs:
+        if f in done and f.exception() is None:
+            per_section.append(f.result())
+        else:
+            f.cancel()
+    cards = _reduce(title, _dedupe(_interleave(per_section)), n)
+    if not cards:
+        return FlashcardSet(source_title=title, cards=[{"q": "What is the main idea?", "a": secs[0][:200]}])
+    if len(per_section) == len(futs):  # don't cache a partial result from a missed deadline
+        with _lock:
+            _conn.execute("INSERT OR REPLACE INTO flashcards(doc_id, n, content_hash, cards, updated_at) VALUES (?,?,?,?,?)",
+                          (doc_id, n, digest, json.dumps(cards), utils.now_ms()))
+    return FlashcardSet(source_title=title, cards=cards)
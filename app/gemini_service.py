@@ -1,7 +1,7 @@
 import json
 from typing import List, Optional
-import google.generativeai as genai
-from .config import GEN_MODEL, EMBED_MODEL
+from . import llm
+from .embed_cache import embed_cached
 from fastapi import HTTPException
 from .models import AISummary
 
@@ -18,12 +18,7 @@ Consider explicit deadlines, mentions of the user, and whether the sender is wai
 """
 
 def embed_batch(texts: List[str]) -> List[List[float]]:
-    vecs = []
-    for t in texts:
-        r = genai.embed_content(model=EMBED_MODEL, content=t)
-        vec = r.get("embedding") or r["embedding"]
-        vecs.append(vec)
-    return vecs
+    return embed_cached(texts)
 
 def gemini_summarize(message_text: str, subject: Optional[str], sender: Optional[str]) -> AISummary:
     prompt = f"""{SYSTEM_JSON}
@@ -34,20 +29,13 @@ Subject: {subject or ""}
 From: {sender or ""}
 Body: {message_text}
 >>>"""
-    model = genai.GenerativeModel(GEN_MODEL)
-    resp = model.generate_content(
-        prompt,
-        generation_config=genai.types.GenerationConfig(
-            temperature=0.2,
-            max_output_tokens=300,
-            response_mime_type="application/json",
-        ),
-    )
-    if not resp or not getattr(resp, "text", ""):
+    try:
+        text = llm.generate(prompt, "gemini_service.summary", temperature=0.2, max_output_tokens=300, json_mode=True)
+    except ValueError:
         raise HTTPException(status_code=502, detail="LLM returned empty.")
     try:
-        data = json.loads(resp.text)
+        data = json.loads(text)
     except Exception:
-        cleaned = resp.text.strip().strip("`").replace("json\n", "").strip()
+        cleaned = text.strip().strip("`").replace("json\n", "").strip()
         data = json.loads(cleaned)
     return AISummary(**data)
@@ -1,11 +1,21 @@
-import os
-from typing import List, Dict, Any, Optional
+import os, threading
+from typing import List, Dict, Any, Optional, Tuple
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from app import config
 
+# Headers the inbox view and triage read; format=metadata skips bodies and attachments.
+METADATA_HEADERS = ["Subject", "From", "List-Unsubscribe", "List-Id", "Precedence", "Auto-Submitted"]
+BATCH_LIMIT = 50  # Gmail recommends <= 50 sub-requests per batch
+
+_creds: Optional[Credentials] = None
+_creds_lock = threading.Lock()
+# httplib2 (under googleapiclient) is not thread-safe, so each worker thread gets its own
+# client; they all share one Credentials object that refreshes in place.
+_local = threading.local()
+
 def get_gmail_creds() -> Credentials:
     creds = None
     if os.path.exists(config.GOOGLE_TOKEN_FILE):
@@ -22,8 +32,24 @@ def get_gmail_creds() -> Credentials:
             token.write(creds.to_json())
     return creds
 
+def shared_creds() -> Credentials:
+    global _creds
+    with _creds_lock:
+        if _creds is None:
+            _creds = get_gmail_creds()
+        elif not _creds.valid and _creds.refresh_token:
+            _creds.refresh(Request())
+            with open(config.GOOGLE_TOKEN_FILE, "w") as token:
+                token.write(_creds.to_json())
+        return _creds
+
 def gmail_service():
-    return build("gmail", "v1", credentials=get_gmail_creds(), cache_discovery=False)
+    svc = getattr(_local, "svc", None)
+    if svc is None:
+        svc = _local.svc = build("gmail", "v1", credentials=shared_creds(), cache_discovery=False)
+    else:
+        shared_creds()  # refresh ahead of the call if the token lapsed
+    return svc
 
 def list_recent_messages(max_results: int = 5) -> List[Dict[str, Any]]:
     svc = gmail_service()
@@ -33,3 +59,54 @@ def list_recent_messages(max_results: int = 5) -> List[Dict[str, Any]]:
 def get_message(msg_id: str) -> Dict[str, Any]:
     svc = gmail_service()
     return svc.users().messages().get(userId="me", id=msg_id, format="full").execute()
+
+def get_messages_batch(msg_ids: List[str], fmt: str = "metadata",
+                       headers: Optional[List[str]] = None) -> List[Optional[Dict[str, Any]]]:
+    """
+    Fetch many messages over Gmail's batch HTTP endpoint (one round trip per BATCH_LIMIT ids).
+    Results line up with `msg_ids`; a message that failed individually comes back as None.
+    """
+    svc = gmail_service()
+    headers = headers or METADATA_HEADERS
+    out: List[Optional[Dict[str, Any]]] = [None] * len(msg_ids)
+
+    def _callback(request_id, response, exception):
+        if exception is None:
+            out[int(request_id)] = response
+
+    for start in range(0, len(msg_ids), BATCH_LIMIT):
+        batch = svc.new_batch_http_request(callback=_callback)
+        for i in range(start, min(start + BATCH_LIMIT, len(msg_ids))):
+            kwargs = {"userId": "me", "id": msg_ids[i], "format": fmt}
+            if fmt == "metadata":
+                kwargs["metadataHeaders"] = headers
+            batch.add(svc.users().messages().get(**kwargs), request_id=str(i))
+        batch.execute()
+    return out
+
+def get_profile() -> Dict[str, Any]:
+    svc = gmail_service()
+    return svc.users().getProfile(userId="me").execute()
+
+def list_history(start_history_id: str) -> Tuple[List[str], List[str], str]:
+    """
+    Pull mailbox deltas since `start_history_id`.
+    Returns (added_ids, deleted_ids, latest_history_id). Raises HttpError 404 when the
+    start id is too old for Gmail to replay; callers should fall back to a full sync.
+    """
+    svc = gmail_service()
+    added, deleted = [], []
+    latest, page_token = start_history_id, None
+    while True:
+        res = svc.users().history().list(
+            userId="me", startHistoryId=start_history_id, pageToken=page_token,
+            historyTypes=["messageAdded", "messageDeleted"]).execute()
+        for h in res.get("history", []):
+            added.extend(m["message"]["id"] for m in h.get("messagesAdded", []))
+            deleted.extend(m["message"]["id"] for m in h.get("messagesDeleted", []))
+        latest = res.get("historyId", latest)
+        page_token = res.get("nextPageToken")
+        if not page_token:
+            break
+    gone = set(deleted)
+    return [i for i in dict.fromkeys(added) if i not in gone], list(gone), latest
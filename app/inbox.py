@@ -0,0 +1,116 @@
+import bisect
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Iterator, Iterable, Optional, Tuple
+from app import config, ai, priority, gmail_service, utils, summary_store, triage
+from app.models import InboxItem, AISummary
+from app.triage import BLOCKER_HINTS
+
+# Shared across requests so concurrent polls can't multiply LLM fan-out.
+_pool = ThreadPoolExecutor(max_workers=max(1, config.INBOX_SUMMARY_WORKERS), thread_name_prefix="inbox")
+
+def _fields(msg: Dict[str, Any]) -> Dict[str, Any]:
+    headers = msg.get("payload", {}).get("headers", [])
+    return {
+        "id": msg.get("id"),
+        "thread_id": msg.get("threadId"),
+        "subject": utils.header_lookup(headers, "Subject"),
+        "sender": utils.header_lookup(headers, "From"),
+        "snippet": msg.get("snippet", "") or "",
+        "internal_ts": int(msg.get("internalDate", "0")),
+        # triage signals only; not persisted by the sync index
+        "labels": msg.get("labelIds") or [],
+        "headers": {h: v for h in triage.TRIAGE_HEADERS if (v := utils.header_lookup(headers, h))},
+    }
+
+def is_blocked(snippet: str) -> bool:
+    lower = (snippet or "").lower()
+    return any(k in lower for k in BLOCKER_HINTS)
+
+def build_item(f: Dict[str, Any], ai_sum: Optional[AISummary]) -> InboxItem:
+    score = 0.0
+    if ai_sum is not None:
+        score = priority.compute_priority(ai_sum, internal_ms=f["internal_ts"], sender_role=None,
+                                          blocked_flag=is_blocked(f["snippet"]))
+    return InboxItem(
+        source="gmail",
+        id=f["id"],
+        thread_id=f["thread_id"],
+        subject=f["subject"],
+        from_=f["sender"],
+        snippet=f["snippet"],
+        internal_ts=f["internal_ts"],
+        url=f"https://mail.google.com/mail/u/0/#inbox/{f['id']}",
+        ai=ai_sum,
+        priority_score=score
+    )
+
+def _summary_item(f: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": f["id"], "text": f["snippet"], "subject": f["subject"], "sender": f["sender"]}
+
+def _summarize(batch: List[Dict[str, Any]]) -> Dict[str, Optional[AISummary]]:
+    try:
+        return ai.gemini_summarize_batch(batch, site="inbox.summary")
+    except Exception:
+        # still show the messages even if the LLM calls fail
+        return {}
+
+def fetch_fields(msg_ids: List[str]) -> List[Dict[str, Any]]:
+    """One batched metadata fetch; returns flattened message fields."""
+    return [_fields(m) for m in gmail_service.get_messages_batch(msg_ids) if m]
+
+def fetch_recent(max_results: int = 5) -> List[Dict[str, Any]]:
+    msgs = gmail_service.list_recent_messages(max_results=max_results)
+    return fetch_fields([m["id"] for m in msgs])
+
+def iter_summarized(fields: List[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], Optional[AISummary]]]:
+    """
+    Yield (fields, summary) pairs: messages with a stored summary first, then the ones
+    triage settles locally, then the rest as their batched LLM calls complete
+    (SUMMARY_BATCH messages per call). New LLM summaries are written to the store.
+    """
+    cached = summary_store.get_many("gmail", {f["id"]: ai.SUMMARY_VERSION for f in fields})
+    local: List[Tuple[Dict[str, Any], AISummary]] = []
+    misses = []
+    for f in fields:
+        if f["id"] in cached:
+            continue
+        verdict = triage.classify(f) if config.TRIAGE else None
+        if verdict is not None:
+            local.append((f, verdict.summary))
+        else:
+            misses.append(f)
+    futs = {_pool.submit(_summarize, batch): batch
+            for batch in ai.summary_batches([_summary_item(f) for f in misses])}
+    by_id = {f["id"]: f for f in misses}
+    for f in fields:
+        if f["id"] in cached:
+            yield f, cached[f["id"]]
+    yield from local
+    for fut in as_completed(futs):
+        got = fut.result()
+        for item in futs[fut]:
+            ai_sum = got.get(str(item["id"]))
+            f = by_id[item["id"]]
+            if ai_sum is not None:
+                summary_store.put("gmail", item["id"], ai.SUMMARY_VERSION, ai_sum)
+                triage.observe(f, ai_sum)
+            yield f, ai_sum
+
+def iter_recent(max_results: int = 5) -> Iterator[InboxItem]:
+    """Yield scored items as summaries become available (cached ones are re-scored, since recency decays)."""
+    for f, ai_sum in iter_summarized(fetch_recent(max_results)):
+        yield build_item(f, ai_sum)
+
+def sort_items(items: Iterable[InboxItem]) -> List[InboxItem]:
+    """Priority-sorted list; each item is slotted in as soon as it arrives."""
+    keys: List[float] = []
+    out: List[InboxItem] = []
+    for item in items:
+        k = -(item.priority_score or 0)
+        pos = bisect.bisect_right(keys, k)
+        keys.insert(pos, k)
+        out.insert(pos, item)
+    return out
+
+def recent_items(max_results: int = 5) -> List[InboxItem]:
+    return sort_items(iter_recent(max_results))
@@ -0,0 +1,135 @@
+import json, threading, time
+from typing import List, Dict, Any, Optional
+from googleapiclient.errors import HttpError
+from app import config, db, gmail_service, inbox
+from app.models import InboxItem, AISummary
+
+# Local index of the mailbox, kept current by replaying users.history.list deltas from the
+# last stored historyId. /gmail/recent reads from here instead of polling Gmail.
+
+_lock = threading.RLock()   # guards the connection
+_sync_lock = threading.Lock()  # one sync at a time (background loop vs. cold-start request)
+_status: Dict[str, Any] = {"last_sync_ms": None, "last_mode": None, "last_error": None, "syncs": 0}
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+_conn = db.connect("inbox.sqlite3")
+_conn.execute("""CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    subject TEXT,
+    sender TEXT,
+    snippet TEXT NOT NULL,
+    internal_ts INTEGER NOT NULL,
+    ai TEXT
+)""")
+_conn.execute("CREATE INDEX IF NOT EXISTS messages_ts ON messages(internal_ts DESC)")
+_conn.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)")
+
+def _get_state(key: str) -> Optional[str]:
+    with _lock:
+        row = _conn.execute("SELECT value FROM sync_state WHERE key=?", (key,)).fetchone()
+    return row[0] if row else None
+
+def _set_state(key: str, value: str):
+    with _lock:
+        _conn.execute("INSERT OR REPLACE INTO sync_state(key, value) VALUES (?,?)", (key, value))
+
+def _upsert(fields: List[Dict[str, Any]]):
+    rows = []
+    for f, ai_sum in inbox.iter_summarized(fields):
+        rows.append((f["id"], f["thread_id"], f["subject"], f["sender"], f["snippet"], f["internal_ts"],
+                     json.dumps(ai_sum.dict()) if ai_sum else None))
+    with _lock:
+        _conn.executemany("INSERT OR REPLACE INTO messages(id, thread_id, subject, sender, snippet, internal_ts, ai) "
+                          "VALUES (?,?,?,?,?,?,?)", rows)
+        _conn.execute("DELETE FROM messages WHERE id NOT IN "
+                      "(SELECT id FROM messages ORDER BY internal_ts DESC LIMIT ?)", (config.GMAIL_SYNC_KEEP,))
+
+def _full_sync() -> Dict[str, Any]:
+    # read historyId before listing so nothing that lands mid-sync is skipped
+    history_id = gmail_service.get_profile()["historyId"]
+    fields = inbox.fetch_recent(max_results=config.GMAIL_SYNC_DEPTH)
+    _upsert(fields)
+    with _lock:  # drop anything the fresh listing no longer returns
+        _conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep_ids (id TEXT PRIMARY KEY)")
+        _conn.execute("DELETE FROM keep_ids")
+        _conn.executemany("INSERT OR IGNORE INTO keep_ids(id) VALUES (?)", [(f["id"],) for f in fields])
+        _conn.execute("DELETE FROM messages WHERE id NOT IN (SELECT id FROM keep_ids)")
+    _set_state("history_id", str(history_id))
+    return {"mode": "full", "added": len(fields), "deleted": 0}
+
+def _delta_sync(start_history_id: str) -> Dict[str, Any]:
+    added, deleted, latest = gmail_service.list_history(start_history_id)
+    if deleted:
+        with _lock:
+            _conn.executemany("DELETE FROM messages WHERE id=?", [(i,) for i in deleted])
+    if added:
+        _upsert(inbox.fetch_fields(added))
+    _set_state("history_id", str(latest))
+    return {"mode": "delta", "added": len(added), "deleted": len(deleted)}
+
+def _backfill(limit: int = 20) -> int:
+    """Retry summaries that failed on an earlier pass."""
+    with _lock:
+        rows = _conn.execute("SELECT id, thread_id, subject, sender, snippet, internal_ts FROM messages "
+                             "WHERE ai IS NULL ORDER BY internal_ts DESC LIMIT ?", (limit,)).fetchall()
+    if rows:
+        keys = ["id", "thread_id", "subject", "sender", "snippet", "internal_ts"]
+        _upsert([dict(zip(keys, r)) for r in rows])
+    return len(rows)
+
+def sync_once() -> Dict[str, Any]:
+    with _sync_lock:
+        t0 = time.perf_counter()
+        start = _get_state("history_id")
+        try:
+            res = _delta_sync(start) if start else _full_sync()
+        except HttpError as e:
+            if getattr(e, "resp", None) is None or e.resp.status != 404:
+                raise
+            res = _full_sync()  # history window expired
+        res["backfilled"] = _backfill()
+        res["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        _status.update(last_sync_ms=int(time.time() * 1000), last_mode=res["mode"], last_error=None)
+        _status["syncs"] += 1
+        return res
+
+def _loop():
+    while not _stop.is_set():
+        try:
+            sync_once()
+        except Exception as e:
+            _status["last_error"] = str(e)
+        _stop.wait(config.GMAIL_SYNC_INTERVAL)
+
+def start():
+    global _thread
+    if _thread and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="gmail-sync", daemon=True)
+    _thread.start()
+
+def stop():
+    _stop.set()
+
+def recent_items(max_results: int = 5) -> List[InboxItem]:
+    """Serve the prioritized inbox from the local index (cold start runs one sync inline)."""
+    if _get_state("history_id") is None:
+        sync_once()
+    with _lock:
+        rows = _conn.execute("SELECT id, thread_id, subject, sender, snippet, internal_ts, ai FROM messages "
+                             "ORDER BY internal_ts DESC LIMIT ?", (max_results,)).fetchall()
+    items = []
+    for mid, thread_id, subject, sender, snippet, internal_ts, ai_json in rows:
+        f = {"id": mid, "thread_id": thread_id, "subject": subject, "sender": sender,
+             "snippet": snippet, "internal_ts": internal_ts}
+        items.append(inbox.build_item(f, AISummary(**json.loads(ai_json)) if ai_json else None))
+    return inbox.sort_items(items)
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        count = _conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    return {**_status, "messages": count, "history_id": _get_state("history_id"),
+            "running": bool(_thread and _thread.is_alive())}
@@ -0,0 +1,161 @@
+import hashlib, threading, uuid
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from app import ai, aio, answer_cache, chunker, config, fetcher, kb_docs, kb_store, utils
+from app.chunker import Chunk
+from app.models import KBIngestResponse
+
+# Re-ingesting a document is incremental. Chunk ids are content-addressed
+# ("<doc_id>:<sha1(text)[:16]>"), so a chunk that survives an edit keeps its id and its
+# vector. Only new chunks are embedded, unchanged ones just get their position metadata
+# refreshed, and stale ones are deleted. A re-ingest that is identical to a registered
+# document (same user, same content hash) does nothing at all.
+
+_lock = threading.Lock()
+_doc_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_counters = {"docs_new": 0, "docs_updated": 0, "docs_unchanged": 0,
+             "chunks_embedded": 0, "chunks_reused": 0, "chunks_deleted": 0}
+
+def chunk_file(path: str, filename: str) -> List[Chunk]:
+    """
+    Parse and chunk an uploaded file (blocking; async routes run it with aio.run_io). PDF
+    page ranges are extracted across the CPU process pool and stream into the chunker here;
+    other formats are parsed and chunked whole in one pool worker.
+    """
+    if (filename or "").lower().endswith(".pdf"):
+        return chunker.chunk_file(path, filename, parallel=True)
+    return aio.cpu_pool().submit(chunker.chunk_file, path, filename, False).result()
+
+def content_hash(chunks: List[Chunk]) -> str:
+    h = hashlib.sha256()
+    for c in chunks:
+        h.update(c.text.encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+def chunk_ids(doc_id: str, chunks: List[Chunk]) -> List[str]:
+    """Content-addressed ids; repeated identical chunks get an occurrence suffix."""
+    seen: Dict[str, int] = {}
+    out = []
+    for c in chunks:
+        h = hashlib.sha1(c.text.encode("utf-8")).hexdigest()[:16]
+        n = seen.get(h, 0)
+        seen[h] = n + 1
+        out.append(f"{doc_id}:{h}" if n == 0 else f"{doc_id}:{h}.{n}")
+    return out
+
+def doc_lock(user_id: str, source: str) -> threading.Lock:
+    """Held from plan() through finish() by whoever is storing this source for this user."""
+    with _lock:
+        return _doc_locks.setdefault((user_id, source), threading.Lock())
+
+def _count(**deltas):
+    with _lock:
+        for k, v in deltas.items():
+            _counters[k] += v
+
+class Plan(NamedTuple):
+    """What storing a chunked document will do, worked out before any embedding."""
+    user_id: str
+    source: str
+    doc_id: str
+    digest: str
+    title: str
+    url: Optional[str]
+    ids: List[str]
+    metas: List[Dict[str, Any]]
+    kept: List[int]      # chunk indexes already stored under their id
+    fresh: List[int]     # chunk indexes to embed + add
+    stale: List[str]     # stored ids no longer in the document
+    updated: bool        # the source was ingested before
+    same: Optional[Dict[str, Any]]   # registry row of an identical document; nothing to do
+
+def plan(chunks: List[Chunk], title: str, user_id: str, url: Optional[str] = None,
+         source: Optional[str] = None, doc_id: Optional[str] = None) -> Plan:
+    """Look up the document in the registry and diff its chunk ids against the store.
+    `doc_id` is only used for a document seen for the first time."""
+    source = source or url or title
+    digest = content_hash(chunks)
+    same = kb_docs.by_hash(user_id, digest)
+    if same:
+        return Plan(user_id, source, same["doc_id"], digest, same["title"], same["url"], [], [], [], [], [], True, same)
+    prev = kb_docs.by_source(user_id, source)
+    doc_id = prev["doc_id"] if prev else (doc_id or str(uuid.uuid4()))
+    ids = chunk_ids(doc_id, chunks)
+    # a fresh doc_id normally has nothing stored yet, unless an interrupted job is resuming
+    existing = set(kb_store.ids(user_id, doc_id=doc_id))
+    metas = [utils.make_meta(doc_id, title, user_id, i, url=url, span=(c.start, c.end))
+             for i, c in enumerate(chunks)]
+    kept = [i for i, cid in enumerate(ids) if cid in existing]
+    fresh = [i for i, cid in enumerate(ids) if cid not in existing]
+    stale = sorted(existing - set(ids))
+    return Plan(user_id, source, doc_id, digest, title, url, ids, metas, kept, fresh, stale, bool(prev), None)
+
+def refresh_kept(p: Plan):
+    """Unchanged chunks keep their vectors; only their position metadata moves."""
+    if p.kept:
+        kb_store.update(p.user_id, [p.ids[i] for i in p.kept], [p.metas[i] for i in p.kept])
+
+def finish(p: Plan, n_chunks: int) -> KBIngestResponse:
+    """Call once every fresh chunk is stored: drops stale chunks and registers the document."""
+    if p.same:
+        _count(docs_unchanged=1)
+        return KBIngestResponse(document_id=p.doc_id, chunks=p.same["chunks"], title=p.title,
+                                source_url=p.url, chunks_added=0, chunks_removed=0, unchanged=True)
+    # new chunks are in before stale ones go, so queries never see the document half-empty
+    kb_store.delete(p.user_id, p.stale)
+    kb_docs.put(p.user_id, p.source, p.doc_id, p.digest, p.title, p.url, n_chunks)
+    answer_cache.invalidate(p.user_id)
+    _count(docs_updated=1 if p.updated else 0, docs_new=0 if p.updated else 1, chunks_embedded=len(p.fresh),
+           chunks_reused=len(p.kept), chunks_deleted=len(p.stale))
+    return KBIngestResponse(document_id=p.doc_id, chunks=n_chunks, title=p.title, source_url=p.url,
+                            chunks_added=len(p.fresh), chunks_removed=len(p.stale), unchanged=False)
+
+def store_chunks(chunks: List[Chunk], title: str, user_id: str, url: Optional[str] = None,
+                 source: Optional[str] = None, doc_id: Optional[str] = None,
+                 progress: Optional[Callable[[int], None]] = None,
+                 stop: Optional[threading.Event] = None) -> Optional[KBIngestResponse]:
+    """
+    Embed + store a chunked document (blocking). `source` identifies the document for
+    re-ingest (defaults to the URL, then the title). `progress(stored)` is called after
+    every batch; if `stop` is set between batches, returns None and a later call picks up
+    where this one left off.
+    """
+    with doc_lock(user_id, source or url or title):
+        p = plan(chunks, title, user_id, url=url, source=source, doc_id=doc_id)
+        if p.same:
+            return finish(p, len(chunks))
+        refresh_kept(p)
+        done = len(p.kept)
+        if progress:
+            progress(done)
+        for j in range(0, len(p.fresh), max(1, config.INGEST_BATCH)):
+            if stop is not None and stop.is_set():
+                return None
+            part = p.fresh[j:j + config.INGEST_BATCH]
+            texts = [chunks[i].text for i in part]
+            kb_store.add(user_id, [p.ids[i] for i in part], texts, [p.metas[i] for i in part], ai.embed_batch(texts))
+            done += len(part)
+            if progress:
+                progress(done)
+        return finish(p, len(chunks))
+
+async def ingest_url(url: str, user_id: str) -> Tuple[KBIngestResponse, bool]:
+    """Fetch (conditionally), chunk and store a page; (response, not_modified).
+    Raises fetcher.FetchError if the page can't be fetched."""
+    page = await fetcher.fetch_async(url)
+    if page.not_modified:
+        prev = await aio.run_io(kb_docs.by_source, user_id, url)
+        if prev:
+            return KBIngestResponse(document_id=prev["doc_id"], chunks=prev["chunks"], title=prev["title"],
+                                    source_url=url, chunks_added=0, chunks_removed=0, unchanged=True), True
+    title = page.text.split("\n", 1)[0][:120]
+    chunks = await aio.run_cpu(chunker.chunk_text, page.text)
+    if not chunks:
+        raise fetcher.FetchError("No text extracted.")
+    return await aio.run_io(store_chunks, chunks, title, user_id, url=url), page.not_modified
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        out = dict(_counters)
+    out["documents"] = kb_docs.count()
+    return out
@@ -0,0 +1,186 @@
+import json, os, queue, shutil, threading, uuid
+from typing import BinaryIO, Dict, Any, List, Optional
+from app import aio, chunker, config, db, fetcher, ingest, utils
+from app.chunker import Chunk
+from app.models import IngestJob
+
+# SQLite-backed ingest queue. Jobs move through two pipelined stages, each with its own
+# worker threads, so one job can be parsed while another is being embedded:
+#   parse stage:  fetch/parse/chunk (PDF pages in the process pool) -> chunks checkpointed to disk
+#   embed stage:  embed + store INGEST_BATCH chunks at a time, checkpointing chunks_done per batch
+# On restart every unfinished job is re-queued at the stage it reached; already stored chunks
+# are not embedded again.
+
+TERMINAL = ("done", "failed")
+JOBS_DIR = os.path.join(config.DATA_DIR, "jobs")
+
+_lock = threading.Lock()
+_parse_q: "queue.Queue[str]" = queue.Queue()
+_embed_q: "queue.Queue[str]" = queue.Queue()
+_threads: List[threading.Thread] = []
+_stop = threading.Event()
+
+_conn = db.connect("jobs.sqlite3")
+_conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    title TEXT,
+    filename TEXT,
+    url TEXT,
+    doc_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    chunks_total INTEGER,
+    chunks_done INTEGER NOT NULL DEFAULT 0,
+    embed_started_at INTEGER,
+    error TEXT,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL
+)""")
+
+def _job_dir(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, job_id)
+
+def _chunks_path(job_id: str) -> str:
+    return os.path.join(_job_dir(job_id), "chunks.json")
+
+def _row(job_id: str) -> Optional[Dict[str, Any]]:
+    with _lock:
+        cur = _conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,))
+        row = cur.fetchone()
+        cols = [c[0] for c in cur.description]
+    return dict(zip(cols, row)) if row else None
+
+def _update(job_id: str, **fields):
+    fields["updated_at"] = utils.now_ms()
+    cols = ", ".join(f"{k}=?" for k in fields)
+    with _lock:
+        _conn.execute(f"UPDATE jobs SET {cols} WHERE id=?", (*fields.values(), job_id))
+
+def _insert(kind: str, user_id: str, title: Optional[str], filename: Optional[str] = None,
+            url: Optional[str] = None, job_id: Optional[str] = None) -> str:
+    job_id = job_id or str(uuid.uuid4())
+    now = utils.now_ms()
+    with _lock:
+        _conn.execute("INSERT INTO jobs(id, kind, user_id, title, filename, url, doc_id, stage, created_at, updated_at) "
+                      "VALUES (?,?,?,?,?,?,?,?,?,?)",
+                      (job_id, kind, user_id, title, filename, url, str(uuid.uuid4()), "queued", now, now))
+    _parse_q.put(job_id)
+    return job_id
+
+# ---------- submit ----------
+def submit_file(fileobj: BinaryIO, filename: str, title: Optional[str], user_id: str) -> str:
+    """Spool the upload under the job dir and queue it (blocking; call off the event loop)."""
+    job_id = str(uuid.uuid4())
+    os.makedirs(_job_dir(job_id), exist_ok=True)
+    with open(os.path.join(_job_dir(job_id), "upload"), "wb") as f:
+        shutil.copyfileobj(fileobj, f, 1 << 20)
+    return _insert("file", user_id, title or filename, filename=filename, job_id=job_id)
+
+def submit_url(url: str, user_id: str) -> str:
+    return _insert("url", user_id, None, url=url)
+
+# ---------- stages ----------
+def _parse_stage(job: Dict[str, Any]):
+    job_id = job["id"]
+    _update(job_id, stage="parsing")
+    if job["kind"] == "file":
+        # PDF pages fan out to the process pool and stream into the chunker
+        src = os.path.join(_job_dir(job_id), "upload")
+        chunks = ingest.chunk_file(src, job["filename"])
+        title = job["title"]
+    else:
+        text = fetcher.fetch(job["url"]).text
+        title = text.split("\n", 1)[0][:120]
+        _update(job_id, stage="chunking", title=title)
+        chunks = aio.cpu_pool().submit(chunker.chunk_text, text).result()
+    if not chunks:
+        raise ValueError("No text extracted.")
+    os.makedirs(_job_dir(job_id), exist_ok=True)
+    tmp = _chunks_path(job_id) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump([list(c) for c in chunks], f)
+    os.replace(tmp, _chunks_path(job_id))  # the checkpoint exists only once fully written
+    _update(job_id, stage="embedding", title=title, chunks_total=len(chunks), embed_started_at=utils.now_ms())
+
+def _embed_stage(job: Dict[str, Any]):
+    job_id = job["id"]
+    with open(_chunks_path(job_id)) as f:
+        chunks = [Chunk(*c) for c in json.load(f)]
+    # chunk ids are content-addressed, so a resumed job skips whatever was already stored
+    res = ingest.store_chunks(chunks, job["title"], job["user_id"], url=job["url"],
+                              source=job["filename"] or job["url"], doc_id=job["doc_id"],
+                              progress=lambda n: _update(job_id, chunks_done=n), stop=_stop)
+    if res is None:
+        return
+    # a re-ingested document keeps the doc id it was first stored under
+    _update(job_id, stage="done", doc_id=res.document_id, chunks_done=res.chunks)
+    shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+
+def _worker(q: "queue.Queue[str]", stage_fn, next_q: Optional["queue.Queue[str]"]):
+    while not _stop.is_set():
+        try:
+            job_id = q.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        job = _row(job_id)
+        if not job or job["stage"] in TERMINAL:
+            continue
+        try:
+            stage_fn(job)
+            if next_q is not None:
+                next_q.put(job_id)
+        except Exception as e:
+            _update(job_id, stage="failed", error=str(e))
+            shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+
+def start():
+    if _threads:
+        return
+    _stop.clear()
+    # re-queue unfinished jobs at the stage they reached
+    with _lock:
+        rows = _conn.execute("SELECT id, stage FROM jobs WHERE stage NOT IN (?, ?) ORDER BY created_at",
+                             TERMINAL).fetchall()
+    for job_id, stage in rows:
+        (_embed_q if stage == "embedding" else _parse_q).put(job_id)
+    for n in range(max(1, config.INGEST_PARSE_WORKERS)):
+        _threads.append(threading.Thread(target=_worker, args=(_parse_q, _parse_stage, _embed_q),
+                                         name=f"ingest-parse-{n}", daemon=True))
+    for n in range(max(1, config.INGEST_EMBED_WORKERS)):
+        _threads.append(threading.Thread(target=_worker, args=(_embed_q, _embed_stage, None),
+                                         name=f"ingest-embed-{n}", daemon=True))
+    for t in _threads:
+        t.start()
+
+def stop():
+    _stop.set()
+
+# ---------- status ----------
+def get(job_id: str) -> Optional[IngestJob]:
+    job = _row(job_id)
+    if not job:
+        return None
+    rate = None
+    if job["embed_started_at"] and job["chunks_done"]:
+        elapsed = max(1, job["updated_at"] - job["embed_started_at"]) / 1000.0
+        rate = round(job["chunks_done"] / elapsed, 2)
+    return IngestJob(
+        job_id=job["id"],
+        kind=job["kind"],
+        stage=job["stage"],
+        title=job["title"],
+        source_url=job["url"],
+        document_id=job["doc_id"],
+        chunks_total=job["chunks_total"],
+        chunks_done=job["chunks_done"] or 0,
+        chunks_per_sec=rate,
+        error=job["error"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+    )
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        by_stage = dict(_conn.execute("SELECT stage, COUNT(*) FROM jobs GROUP BY stage").fetchall())
+    return {"by_stage": by_stage, "parse_queue": _parse_q.qsize(), "embed_queue": _embed_q.qsize()}
@@ -0,0 +1,46 @@
+import threading
+from typing import Dict, Any, Optional
+from app import db, utils
+
+# Registry of ingested KB documents, one row per (user_id, source) where source is the
+# upload filename or the link URL. `content_hash` covers the document's chunk texts, so an
+# identical re-upload (under any name) is found without touching the vector store.
+
+_lock = threading.Lock()
+
+_conn = db.connect("kb_docs.sqlite3")
+_conn.execute("""CREATE TABLE IF NOT EXISTS docs (
+    user_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    title TEXT,
+    url TEXT,
+    chunks INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (user_id, source)
+)""")
+_conn.execute("CREATE INDEX IF NOT EXISTS docs_hash ON docs(user_id, content_hash)")
+
+_COLS = ("user_id", "source", "doc_id", "content_hash", "title", "url", "chunks", "updated_at")
+
+def _one(where: str, args) -> Optional[Dict[str, Any]]:
+    with _lock:
+        row = _conn.execute(f"SELECT {', '.join(_COLS)} FROM docs WHERE {where} LIMIT 1", args).fetchone()
+    return dict(zip(_COLS, row)) if row else None
+
+def by_hash(user_id: str, content_hash: str) -> Optional[Dict[str, Any]]:
+    return _one("user_id=? AND content_hash=?", (user_id, content_hash))
+
+def by_source(user_id: str, source: str) -> Optional[Dict[str, Any]]:
+    return _one("user_id=? AND source=?", (user_id, source))
+
+def put(user_id: str, source: str, doc_id: str, content_hash: str, title: str, url: Optional[str], chunks: int):
+    with _lock:
+        _conn.execute("INSERT OR REPLACE INTO docs(user_id, source, doc_id, content_hash, title, url, chunks, updated_at) "
+                      "VALUES (?,?,?,?,?,?,?,?)",
+                      (user_id, source, doc_id, content_hash, title, url, chunks, utils.now_ms()))
+
+def count() -> int:
+    with _lock:
+        return _conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
@@ -1,19 +1,232 @@
+import hashlib, threading, time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import chromadb
 from chromadb.config import Settings
-from app import config
+from app import config, lexical
 
-if config.CHROMA_PERSIST:
-    client = chromadb.Client(Settings(is_persistent=True, persist_directory=config.CHROMA_DIR))
-else:
-    client = chromadb.Client(Settings(is_persistent=False))
+# KB vectors, sharded by tenant. Each shard is its own collection/index, so a query only
+# touches the asking user's vectors:
+#   KB_SHARDS=0  one shard per user_id (default)
+#   KB_SHARDS=N  users hashed into N shards (every call still filters by user_id)
+# Shards open lazily and at most KB_OPEN_SHARDS stay open (LRU). Engines plug in behind
+# the Backend/Shard interface below; KB_BACKEND picks one from BACKENDS.
 
-kb = client.get_or_create_collection(name=config.KB_COLLECTION, metadata={"hnsw:space": "cosine"})
+Page = Tuple[List[str], List[str], List[Dict[str, Any]], List[List[float]]]
 
-def add(ids, documents, metadatas, embeddings):
-    return kb.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+class Shard(ABC):
+    """One tenant partition of the vector store."""
+    @abstractmethod
+    def add(self, ids, documents, metadatas, embeddings): ...
+    @abstractmethod
+    def query(self, query_embedding, n_results: int, where: Optional[dict]) -> dict: ...
+    @abstractmethod
+    def get(self, where: Optional[dict], include: List[str]) -> dict: ...
+    @abstractmethod
+    def update(self, ids, metadatas): ...
+    @abstractmethod
+    def delete(self, ids): ...
+    @abstractmethod
+    def count(self) -> int: ...
+    @abstractmethod
+    def pages(self, size: int = 1000) -> Iterator[Page]: ...
+    def close(self): pass
 
-def query(query_embedding, n_results: int, where: dict):
-    return kb.query(query_embeddings=[query_embedding], n_results=n_results, where=where)
+class Backend(ABC):
+    @abstractmethod
+    def open(self, name: str, create: bool) -> Optional[Shard]: ...
+    @abstractmethod
+    def names(self) -> List[str]: ...
+    @abstractmethod
+    def drop(self, name: str): ...
 
-def get(where: dict):
-    return kb.get(where=where)
+class ChromaShard(Shard):
+    def __init__(self, collection):
+        self.c = collection
+
+    def add(self, ids, documents, metadatas, embeddings):
+        self.c.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def query(self, query_embedding, n_results: int, where: Optional[dict]) -> dict:
+        return self.c.query(query_embeddings=[query_embedding], n_results=n_results, where=where)
+
+    def get(self, where: Optional[dict], include: List[str]) -> dict:
+        return self.c.get(where=where, include=include)
+
+    def update(self, ids, metadatas):
+        self.c.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.c.delete(ids=ids)
+
+    def count(self) -> int:
+        return self.c.count()
+
+    def pages(self, size: int = 1000) -> Iterator[Page]:
+        offset = 0
+        while True:
+            res = self.c.get(include=["documents", "metadatas", "embeddings"], limit=size, offset=offset)
+            ids = res.get("ids") or []
+            if not ids:
+                return
+            embs = res.get("embeddings")
+            yield (ids, res.get("documents") or [""] * len(ids), [m or {} for m in res.get("metadatas") or [{}] * len(ids)],
+                   [list(e) for e in embs] if embs is not None else [])
+            offset += len(ids)
+
+class ChromaBackend(Backend):
+    def __init__(self):
+        if config.CHROMA_PERSIST:
+            # Chroma's own segment cache evicts least-recently-used indexes past the memory limit
+            extra = ({"chroma_segment_cache_policy": "LRU", "chroma_memory_limit_bytes": config.KB_MEMORY_LIMIT_MB << 20}
+                     if config.KB_MEMORY_LIMIT_MB > 0 else {})
+            self.client = chromadb.Client(Settings(is_persistent=True, persist_directory=config.CHROMA_DIR, **extra))
+        else:
+            self.client = chromadb.Client(Settings(is_persistent=False))
+
+    def open(self, name: str, create: bool) -> Optional[Shard]:
+        if create:
+            return ChromaShard(self.client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"}))
+        try:
+            return ChromaShard(self.client.get_collection(name=name))
+        except Exception:
+            return None
+
+    def names(self) -> List[str]:
+        return [getattr(c, "name", c) for c in self.client.list_collections()]
+
+    def drop(self, name: str):
+        self.client.delete_collection(name=name)
+
+BACKENDS = {"chroma": ChromaBackend}
+
+backend: Backend = BACKENDS[config.KB_BACKEND]()
+
+_lock = threading.Lock()
+_open: "OrderedDict[str, Shard]" = OrderedDict()
+_shard_stats: Dict[str, Dict[str, float]] = {}
+
+def shard_name(user_id: str) -> str:
+    h = hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+    if config.KB_SHARDS > 0:
+        return f"{config.KB_COLLECTION}-h{int(h, 16) % config.KB_SHARDS:04d}"
+    return f"{config.KB_COLLECTION}-u{h[:20]}"
+
+def _shard(name: str, create: bool = False) -> Optional[Shard]:
+    with _lock:
+        s = _open.get(name)
+        if s is not None:
+            _open.move_to_end(name)
+            return s
+    s = backend.open(name, create)
+    if s is None:
+        return None
+    with _lock:
+        s = _open.setdefault(name, s)
+        _open.move_to_end(name)
+        while len(_open) > max(1, config.KB_OPEN_SHARDS):
+            _open.popitem(last=False)[1].close()
+    return s
+
+def _count(name: str, key: str, value: float = 1):
+    with _lock:
+        st = _shard_stats.setdefault(name, {"queries": 0, "query_ms": 0.0, "adds": 0, "deletes": 0})
+        st[key] += value
+
+def where_all(**conds) -> dict:
+    """Chroma wants an explicit $and as soon as a filter has more than one key."""
+    clauses = [{k: v} for k, v in conds.items()]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def _where(user_id: str, conds: Dict[str, Any]) -> Optional[dict]:
+    # a per-user shard holds only that user's vectors; hashed shards are shared, so filter
+    if config.KB_SHARDS > 0:
+        conds = {"user_id": user_id, **conds}
+    return where_all(**conds) if conds else None
+
+_EMPTY_QUERY = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+
+# ---------- tenant-scoped API ----------
+def add(user_id: str, ids, documents, metadatas, embeddings):
+    name = shard_name(user_id)
+    _shard(name, create=True).add(ids, documents, metadatas, embeddings)
+    lexical.add(ids, documents, metadatas)
+    _count(name, "adds", len(ids))
+
+def query(user_id: str, query_embedding, n_results: int, **conds) -> dict:
+    name = shard_name(user_id)
+    s = _shard(name)
+    if s is None:
+        return _EMPTY_QUERY
+    t0 = time.perf_counter()
+    res = s.query(query_embedding, n_results, _where(user_id, conds))
+    _count(name, "queries")
+    _count(name, "query_ms", (time.perf_counter() - t0) * 1000)
+    return res
+
+def get(user_id: str, include: Optional[List[str]] = None, **conds) -> dict:
+    s = _shard(shard_name(user_id))
+    if s is None:
+        return {"ids": [], "documents": [], "metadatas": []}
+    return s.get(_where(user_id, conds), include if include is not None else ["documents", "metadatas"])
+
+def ids(user_id: str, **conds) -> List[str]:
+    return get(user_id, include=[], **conds)["ids"]
+
+def update(user_id: str, ids, metadatas):
+    s = _shard(shard_name(user_id))
+    if s is not None and ids:
+        s.update(ids, metadatas)
+        lexical.update(ids, metadatas)
+
+def delete(user_id: str, ids):
+    name = shard_name(user_id)
+    s = _shard(name)
+    if s is not None and ids:
+        s.delete(ids)
+        lexical.delete(ids)
+        _count(name, "deletes", len(ids))
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        open_shards = dict(_open)
+        per = {n: dict(st) for n, st in _shard_stats.items()}
+    for n, st in per.items():
+        st["avg_query_ms"] = round(st["query_ms"] / st["queries"], 2) if st["queries"] else None
+        st["query_ms"] = round(st["query_ms"], 1)
+    for n, s in open_shards.items():
+        per.setdefault(n, {})["count"] = s.count()
+    return {"backend": config.KB_BACKEND, "open": len(open_shards), "shards": per}
+
+# ---------- startup ----------
+def _migrate_legacy():
+    """Move vectors from the old single shared collection into per-tenant shards."""
+    legacy = backend.open(config.KB_COLLECTION, create=False)
+    if legacy is None:
+        return
+    for page_ids, docs, metas, embs in legacy.pages():
+        by_user: Dict[str, List[int]] = {}
+        for i, m in enumerate(metas):
+            by_user.setdefault(m.get("user_id") or "demo", []).append(i)
+        for user_id, idx in by_user.items():
+            _shard(shard_name(user_id), create=True).add(
+                [page_ids[i] for i in idx], [docs[i] for i in idx], [metas[i] for i in idx], [embs[i] for i in idx])
+    backend.drop(config.KB_COLLECTION)
+
+def _shards() -> Iterator[Shard]:
+    for name in backend.names():
+        if name.startswith(f"{config.KB_COLLECTION}-"):
+            s = backend.open(name, create=False)
+            if s is not None:  # dropped between names() and open()
+                yield s
+
+def _all_pages() -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]]]]:
+    for s in _shards():
+        for page_ids, docs, metas, _ in s.pages():
+            yield page_ids, docs, metas
+
+_migrate_legacy()
+# the BM25 index mirrors the shards; rebuild it if it was lost or predates them
+if lexical.count() != sum(s.count() for s in _shards()):
+    lexical.rebuild(_all_pages())
@@ -0,0 +1,96 @@
+import json, re, sqlite3, threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app import config, db
+
+# BM25 inverted index over KB chunks (SQLite FTS5), kept next to the Chroma files and
+# maintained by kb_store on every add/update/delete. Catches exact identifiers (ticket
+# keys, error codes, names) that embeddings blur, and answers without an embedding call.
+#   chunks: the chunk rows (id, owner, metadata, text)
+#   fts:    external-content FTS5 index over chunks.text, ranked with bm25()
+
+_lock = threading.Lock()
+
+if config.CHROMA_PERSIST:
+    _conn = db.connect("lexical.sqlite3", directory=config.CHROMA_DIR)
+else:
+    # Chroma is in-memory too; a persistent index would outlive the vectors it mirrors
+    _conn = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+_conn.execute("""CREATE TABLE IF NOT EXISTS chunks (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT UNIQUE NOT NULL,
+    user_id TEXT,
+    doc_id TEXT,
+    meta TEXT NOT NULL,
+    text TEXT NOT NULL
+)""")
+_conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(text, content='chunks', content_rowid='rowid')")
+
+# identifiers like ABC-123 or ERR_CONN.RESET stay one term; FTS then matches them as a phrase
+_TERM = re.compile(r"\w+(?:[-_./:]\w+)*")
+MAX_TERMS = 32
+# question words that would otherwise outrank the identifier being asked about
+STOPWORDS = frozenset("a an and are as at be by can did do does for from how i in is it me my of on or "
+                      "the this that to was we were what when where which who why with you".split())
+
+def _delete_rows(ids: List[str]):
+    for j in range(0, len(ids), 500):
+        part = ids[j:j + 500]
+        q = f"SELECT rowid, text FROM chunks WHERE id IN ({','.join('?' * len(part))})"
+        rows = _conn.execute(q, part).fetchall()
+        _conn.executemany("INSERT INTO fts(fts, rowid, text) VALUES ('delete', ?, ?)", rows)
+        _conn.executemany("DELETE FROM chunks WHERE rowid=?", [(r[0],) for r in rows])
+
+def add(ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]):
+    with _lock:
+        _conn.execute("BEGIN")
+        try:
+            _delete_rows(list(ids))  # re-adding an id replaces it
+            for _id, text, meta in zip(ids, documents, metadatas):
+                cur = _conn.execute("INSERT INTO chunks(id, user_id, doc_id, meta, text) VALUES (?,?,?,?,?)",
+                                    (_id, meta.get("user_id"), meta.get("doc_id"), json.dumps(meta), text or ""))
+                _conn.execute("INSERT INTO fts(rowid, text) VALUES (?, ?)", (cur.lastrowid, text or ""))
+            _conn.execute("COMMIT")
+        except Exception:
+            _conn.execute("ROLLBACK")
+            raise
+
+def update(ids: List[str], metadatas: List[Dict[str, Any]]):
+    with _lock:
+        _conn.executemany("UPDATE chunks SET meta=?, user_id=?, doc_id=? WHERE id=?",
+                          [(json.dumps(m), m.get("user_id"), m.get("doc_id"), _id) for _id, m in zip(ids, metadatas)])
+
+def delete(ids: List[str]):
+    with _lock:
+        _conn.execute("BEGIN")
+        _delete_rows(list(ids))
+        _conn.execute("COMMIT")
+
+def count() -> int:
+    with _lock:
+        return _conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+def match_expr(q: str) -> Optional[str]:
+    """Any-term FTS5 query; each term is quoted so punctuation inside it is literal."""
+    terms = list(dict.fromkeys(t.lower() for t in _TERM.findall(q)))
+    terms = ([t for t in terms if t not in STOPWORDS] or terms)[:MAX_TERMS]
+    return " OR ".join(f'"{t}"' for t in terms) or None
+
+def search(q: str, user_id: str, n_results: int) -> List[Tuple[str, Dict[str, Any], str, float]]:
+    """Top chunks by BM25 as (document, metadata, id, score); higher score is better."""
+    expr = match_expr(q)
+    if not expr:
+        return []
+    with _lock:
+        rows = _conn.execute(
+            "SELECT c.text, c.meta, c.id, bm25(fts) AS s FROM fts JOIN chunks c ON c.rowid = fts.rowid "
+            "WHERE fts MATCH ? AND c.user_id = ? ORDER BY s LIMIT ?",
+            (expr, user_id, n_results)).fetchall()
+    return [(text, json.loads(meta), _id, -s) for text, meta, _id, s in rows]
+
+def rebuild(pages: Iterable[Tuple[List[str], List[str], List[Dict[str, Any]]]]):
+    """Re-index from scratch out of (ids, documents, metadatas) pages of the vector store."""
+    with _lock:
+        _conn.execute("DELETE FROM chunks")
+        _conn.execute("INSERT INTO fts(fts) VALUES ('delete-all')")
+    for ids, documents, metadatas in pages:
+        add(ids, documents, metadatas)
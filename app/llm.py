@@ -0,0 +1,177 @@
+import bisect, hashlib, threading, time
+from concurrent.futures import Future
+from typing import Any, Dict, Iterator, Optional
+import google.generativeai as genai
+from google.api_core import exceptions as gexc
+from app import config
+from app.ratelimit import TokenBucket
+
+# The one way to call the Gemini generate API. Every call site goes through here so that:
+#   - model handles are built once per model name and reused
+#   - identical requests already in flight are coalesced: one call, every caller gets its result
+#   - the whole process shares one concurrency cap (LLM_CONCURRENCY) and one rate budget
+#     (LLM_RPM); a 429 stalls the budget for everyone, like the embedder does
+#   - latency and token counts are kept as histograms per call site (`site`), see stats()
+
+genai.configure(api_key=config.GEMINI_API_KEY)
+
+_RETRYABLE = (gexc.ResourceExhausted, gexc.ServiceUnavailable, gexc.DeadlineExceeded, gexc.InternalServerError)
+
+_bucket = TokenBucket(rate=config.LLM_RPM / 60.0, capacity=max(1, config.LLM_CONCURRENCY))
+_slots = threading.BoundedSemaphore(max(1, config.LLM_CONCURRENCY))
+
+_lock = threading.Lock()
+_models: Dict[str, Any] = {}
+_inflight: Dict[str, Future] = {}
+
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 32768)
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.n = 0
+        self.total = 0.0
+
+    def add(self, v: float):
+        self.counts[bisect.bisect_left(self.bounds, v)] += 1
+        self.n += 1
+        self.total += v
+
+    def _quantile(self, q: float):
+        """Upper bound of the bucket holding the q-quantile (None past the last bound)."""
+        rank, seen = q * self.n, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else None
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        buckets = {f"le_{b}": c for b, c in zip(self.bounds, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {"count": self.n, "avg": round(self.total / self.n, 1) if self.n else None,
+                "p50_le": self._quantile(0.5) if self.n else None,
+                "p95_le": self._quantile(0.95) if self.n else None, "buckets": buckets}
+
+_sites: Dict[str, Dict[str, Any]] = {}
+
+def _site(name: str) -> Dict[str, Any]:
+    # callers hold _lock
+    s = _sites.get(name)
+    if s is None:
+        s = _sites[name] = {"calls": 0, "coalesced": 0, "errors": 0, "retries": 0, "throttled": 0,
+                            "latency_ms": Histogram(LATENCY_BUCKETS_MS),
+                            "prompt_tokens": Histogram(TOKEN_BUCKETS), "output_tokens": Histogram(TOKEN_BUCKETS)}
+    return s
+
+def _bump(site: str, key: str, n: int = 1):
+    with _lock:
+        _site(site)[key] += n
+
+def _record(site: str, t0: float, usage):
+    with _lock:
+        s = _site(site)
+        s["calls"] += 1
+        s["latency_ms"].add((time.perf_counter() - t0) * 1000)
+        if usage is not None:
+            s["prompt_tokens"].add(getattr(usage, "prompt_token_count", 0) or 0)
+            s["output_tokens"].add(getattr(usage, "candidates_token_count", 0) or 0)
+
+def model(name: Optional[str] = None):
+    name = name or config.GEN_MODEL
+    with _lock:
+        m = _models.get(name)
+        if m is None:
+            m = _models[name] = genai.GenerativeModel(name)
+    return m
+
+def _gen_config(temperature: float, max_output_tokens: int, json_mode: bool):
+    kw = {"response_mime_type": "application/json"} if json_mode else {}
+    return genai.types.GenerationConfig(temperature=temperature, max_output_tokens=max_output_tokens, **kw)
+
+def _request(site: str, prompt: str, gen_config, stream: bool):
+    """Send one request under the shared budget, retrying throttling / transient errors."""
+    attempt, backoff = 0, 1.0
+    while True:
+        _bucket.acquire()
+        try:
+            return model().generate_content(prompt, generation_config=gen_config, stream=stream)
+        except _RETRYABLE as e:
+            attempt += 1
+            _bump(site, "retries")
+            if isinstance(e, gexc.ResourceExhausted):
+                _bump(site, "throttled")
+            if attempt > config.LLM_MAX_RETRIES:
+                raise
+            _bucket.penalize(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+def _call(site: str, prompt: str, gen_config) -> str:
+    with _slots:
+        t0 = time.perf_counter()
+        try:
+            resp = _request(site, prompt, gen_config, stream=False)
+            text = getattr(resp, "text", "") if resp else ""
+        except Exception:
+            _bump(site, "errors")
+            raise
+        _record(site, t0, getattr(resp, "usage_metadata", None))
+    if not text:
+        raise ValueError("LLM returned empty.")
+    return text
+
+def generate(prompt: str, site: str, temperature: float = 0.2, max_output_tokens: int = 400,
+             json_mode: bool = False) -> str:
+    """Blocking generate; raises ValueError on an empty response. `site` names the caller in stats()."""
+    key = hashlib.sha256(f"{config.GEN_MODEL}\x1f{temperature}\x1f{max_output_tokens}\x1f{json_mode}\x1f{prompt}"
+                         .encode("utf-8")).hexdigest()
+    with _lock:
+        fut = _inflight.get(key)
+        leader = fut is None
+        if leader:
+            fut = _inflight[key] = Future()
+        else:
+            _site(site)["coalesced"] += 1
+    if not leader:
+        return fut.result()
+    try:
+        text = _call(site, prompt, _gen_config(temperature, max_output_tokens, json_mode))
+        fut.set_result(text)
+        return text
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+def stream(prompt: str, site: str, temperature: float = 0.2, max_output_tokens: int = 400) -> Iterator[str]:
+    """Yield text pieces as the model produces them (never coalesced). Holds a concurrency
+    slot until the stream is exhausted or closed."""
+    with _slots:
+        t0 = time.perf_counter()
+        usage = None
+        try:
+            resp = _request(site, prompt, _gen_config(temperature, max_output_tokens, False), stream=True)
+            for chunk in resp:
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                try:
+                    text = chunk.text
+                except ValueError:  # a chunk with no text parts (e.g. only a finish reason)
+                    continue
+                if text:
+                    yield text
+        except Exception:
+            _bump(site, "errors")
+            raise
+        _record(site, t0, usage)
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        sites = {}
+        for name, s in _sites.items():
+            sites[name] = {k: (v.snapshot() if isinstance(v, Histogram) else v) for k, v in s.items()}
+        inflight = len(_inflight)
+    return {"inflight": inflight, "sites": sites}
@@ -27,6 +27,48 @@ class KBIngestResponse(BaseModel):
     chunks: int
     title: str
     source_url: Optional[str] = None
+    chunks_added: Optional[int] = None     # newly embedded on this ingest
+    chunks_removed: Optional[int] = None   # stale chunks deleted on re-ingest
+    unchanged: bool = False                # identical to an already-ingested document
+
+class KBLinkBulkRequest(BaseModel):
+    urls: List[str]
+    user_id: str = "demo"
+
+class KBLinkResult(BaseModel):
+    url: str
+    ok: bool
+    result: Optional[KBIngestResponse] = None
+    not_modified: bool = False   # the page answered 304 and was not re-ingested
+    error: Optional[str] = None
+
+class IngestJob(BaseModel):
+    job_id: str
+    kind: str                       # "file" | "url"
+    stage: str                      # queued | parsing | chunking | embedding | done | failed
+    title: Optional[str] = None
+    source_url: Optional[str] = None
+    document_id: Optional[str] = None
+    chunks_total: Optional[int] = None
+    chunks_done: int = 0
+    chunks_per_sec: Optional[float] = None
+    error: Optional[str] = None
+    created_at: int
+    updated_at: int
+
+class BulkIngestRun(BaseModel):
+    run_id: str
+    status: str                     # queued | running | done | failed
+    source: str                     # archive filename or directory
+    docs_done: int = 0
+    docs_unchanged: int = 0
+    docs_failed: int = 0
+    chunks_done: int = 0
+    docs_per_sec: Optional[float] = None
+    chunks_per_sec: Optional[float] = None
+    error: Optional[str] = None
+    created_at: int
+    updated_at: int
 
 class KBAnswer(BaseModel):
     answer: str
@@ -45,6 +87,7 @@ class SlackSendRequest(BaseModel):
     text: Optional[str] = None
     thread_ts: Optional[str] = None   # reply in a thread (optional)
     channel_id: Optional[str] = None  # if you already have it
+    permalink: bool = True            # False skips the chat.getPermalink call per delivery
 
 class SlackSendResult(BaseModel):
     deliveries: list[dict]
@@ -66,4 +109,5 @@ class Task(BaseModel):
     priority_score: Optional[float] = None
 
 class TaskListResponse(BaseModel):
-    tasks: List[Task]
\ No newline at end of file
+    tasks: List[Task]
+    timings: Optional[Dict[str, float]] = None   # per-stage ms + enriched/heuristic counts
\ No newline at end of file
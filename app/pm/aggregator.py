@@ -1,13 +1,20 @@
 # app/pm/aggregator.py
-from typing import List
+import time, hashlib, threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Dict, Optional
 from app.models import Task, TaskListResponse
 from app.pm.jira_provider import JiraProvider
 from app import config
-from app import ai, priority, utils
+from app import ai, priority, utils, summary_store
 from app.models import AISummary
 
-def _summarize_task(task: Task) -> AISummary:
-    """Use your Gemini JSON summary schema to classify importance/urgency from task context."""
+# Shared pools: provider fetches are I/O-bound and few; enrichment is bounded so a
+# burst of /pm/tasks polls cannot multiply LLM concurrency.
+_fetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="pm-fetch")
+_enrich_pool = ThreadPoolExecutor(max_workers=max(1, config.PM_ENRICH_WORKERS), thread_name_prefix="pm-enrich")
+
+def _summary_item(task: Task) -> Dict[str, str]:
+    """The task as an item for ai.gemini_summarize_batch (same strict JSON summary schema as email)."""
     content = f"""
 Title: {task.title}
 Priority: {task.priority or "Unknown"}
@@ -17,14 +24,24 @@ Project: {task.project or "Unknown"}
 Description:
 {(task.description or "")[:3000]}
 """
-    # Reuse your existing strict JSON summarizer prompt
-    return ai.gemini_summarize(message_text=content, subject=f"[{task.provider}] {task.title}", sender="PM System")
+    return {"id": f"{task.provider}:{task.id}", "text": content, "subject": f"[{task.provider}] {task.title}",
+            "sender": "PM System"}
 
 def _score(task: Task, ai_sum: AISummary) -> float:
     # Use due date to shape deadline proximity; we pass internal_ms as "now" if no provider timestamp.
     internal_ms = utils.now_ms()
     return priority.compute_priority(ai_sum, internal_ms=internal_ms, sender_role="pm", blocked_flag=("blocked" in (task.status or "")))
 
+_LABEL_LEVEL = {"highest": "high", "blocker": "high", "critical": "high", "high": "high",
+                "medium": "medium", "low": "low", "lowest": "low", "trivial": "low"}
+
+def _heuristic_score(task: Task) -> float:
+    """Score from provider fields alone, for tasks whose AI enrichment missed the deadline."""
+    level = _LABEL_LEVEL.get((task.priority or "").lower(), "medium")
+    guess = AISummary(summary_160=task.title[:160], importance=level, urgency=level, actionable=True,
+                      next_steps=[], suggested_due_iso=task.due_iso, confidence=0.3)
+    return _score(task, guess)
+
 def active_providers():
     provs = []
     if config.JIRA_BASE_URL and config.JIRA_EMAIL and config.JIRA_API_TOKEN:
@@ -35,25 +52,111 @@ def active_providers():
     # Add more providers here in the future (TrelloProvider, AsanaProvider, etc.)
     return provs
 
-def list_tasks_all(limit_per_provider: int = 30, assignee_me: bool = True) -> TaskListResponse:
-    tasks: List[Task] = []
-    for p in active_providers():
-        try:
-            tasks.extend(p.list_tasks(assignee_me=assignee_me, limit=limit_per_provider))
-        except Exception:
+def _fingerprint(task: Task) -> str:
+    """Changes whenever a field the summary depends on (or the prompt/model) changes."""
+    parts = [ai.SUMMARY_VERSION, task.title, task.description or "", task.status or "",
+             task.priority or "", task.due_iso or ""]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def _enrich(tasks: List[Task]) -> List[Task]:
+    """Summarize a batch of tasks in one call (ai.gemini_summarize_batch falls back per task)."""
+    items = [_summary_item(t) for t in tasks]
+    try:
+        got = ai.gemini_summarize_batch(items, site="pm.summary")
+    except Exception:
+        got = {}
+    for t, item in zip(tasks, items):
+        ai_sum = got.get(item["id"])
+        if ai_sum is None:
+            # still include the task even if AI fails
+            t.priority_score = 0.0
             continue
+        # cached even if this lands after the request deadline, so the next poll gets it
+        summary_store.put(t.provider, t.id, _fingerprint(t), ai_sum)
+        t.ai = ai_sum
+        t.priority_score = _score(t, ai_sum)
+    return tasks
+
+def list_tasks_all(limit_per_provider: int = 30, assignee_me: bool = True,
+                   deadline_s: Optional[float] = None) -> TaskListResponse:
+    """
+    Stream tasks from every provider concurrently and enrich them on a bounded pool, in
+    batches of SUMMARY_BATCH as they are yielded. Whatever is not enriched by `deadline_s`
+    (from the start of the call) is scored heuristically instead of holding up the response.
+    """
+    deadline_s = config.PM_ENRICH_DEADLINE if deadline_s is None else deadline_s
+    t0 = time.perf_counter()
+    timings: Dict[str, float] = {}
+
+    hits: List[Task] = []
+    futs = {}
+    lock = threading.Lock()
 
-    # Enrich each task with AI summary + priority score
-    enriched: List[Task] = []
-    for t in tasks:
+    def _submit(tasks: List[Task]):
+        by_id = {f"{t.provider}:{t.id}": t for t in tasks}
+        for part in ai.summary_batches([_summary_item(t) for t in tasks]):  # also splits on prompt size
+            batch = [by_id[i["id"]] for i in part]
+            with lock:
+                futs[_enrich_pool.submit(_enrich, batch)] = batch
+
+    def _drain(p):
+        # runs on the fetch pool; each page of tasks is checked against the summary store in
+        # one lookup, and the misses are queued for enrichment a batch at a time
+        page: List[Task] = []
+        todo: List[Task] = []
+
+        def _flush_page():
+            nonlocal todo
+            # one provider's tasks share a namespace in the store
+            cached = summary_store.get_many(page[0].provider, {t.id: _fingerprint(t) for t in page}) if page else {}
+            for t in page:
+                hit = cached.get(t.id)
+                if hit is not None:
+                    t.ai = hit
+                    t.priority_score = _score(t, hit)
+                    with lock:
+                        hits.append(t)
+                    continue
+                todo.append(t)
+                if len(todo) >= max(1, config.SUMMARY_BATCH):
+                    _submit(todo)
+                    todo = []
+            page.clear()
+
+        try:
+            for t in p.list_tasks(assignee_me=assignee_me, limit=limit_per_provider):
+                page.append(t)
+                if len(page) >= max(1, config.JIRA_PAGE_SIZE):
+                    _flush_page()
+        finally:
+            _flush_page()  # the last page, or whatever was yielded before the provider failed
+            _submit(todo)
+
+    for f in [_fetch_pool.submit(_drain, p) for p in active_providers()]:
         try:
-            ai_sum = _summarize_task(t)
-            t.ai = ai_sum
-            t.priority_score = _score(t, ai_sum)
+            f.result()
         except Exception:
-            # still include the task even if AI fails
-            t.priority_score = 0.0
-        enriched.append(t)
+            continue  # keep whatever that provider yielded before failing
+    timings["fetch_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    remaining = max(0.0, deadline_s - (time.perf_counter() - t0))
+    done, pending = wait(futs, timeout=remaining)
+    timings["enrich_ms"] = round((time.perf_counter() - t0) * 1000 - timings["fetch_ms"], 1)
+
+    enriched: List[Task] = list(hits)
+    n_enriched = n_heuristic = 0
+    for f, batch in futs.items():
+        if f in done:
+            enriched.extend(f.result())
+            n_enriched += len(batch)
+        else:
+            f.cancel()  # drop it if it never started; a running call just finishes in the background
+            enriched.extend(t.copy(update={"ai": None, "priority_score": _heuristic_score(t)}) for t in batch)
+            n_heuristic += len(batch)
+    timings["cached"] = len(hits)
+    timings["enriched"] = n_enriched
+    timings["heuristic"] = n_heuristic
 
     enriched.sort(key=lambda x: x.priority_score or 0, reverse=True)
-    return TaskListResponse(tasks=enriched)
+    timings["total_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return TaskListResponse(tasks=enriched, timings=timings)
@@ -1,11 +1,12 @@
 # app/pm/base.py
-from typing import List, Dict, Any, Optional
+from typing import Iterable, Dict, Any, Optional
 from app.models import Task
 
 class PMProvider:
     name: str = "base"
 
-    def list_tasks(self, assignee_me: bool = True, limit: int = 50) -> List[Task]:
+    def list_tasks(self, assignee_me: bool = True, limit: int = 50) -> Iterable[Task]:
+        """May be a generator; the aggregator starts enriching tasks as they are yielded."""
         raise NotImplementedError
 
     def get_task(self, task_id: str) -> Task:
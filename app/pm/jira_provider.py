@@ -1,10 +1,27 @@
 # app/pm/jira_provider.py
 import base64, requests
-from typing import List, Dict, Any, Optional
+from typing import Iterator, Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from app.pm.base import PMProvider
 from app import config
 from app.models import Task
 
+FIELDS = "summary,description,priority,duedate,status,project"
+
+def _build_session() -> requests.Session:
+    # Keep-alive pool shared by every JiraProvider instance (one is built per request).
+    # Only GETs are retried; a retried POST could double-post a comment.
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(["GET"]), respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    sess = requests.Session()
+    sess.mount("https://", adapter)
+    sess.mount("http://", adapter)
+    return sess
+
+_session = _build_session()
+
 class JiraProvider(PMProvider):
     name = "jira"
 
@@ -21,59 +38,77 @@ class JiraProvider(PMProvider):
 
     def _get(self, path: str, params: Optional[Dict[str, Any]] = None):
         url = f"{self.base}{path}"
-        r = requests.get(url, headers=self._auth_header, params=params, timeout=20)
+        r = _session.get(url, headers=self._auth_header, params=params, timeout=20)
         r.raise_for_status()
         return r.json()
 
     def _post(self, path: str, payload: Dict[str, Any]):
         url = f"{self.base}{path}"
-        r = requests.post(url, headers=self._auth_header, json=payload, timeout=20)
+        r = _session.post(url, headers=self._auth_header, json=payload, timeout=20)
         r.raise_for_status()
         return r.json()
 
-    def list_tasks(self, assignee_me: bool = True, limit: int = 50) -> List[Task]:
+    def _to_task(self, it: Dict[str, Any]) -> Task:
+        key = it.get("key")
+        iid = it.get("id")
+        f = it.get("fields", {})
+        title = f.get("summary") or key
+        desc = (f.get("description") or "")  # Jira Cloud returns rich text in v3; often stringified
+        priority = (f.get("priority") or {}).get("name")
+        status = (f.get("status") or {}).get("name")
+        due = f.get("duedate")  # ISO date
+        project = (f.get("project") or {}).get("name")
+        url = f"{self.base}/browse/{key}"
+
+        return Task(
+            provider=self.name,
+            id=iid,
+            key=key,
+            title=title,
+            description=desc if isinstance(desc, str) else str(desc),
+            status=self.normalize_status(status),
+            priority=priority,
+            due_iso=due,
+            url=url,
+            project=project
+        )
+
+    def list_tasks(self, assignee_me: bool = True, limit: int = 50) -> Iterator[Task]:
+        """
+        Stream up to `limit` open issues, one search page at a time (JIRA_PAGE_SIZE each).
+        Pages by nextPageToken when the endpoint returns one (/search/jql), else by startAt.
+        """
         jql = []
         if assignee_me:
             jql.append("assignee = currentUser()")
         jql.append('statusCategory != Done')
         jql_stmt = " AND ".join(jql) + " ORDER BY priority DESC, updated DESC"
 
-        params = {
-            "jql": jql_stmt,
-            "maxResults": limit,
-            "fields": "summary,description,priority,duedate,status,project"
-        }
-        data = self._get("/rest/api/3/search", params=params)
-        issues = data.get("issues", [])
-        out: List[Task] = []
-        for it in issues:
-            key = it.get("key")
-            iid = it.get("id")
-            f = it.get("fields", {})
-            title = f.get("summary") or key
-            desc = (f.get("description") or "")  # Jira Cloud returns rich text in v3; often stringified
-            priority = (f.get("priority") or {}).get("name")
-            status = (f.get("status") or {}).get("name")
-            due = f.get("duedate")  # ISO date
-            project = (f.get("project") or {}).get("name")
-            url = f"{self.base}/browse/{key}"
-
-            out.append(Task(
-                provider=self.name,
-                id=iid,
-                key=key,
-                title=title,
-                description=desc if isinstance(desc, str) else str(desc),
-                status=self.normalize_status(status),
-                priority=priority,
-                due_iso=due,
-                url=url,
-                project=project
-            ))
-        return out
+        fetched, start_at, token = 0, 0, None
+        while fetched < limit:
+            params: Dict[str, Any] = {
+                "jql": jql_stmt,
+                "maxResults": min(config.JIRA_PAGE_SIZE, limit - fetched),
+                "fields": FIELDS
+            }
+            if token:
+                params["nextPageToken"] = token
+            else:
+                params["startAt"] = start_at
+            data = self._get(config.JIRA_SEARCH_PATH, params=params)
+            issues = data.get("issues", [])
+            for it in issues[:limit - fetched]:
+                yield self._to_task(it)
+            fetched += len(issues)
+            start_at += len(issues)
+            token = data.get("nextPageToken")
+            if not issues or data.get("isLast"):
+                break
+            if not token and start_at >= data.get("total", start_at):
+                break
 
     def get_task(self, task_id: str) -> Task:
-        data = self._get(f"/rest/api/3/issue/{task_id}", params={"fields":"summary,description,priority,duedate,status,project"})
+        data = self._get(f"/rest/api/3/issue/{task_id}", params={"fields": FIELDS})
         key = data.get("key"); iid = data.get("id")
         f = data.get("fields", {})
         return Task(
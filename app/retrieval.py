@@ -0,0 +1,107 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app import ai, answer_cache, config, kb_store, lexical
+from app.models import KBAnswer
+
+# KB retrieval for /kb/query. Three modes:
+#   vector:  cosine HNSW search in Chroma (one embedding call for the question)
+#   lexical: BM25 over the local inverted index, no embedding call at all
+#   hybrid:  both lists fused with reciprocal-rank fusion, score = sum 1/(KB_RRF_K + rank)
+
+MODES = ("hybrid", "vector", "lexical")
+Hit = Tuple[str, Dict[str, Any], str]   # (document, metadata, chunk id)
+
+SYSTEM = ("You are a precise research assistant. Answer using ONLY the provided context. "
+          "If missing, say you don't have enough info. Cite sources inline like [1], [2]. "
+          "Provide a concise, actionable answer.")
+
+def embed_query(q: str) -> List[float]:
+    return ai.embed_batch([q])[0]
+
+def _vector(q: str, user_id: str, n: int, qvec: Optional[List[float]] = None) -> List[Hit]:
+    qvec = qvec if qvec is not None else embed_query(q)
+    res = kb_store.query(user_id, qvec, n)
+    docs = (res.get("documents") or [[]])[0]
+    metas = (res.get("metadatas") or [[]])[0]
+    ids = (res.get("ids") or [[]])[0]
+    return list(zip(docs, metas, ids))
+
+def _lexical(q: str, user_id: str, n: int) -> List[Hit]:
+    return [(doc, meta, _id) for doc, meta, _id, _ in lexical.search(q, user_id, n)]
+
+def rrf(*ranked: List[Hit], k: int = config.KB_RRF_K) -> List[Hit]:
+    scores: Dict[str, float] = {}
+    hits: Dict[str, Hit] = {}
+    for hits_list in ranked:
+        for rank, hit in enumerate(hits_list, 1):
+            scores[hit[2]] = scores.get(hit[2], 0.0) + 1.0 / (k + rank)
+            hits.setdefault(hit[2], hit)
+    return [hits[i] for i in sorted(scores, key=scores.get, reverse=True)]
+
+def search(q: str, user_id: str, k: int = 6, mode: Optional[str] = None,
+           qvec: Optional[List[float]] = None) -> List[Hit]:
+    """Top `k` chunks, skipping near-duplicates (adjacent chunks of the same document).
+    Pass `qvec` if the question is already embedded."""
+    mode = mode or config.KB_RETRIEVAL
+    n = max(8, k + 2)
+    if mode == "vector":
+        ranked = _vector(q, user_id, n, qvec)
+    elif mode == "lexical":
+        ranked = _lexical(q, user_id, n)
+    else:
+        ranked = rrf(_lexical(q, user_id, n), _vector(q, user_id, n, qvec))
+
+    seen, picks = set(), []
+    for doc, meta, _id in ranked:
+        if not meta: continue
+        key = (meta.get("doc_id"), int(meta.get("order", 0)) // 2)
+        if key in seen: continue
+        seen.add(key); picks.append((doc, meta, _id))
+        if len(picks) >= k: break
+    return picks
+
+def build_prompt(q: str, picks: List[Hit]) -> Tuple[str, List[Dict[str, Any]]]:
+    """(prompt, citations) for answering `q` from the retrieved chunks."""
+    context_blocks, cits = [], []
+    for i, (doc, meta, _id) in enumerate(picks, 1):
+        context_blocks.append(f"[{i}] Title: {meta.get('title')}\nURL: {meta.get('url')}\nExcerpt:\n{doc}\n")
+        cits.append({"doc_id": meta.get("doc_id"), "title": meta.get("title"),
+                     "url": meta.get("url"), "chunk_preview": (doc or "")[:200]})
+    prompt = SYSTEM + "\n\nCONTEXT:\n" + "\n\n".join(context_blocks) + f"\n\nQUESTION: {q}\n\nANSWER WITH CITATIONS:"
+    return prompt, cits
+
+def answer_events(q: str, user_id: str, k: int = 6, mode: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    (event, data) pairs for a streamed answer: "citations" right after retrieval, then
+    "token" pieces as the model produces them, then "done". A cached answer is sent as a
+    single token. Failures after the stream has started arrive as an "error" event.
+    """
+    mode = mode or config.KB_RETRIEVAL
+    try:
+        qvec = embed_query(q) if mode != "lexical" else None
+        picks = search(q, user_id, k, mode, qvec=qvec)
+        if not picks:
+            yield "citations", {"citations": [], "used_chunks": 0}
+            yield "token", {"text": "I don't have enough information to answer that yet."}
+            yield "done", {"cached": False}
+            return
+        chunk_ids = [p[2] for p in picks]
+        cached = answer_cache.lookup(user_id, q, qvec, chunk_ids)
+        if cached is not None:
+            yield "citations", {"citations": cached.citations, "used_chunks": cached.used_chunks}
+            yield "token", {"text": cached.answer}
+            yield "done", {"cached": True}
+            return
+
+        prompt, cits = build_prompt(q, picks)
+        yield "citations", {"citations": cits, "used_chunks": len(picks)}
+        parts = []
+        for piece in ai.generate_text_stream(prompt, temperature=0.2, max_output_tokens=400, site="kb.answer_stream"):
+            parts.append(piece)
+            yield "token", {"text": piece}
+        answer = "".join(parts).strip()
+        if answer:
+            answer_cache.put(user_id, q, qvec, chunk_ids,
+                             KBAnswer(answer=answer, citations=cits, used_chunks=len(picks)))
+        yield "done", {"cached": False}
+    except Exception as e:
+        yield "error", {"message": str(e)}
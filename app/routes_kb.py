@@ -1,110 +1,75 @@
 from typing import Optional, List, Dict, Any
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-import uuid
-import json
+from fastapi.responses import StreamingResponse
+import os, json
 
 from .models import KBIngestResponse, KBAnswer, FlashcardSet
-from .utils import parse_file, chunk_text, make_meta, fetch_url
-from .gemini_service import embed_batch
-from .kb_store import kb
-import google.generativeai as genai
-from .config import GEN_MODEL
+from .utils import spool_upload
+from .aio import run_io
+from .ingest import store_chunks, chunk_file, ingest_url
+from .fetcher import FetchError
+from .retrieval import MODES, search, build_prompt, embed_query, answer_events
+from . import answer_cache, flashcards, llm
+from .config import KB_RETRIEVAL
 
 router = APIRouter()
 
 @router.post("/kb/upload", response_model=KBIngestResponse)
 async def kb_upload(file: UploadFile = File(...), title: Optional[str] = None, user_id: str = "demo"):
-    text = parse_file(file)
+    path = await run_io(spool_upload, file.file, file.filename)
+    try:
+        chunks = await run_io(chunk_file, path, file.filename)
+    finally:
+        os.remove(path)
     title = title or file.filename
-    if not text.strip():
+    if not chunks:
         raise HTTPException(400, "No text extracted.")
-    chunks = chunk_text(text)
-    vectors = embed_batch(chunks)
-    doc_id = str(uuid.uuid4())
-    ids = [f"{doc_id}:{i}" for i in range(len(chunks))]
-    metas = [make_meta(doc_id, title, user_id, i) for i in range(len(chunks))]
-    kb.add(ids=ids, documents=chunks, metadatas=metas, embeddings=vectors)
-    return KBIngestResponse(document_id=doc_id, chunks=len(chunks), title=title)
+    return await run_io(store_chunks, chunks, title, user_id, source=file.filename)
 
 @router.post("/kb/link", response_model=KBIngestResponse)
 async def kb_link(url: str = Form(...), user_id: str = "demo"):
     try:
-        text = fetch_url(url)
-    except Exception as e:
+        res, _ = await ingest_url(url, user_id)
+    except FetchError as e:
         raise HTTPException(400, f"Fetch failed: {e}")
-    title = text.split("\n", 1)[0][:120]
-    chunks = chunk_text(text)
-    vectors = embed_batch(chunks)
-    doc_id = str(uuid.uuid4())
-    ids = [f"{doc_id}:{i}" for i in range(len(chunks))]
-    metas = [make_meta(doc_id, title, user_id, i, url=url) for i in range(len(chunks))]
-    kb.add(ids=ids, documents=chunks, metadatas=metas, embeddings=vectors)
-    return KBIngestResponse(document_id=doc_id, chunks=len(chunks), title=title, source_url=url)
+    return res
 
 @router.get("/kb/query", response_model=KBAnswer)
-def kb_query(q: str, user_id: str = "demo", k: int = 6):
-    qvec = embed_batch([q])[0]
-    res = kb.query(query_embeddings=[qvec], n_results=max(8, k+2), where={"user_id": user_id})
-    docs = (res.get("documents") or [[]])[0]
-    metas = (res.get("metadatas") or [[]])[0]
-    ids = (res.get("ids") or [[]])[0]
-
-    seen = set(); picks = []
-    for doc, meta, _id in zip(docs, metas, ids):
-        if not meta:
-            continue
-        key = (meta.get("doc_id"), int(meta.get("order", 0)) // 2)
-        if key in seen:
-            continue
-        seen.add(key)
-        picks.append((doc, meta, _id))
-        if len(picks) >= k:
-            break
-
+def kb_query(q: str, user_id: str = "demo", k: int = 6, mode: Optional[str] = None):
+    if mode is not None and mode not in MODES:
+        raise HTTPException(400, f"mode must be one of {', '.join(MODES)}")
+    mode = mode or KB_RETRIEVAL
+    qvec = embed_query(q) if mode != "lexical" else None
+    picks = search(q, user_id, k, mode, qvec=qvec)
     if not picks:
         return KBAnswer(answer="I don't have enough information to answer that yet.", citations=[], used_chunks=0)
 
-    context_blocks = []
-    cits = []
-    for i, (doc, meta, _id) in enumerate(picks, 1):
-        context_blocks.append(f"[{i}] Title: {meta.get('title')}\nURL: {meta.get('url')}\nExcerpt:\n{doc}\n")
-        cits.append({"doc_id": meta.get("doc_id"), "title": meta.get("title"), "url": meta.get("url"), "chunk_preview": (doc or "")[:200]})
-
-    system = """You are a precise research assistant. Answer using ONLY the provided context. If missing, say you don't have enough info.
-Cite sources inline like [1], [2]. Provide a concise, actionable answer."""
-    prompt = system + "\n\nCONTEXT:\n" + "\n\n".join(context_blocks) + f"\n\nQUESTION: {q}\n\nANSWER WITH CITATIONS:"
-
-    model = genai.GenerativeModel(GEN_MODEL)
-    resp = model.generate_content(
-        prompt,
-        generation_config=genai.types.GenerationConfig(temperature=0.2, max_output_tokens=400)
-    )
-    if not resp or not getattr(resp, "text", "").strip():
+    chunk_ids = [p[2] for p in picks]
+    cached = answer_cache.lookup(user_id, q, qvec, chunk_ids)
+    if cached is not None:
+        return cached
+    prompt, cits = build_prompt(q, picks)
+    try:
+        answer = llm.generate(prompt, "kb.answer", temperature=0.2, max_output_tokens=400)
+    except ValueError:
+        raise HTTPException(502, "LLM returned empty.")
+    if not answer.strip():
         raise HTTPException(502, "LLM returned empty.")
-    return KBAnswer(answer=resp.text.strip(), citations=cits, used_chunks=len(picks))
+    out = KBAnswer(answer=answer.strip(), citations=cits, used_chunks=len(picks))
+    answer_cache.put(user_id, q, qvec, chunk_ids, out)
+    return out
+
+@router.get("/kb/query/stream")
+def kb_query_stream(q: str, user_id: str = "demo", k: int = 6, mode: Optional[str] = None):
+    if mode is not None and mode not in MODES:
+        raise HTTPException(400, f"mode must be one of {', '.join(MODES)}")
+    events = (f"event: {ev}\ndata: {json.dumps(data)}\n\n" for ev, data in answer_events(q, user_id, k, mode))
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @router.get("/kb/flashcards", response_model=FlashcardSet)
 def kb_flashcards(doc_id: str, user_id: str = "demo", n: int = 10):
-    res = kb.get(where={"doc_id": doc_id, "user_id": user_id})
-    docs = res.get("documents") or []
-    metas = res.get("metadatas") or []
-    if not docs:
+    cards = flashcards.generate(doc_id, user_id, n)
+    if cards is None:
         raise HTTPException(404, "Doc not found for this user.")
-    text = "\n\n".join(docs)
-    title = (metas[0].get("title") if metas and isinstance(metas[0], dict) else "Untitled")
-
-    prompt = f"""Create {n} compact flashcards from the content below. Focus on key definitions, decisions, and cause-effect.
-Return JSON: {{ "cards": [{{"q":"...","a":"..."}}] }}
-CONTENT:
-{text[:12000]}
-"""
-    model = genai.GenerativeModel(GEN_MODEL)
-    r = model.generate_content(
-        prompt,
-        generation_config=genai.types.GenerationConfig(temperature=0.3, max_output_tokens=800, response_mime_type="application/json")
-    )
-    try:
-        data = json.loads(r.text)
-        return FlashcardSet(source_title=title, cards=data["cards"])
-    except Exception:
-        return FlashcardSet(source_title=title, cards=[{"q": "What is the main idea?", "a": text[:200]}])
+    return cards
@@ -0,0 +1,75 @@
+import os, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+from fastapi import HTTPException
+from app import slack_service
+
+SLACK_SEND_WORKERS = int(os.getenv("SLACK_SEND_WORKERS", "8"))
+
+# Shared pool: per-method token buckets in slack_service keep the fan-out inside Slack's limits.
+_pool = ThreadPoolExecutor(max_workers=max(1, SLACK_SEND_WORKERS), thread_name_prefix="slack")
+
+def _ms(t0: float) -> float:
+    return round((time.perf_counter() - t0) * 1000, 1)
+
+def _resolve(tgt: Dict[str, Any]) -> Dict[str, Any]:
+    """Slack destination for a target, or {"error": ...} if the lookup call itself failed.
+    Unknown users/channels and bad types raise HTTPException."""
+    t0 = time.perf_counter()
+    ttype = tgt.get("type"); name = tgt.get("name")
+    try:
+        return _lookup(ttype, name, t0)
+    except HTTPException:
+        raise
+    except Exception as e:  # Slack API / network error: report it for this target only
+        return {"error": str(e), "resolve_ms": _ms(t0)}
+
+def _lookup(ttype: Optional[str], name: Optional[str], t0: float) -> Dict[str, Any]:
+    if ttype == "channel_id":
+        dest = {"channel": name}
+    elif ttype == "channel":
+        cid = slack_service.get_channel_id_by_name(name)
+        if not cid: raise HTTPException(404, f"Channel {name} not found or bot not invited.")
+        dest = {"channel": cid}
+    elif ttype == "user":
+        uid = slack_service.find_user_id_by_name(name)
+        if not uid: raise HTTPException(404, f"User {name} not found.")
+        dest = {"user": uid}
+    else:
+        raise HTTPException(400, f"Unsupported target type: {ttype}")
+    dest["resolve_ms"] = _ms(t0)
+    return dest
+
+def _send(tgt: Dict[str, Any], dest: Dict[str, Any], text: str, thread_ts: Optional[str],
+          with_permalink: bool) -> Dict[str, Any]:
+    timing = {"resolve_ms": dest["resolve_ms"]}
+    if "error" in dest:
+        return {"target": tgt, "ok": False, "error": dest["error"], "timing": timing}
+    try:
+        t0 = time.perf_counter()
+        if "user" in dest:
+            res = slack_service.send_message_user(dest["user"], text)
+        else:
+            res = slack_service.send_message_channel(dest["channel"], text, thread_ts=thread_ts)
+        timing["send_ms"] = _ms(t0)
+        link = None
+        if with_permalink and "ts" in res:
+            t0 = time.perf_counter()
+            link = slack_service.permalink(res["channel"], res["ts"])
+            timing["permalink_ms"] = _ms(t0)
+        return {"target": tgt, "ok": True, "channel": res.get("channel"), "ts": res.get("ts"),
+                "permalink": link, "timing": timing}
+    except Exception as e:
+        return {"target": tgt, "ok": False, "error": str(e), "timing": timing}
+
+def deliver(targets: List[Dict[str, Any]], text: str, thread_ts: Optional[str] = None,
+            with_permalink: bool = True) -> List[Dict[str, Any]]:
+    """
+    Resolve every target, then post to all of them concurrently.
+    Unknown users/channels and bad types raise before anything is sent; a target whose
+    lookup call fails (Slack API or network error) comes back ok=False and is skipped.
+    Deliveries come back in target order, each with per-stage timings.
+    """
+    resolved = [f.result() for f in [_pool.submit(_resolve, t) for t in targets]]
+    futs = [_pool.submit(_send, t, d, text, thread_ts, with_permalink) for t, d in zip(targets, resolved)]
+    return [f.result() for f in futs]
@@ -1,77 +1,195 @@
-import os, re
-from typing import List, Dict, Any, Optional
+import os, re, threading, time
+from typing import List, Dict, Any, Optional, Set, Tuple
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
+from slack_sdk.http_retry.builtin_handlers import RateLimitErrorRetryHandler
+from app.ratelimit import TokenBucket
 
 SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
 if not SLACK_BOT_TOKEN:
     raise RuntimeError("Set SLACK_BOT_TOKEN to enable Slack integration.")
 client = WebClient(token=SLACK_BOT_TOKEN)
+# honour Retry-After on 429s instead of failing the delivery
+client.retry_handlers.append(RateLimitErrorRetryHandler(max_retry_count=2))
+
+SLACK_DIRECTORY_TTL = float(os.getenv("SLACK_DIRECTORY_TTL", "900"))              # seconds
+SLACK_DIRECTORY_MISS_REFRESH = float(os.getenv("SLACK_DIRECTORY_MISS_REFRESH", "60"))
+
+# Client-side budgets per Web API method (calls/sec, burst), roughly matching Slack's tiers.
+_limiters = {
+    "chat.postMessage": TokenBucket(rate=float(os.getenv("SLACK_RATE_POST", "5")), capacity=5),
+    "conversations.open": TokenBucket(rate=50 / 60, capacity=5),      # tier 3
+    "chat.getPermalink": TokenBucket(rate=100 / 60, capacity=10),     # tier 4
+    "users.list": TokenBucket(rate=20 / 60, capacity=3),              # tier 2
+    "conversations.list": TokenBucket(rate=20 / 60, capacity=3),      # tier 2
+}
+
+def _limit(method: str):
+    _limiters[method].acquire()
 
 # ---------- lookups ----------
 def list_channels(types: str = "public_channel,private_channel") -> List[Dict[str, Any]]:
     chans, cursor = [], None
     while True:
+        _limit("conversations.list")
         resp = client.conversations_list(types=types, cursor=cursor, limit=200)
         chans.extend(resp.get("channels", []))
         cursor = resp.get("response_metadata", {}).get("next_cursor")
         if not cursor: break
     return chans
 
-def get_channel_id_by_name(name: str) -> Optional[str]:
-    name = name.lstrip("#").lower()
-    for c in list_channels():
-        if (c.get("name") or c.get("name_normalized","")).lower() == name:
-            return c["id"]
-    return None
-
 def users_list() -> List[Dict[str, Any]]:
     users, cursor = [], None
     while True:
+        _limit("users.list")
         resp = client.users_list(cursor=cursor, limit=200)
         users.extend(resp.get("members", []))
         cursor = resp.get("response_metadata", {}).get("next_cursor")
         if not cursor: break
     return users
 
-def find_user_id_by_name(name: str) -> Optional[str]:
+# ---------- directory cache ----------
+class _Directory:
     """
-    Resolve 'tom' or '@tom' to a user ID by matching display/real name (case-insensitive).
-    If multiple, returns the first match.
+    Snapshot of a paginated Slack listing plus indexes built from it.
+    Fresh snapshots serve lookups with no API calls; stale ones keep serving while a
+    background thread reloads (stale-while-revalidate). A miss on a snapshot older than
+    SLACK_DIRECTORY_MISS_REFRESH seconds reloads inline once, to pick up new members/channels.
     """
-    name = name.lstrip("@").strip().lower()
-    for u in users_list():
-        if u.get("deleted") or u.get("is_bot"): continue
-        prof = u.get("profile", {})
-        cand = [
-            (prof.get("display_name_normalized") or "").lower(),
-            (prof.get("display_name") or "").lower(),
-            (prof.get("real_name_normalized") or "").lower(),
-            (prof.get("real_name") or "").lower(),
-            (u.get("name") or "").lower(),
-        ]
-        if name in cand:
-            return u["id"]
-    # fuzzy contains
-    for u in users_list():
+    def __init__(self, loader, indexer):
+        self._loader, self._indexer = loader, indexer
+        self._index: Optional[Dict[str, Any]] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._refreshing = False
+
+    def _reload(self, if_loaded_before: Optional[float] = None):
+        with self._load_lock:
+            # another caller may have finished a reload while we waited
+            if if_loaded_before is not None and self._loaded_at > if_loaded_before:
+                return
+            index = self._indexer(self._loader())
+            with self._lock:
+                self._index, self._loaded_at, self._refreshing = index, time.monotonic(), False
+
+    def _background_reload(self):
+        try:
+            self._reload()
+        except Exception:
+            with self._lock:
+                self._refreshing = False
+
+    def index(self) -> Dict[str, Any]:
+        with self._lock:
+            index, age = self._index, time.monotonic() - self._loaded_at
+            stale = index is not None and age > SLACK_DIRECTORY_TTL and not self._refreshing
+            if stale:
+                self._refreshing = True
+        if index is None:
+            self._reload(if_loaded_before=0.0)
+            return self._index
+        if stale:
+            threading.Thread(target=self._background_reload, daemon=True).start()
+        return index
+
+    def lookup(self, fn):
+        res = fn(self.index())
+        loaded_at = self._loaded_at
+        if res is None and time.monotonic() - loaded_at > SLACK_DIRECTORY_MISS_REFRESH:
+            self._reload(if_loaded_before=loaded_at)
+            res = fn(self._index)
+        return res
+
+def _norm(s: Optional[str]) -> str:
+    return (s or "").strip().lower()
+
+def _index_channels(chans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    by_name: Dict[str, str] = {}
+    for c in chans:
+        by_name.setdefault(_norm(c.get("name") or c.get("name_normalized", "")), c["id"])
+    return {"by_name": by_name}
+
+def _trigrams(s: str):
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+def _index_users(users: List[Dict[str, Any]]) -> Dict[str, Any]:
+    exact: Dict[str, str] = {}
+    hays: List[Tuple[str, str]] = []          # (haystack, user id) in listing order
+    grams: Dict[str, Set[int]] = {}           # trigram -> positions in `hays`
+    for u in users:
         if u.get("deleted") or u.get("is_bot"): continue
         prof = u.get("profile", {})
+        for cand in (prof.get("display_name_normalized"), prof.get("display_name"),
+                     prof.get("real_name_normalized"), prof.get("real_name"), u.get("name")):
+            if cand:
+                exact.setdefault(_norm(cand), u["id"])
         hay = " ".join([
             prof.get("display_name",""), prof.get("real_name",""),
             prof.get("display_name_normalized",""), prof.get("real_name_normalized",""),
             u.get("name","")
         ]).lower()
+        pos = len(hays)
+        hays.append((hay, u["id"]))
+        for g in _trigrams(hay):
+            grams.setdefault(g, set()).add(pos)
+    return {"exact": exact, "hays": hays, "grams": grams}
+
+_channels = _Directory(list_channels, _index_channels)
+_users = _Directory(users_list, _index_users)
+
+def get_channel_id_by_name(name: str) -> Optional[str]:
+    name = _norm(name.lstrip("#"))
+    return _channels.lookup(lambda idx: idx["by_name"].get(name))
+
+def _match_user(idx: Dict[str, Any], name: str) -> Optional[str]:
+    uid = idx["exact"].get(name)
+    if uid:
+        return uid
+    # fuzzy contains: narrow candidates with the trigram index, then confirm the substring
+    hays = idx["hays"]
+    if len(name) >= 3:
+        postings = sorted((idx["grams"].get(g, set()) for g in _trigrams(name)), key=len)
+        cands = set.intersection(*postings) if postings and postings[0] else set()
+        positions = sorted(cands)
+    else:
+        positions = range(len(hays))
+    for pos in positions:
+        hay, uid = hays[pos]
         if name in hay:
-            return u["id"]
+            return uid
     return None
 
+def find_user_id_by_name(name: str) -> Optional[str]:
+    """
+    Resolve 'tom' or '@tom' to a user ID by matching display/real name (case-insensitive).
+    If multiple, returns the first match. Served from the cached user directory.
+    """
+    name = name.lstrip("@").strip().lower()
+    if not name:
+        return None
+    return _users.lookup(lambda idx: _match_user(idx, name))
+
 # ---------- sending ----------
+_dm_channels: Dict[str, str] = {}  # user id -> IM channel id; IM ids are stable per (bot, user)
+_dm_lock = threading.Lock()
+
 def open_dm(user_id: str) -> Optional[str]:
-    """Open an IM channel with a user and return channel ID."""
+    """Open an IM channel with a user and return channel ID (memoized)."""
+    with _dm_lock:
+        cid = _dm_channels.get(user_id)
+    if cid:
+        return cid
+    _limit("conversations.open")
     resp = client.conversations_open(users=[user_id])
-    return resp.get("channel", {}).get("id")
+    cid = resp.get("channel", {}).get("id")
+    if cid:
+        with _dm_lock:
+            _dm_channels[user_id] = cid
+    return cid
 
 def send_message_channel(channel_id: str, text: str, thread_ts: Optional[str] = None) -> Dict[str, Any]:
+    _limit("chat.postMessage")
     resp = client.chat_postMessage(channel=channel_id, text=text, thread_ts=thread_ts)
     return {"ok": True, "channel": resp["channel"], "ts": resp["ts"]}
 
@@ -79,11 +197,11 @@ def send_message_user(user_id: str, text: str) -> Dict[str, Any]:
     cid = open_dm(user_id)
     if not cid:
         raise RuntimeError("Failed to open DM.")
-    resp = client.chat_postMessage(channel=cid, text=text)
-    return {"ok": True, "channel": resp["channel"], "ts": resp["ts"]}
+    return send_message_channel(cid, text)
 
 def permalink(channel: str, ts: str) -> Optional[str]:
     try:
+        _limit("chat.getPermalink")
         return client.chat_getPermalink(channel=channel, message_ts=ts).get("permalink")
     except SlackApiError:
         return None
@@ -0,0 +1,59 @@
+import json, threading
+from typing import Dict, Optional, Any
+from app import db, utils
+from app.models import AISummary
+
+# Durable AISummary results keyed by (namespace, key), e.g. ("gmail", message_id).
+# `fingerprint` captures everything that should invalidate an entry (prompt/model version,
+# or a content hash for mutable sources); a mismatch reads as a miss.
+
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "writes": 0}
+
+_conn = db.connect("summaries.sqlite3")
+_conn.execute("""CREATE TABLE IF NOT EXISTS summaries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (namespace, key)
+)""")
+
+def get_many(namespace: str, fingerprints: Dict[str, str]) -> Dict[str, AISummary]:
+    """`fingerprints` maps key -> expected fingerprint; returns only the keys that hit."""
+    if not fingerprints:
+        return {}
+    keys = list(fingerprints)
+    found: Dict[str, AISummary] = {}
+    with _lock:
+        for j in range(0, len(keys), 500):
+            part = keys[j:j + 500]
+            q = (f"SELECT key, fingerprint, summary FROM summaries "
+                 f"WHERE namespace=? AND key IN ({','.join('?' * len(part))})")
+            for key, fp, blob in _conn.execute(q, [namespace, *part]):
+                if fp == fingerprints[key]:
+                    try:
+                        found[key] = AISummary(**json.loads(blob))
+                    except Exception:
+                        pass
+        _counters["hits"] += len(found)
+        _counters["misses"] += len(keys) - len(found)
+    return found
+
+def get(namespace: str, key: str, fingerprint: str) -> Optional[AISummary]:
+    return get_many(namespace, {key: fingerprint}).get(key)
+
+def put(namespace: str, key: str, fingerprint: str, summary: AISummary):
+    with _lock:
+        _conn.execute(
+            "INSERT OR REPLACE INTO summaries(namespace, key, fingerprint, summary, updated_at) VALUES (?,?,?,?,?)",
+            (namespace, key, fingerprint, json.dumps(summary.dict()), utils.now_ms()))
+        _counters["writes"] += 1
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        out: Dict[str, Any] = dict(_counters)
+    lookups = out["hits"] + out["misses"]
+    out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else None
+    return out
@@ -0,0 +1,220 @@
+import json, math, os, re, threading, time
+from typing import Any, Dict, List, NamedTuple, Optional
+from app import config, db, utils
+from app.models import AISummary
+
+# Local fast path in front of the LLM summarizer. Each message is turned into a handful of
+# binary signals (list/bulk headers, no-reply senders, Gmail category labels, subject
+# patterns, urgency words), and a logistic model scores how likely it is to be low-value
+# mail. Clear cases (p >= TRIAGE_THRESHOLD, plus a strong bulk or calendar signal) get a
+# local AISummary and never reach Gemini; everything else escalates as before. Bounces and
+# delivery failures are deliberately not features: they need a human. The weights start
+# hand-set; train() refits them from the LLM's own verdicts on escalated mail, which
+# observe() records as it goes.
+
+BLOCKER_HINTS = ["waiting on you", "blocked", "need by", "asap", "urgent", "eod", "by eod"]
+TRIAGE_HEADERS = ["List-Unsubscribe", "List-Id", "Precedence", "Auto-Submitted"]
+
+_NOREPLY = re.compile(r"no[-_.]?reply|do[-_.]?not[-_.]?reply|notifications?@", re.I)
+_CALENDAR_SENDER = re.compile(r"calendar[-_.]?notification|calendar@|@calendar\.", re.I)
+_CALENDAR = re.compile(r"^(invitation|updated invitation|accepted|declined|tentatively accepted|canceled event)\b", re.I)
+_RECEIPT = re.compile(r"\b(receipt|your order|order confirm|invoice|payment received|shipped)\b", re.I)
+_NEWSLETTER = re.compile(r"\b(newsletter|digest|weekly|monthly|webinar|% off|sale)\b", re.I)
+
+# log-odds that a message is low-value, per signal
+DEFAULT_WEIGHTS: Dict[str, float] = {
+    "bias": -2.0,
+    "list_unsubscribe": 2.5,
+    "list_id": 1.5,
+    "precedence_bulk": 2.0,
+    "auto_submitted": 2.0,
+    "noreply_sender": 2.5,
+    "cat_promotions": 3.0,
+    "cat_social": 2.5,
+    "cat_updates": 1.5,
+    "cat_forums": 1.5,
+    "subj_calendar": 2.5,
+    "calendar_sender": 2.5,
+    "subj_receipt": 2.0,
+    "subj_newsletter": 2.0,
+    "urgent_words": -4.0,
+    "label_important": -1.5,
+    "label_starred": -4.0,
+    "question": -1.0,
+}
+FEATURES = [k for k in DEFAULT_WEIGHTS if k != "bias"]
+# a no-reply sender or a Gmail "Updates" label alone also covers security alerts, password
+# resets, and CI failures; handle locally only when the mail is also plainly bulk, or is a
+# machine-sent calendar notice (invite/update/response subject from a calendar system)
+STRONG_BULK = ("list_unsubscribe", "precedence_bulk", "cat_promotions")
+
+def _strong(x: Dict[str, int]) -> bool:
+    if any(x[k] for k in STRONG_BULK):
+        return True
+    return bool(x["subj_calendar"] and (x["calendar_sender"] or x["auto_submitted"]))
+
+# which kind of mail a signal points at, for the local summary line
+_KINDS = [("subj_calendar", "Calendar"), ("subj_receipt", "Receipt"), ("cat_promotions", "Promotion"),
+          ("subj_newsletter", "Newsletter"), ("list_unsubscribe", "Newsletter"), ("cat_social", "Social"),
+          ("cat_forums", "Forum"), ("noreply_sender", "Notification"), ("auto_submitted", "Notification")]
+
+WEIGHTS_PATH = os.path.join(config.DATA_DIR, "triage_weights.json")
+
+class Verdict(NamedTuple):
+    summary: AISummary
+    p_low: float
+    kind: str
+
+_lock = threading.Lock()
+_counters = {"seen": 0, "local": 0, "escalated": 0, "classify_us": 0.0, "max_classify_us": 0.0}
+_by_kind: Dict[str, int] = {}
+_weights: Dict[str, float] = dict(DEFAULT_WEIGHTS)
+_trained: Optional[Dict[str, Any]] = None
+
+_conn = db.connect("triage.sqlite3")
+_conn.execute("""CREATE TABLE IF NOT EXISTS examples (
+    id TEXT PRIMARY KEY,
+    features TEXT NOT NULL,
+    low_value INTEGER NOT NULL,
+    created_at INTEGER NOT NULL
+)""")
+
+def _load():
+    global _weights, _trained
+    if not config.TRIAGE_MODEL or not os.path.exists(WEIGHTS_PATH):
+        return
+    try:
+        with open(WEIGHTS_PATH) as f:
+            saved = json.load(f)
+        _weights = {**DEFAULT_WEIGHTS, **saved["weights"]}
+        _trained = {k: v for k, v in saved.items() if k != "weights"}
+    except Exception:
+        pass  # keep the defaults
+
+_load()
+
+# ---------- features ----------
+def features(f: Dict[str, Any]) -> Dict[str, int]:
+    headers = {k.lower(): (v or "") for k, v in (f.get("headers") or {}).items()}
+    labels = set(f.get("labels") or [])
+    subject, sender, snippet = f.get("subject") or "", f.get("sender") or "", f.get("snippet") or ""
+    text = f"{subject} {snippet}".lower()
+    auto = headers.get("auto-submitted", "").lower()
+    return {
+        "list_unsubscribe": int(bool(headers.get("list-unsubscribe"))),
+        "list_id": int(bool(headers.get("list-id"))),
+        "precedence_bulk": int(headers.get("precedence", "").lower() in ("bulk", "list", "junk")),
+        "auto_submitted": int(bool(auto) and auto != "no"),
+        "noreply_sender": int(bool(_NOREPLY.search(sender))),
+        "cat_promotions": int("CATEGORY_PROMOTIONS" in labels),
+        "cat_social": int("CATEGORY_SOCIAL" in labels),
+        "cat_updates": int("CATEGORY_UPDATES" in labels),
+        "cat_forums": int("CATEGORY_FORUMS" in labels),
+        "subj_calendar": int(bool(_CALENDAR.search(subject))),
+        "calendar_sender": int(bool(_CALENDAR_SENDER.search(sender))),
+        "subj_receipt": int(bool(_RECEIPT.search(subject))),
+        "subj_newsletter": int(bool(_NEWSLETTER.search(subject))),
+        "urgent_words": int(any(k in text for k in BLOCKER_HINTS)),
+        "label_important": int("IMPORTANT" in labels),
+        "label_starred": int("STARRED" in labels),
+        "question": int("?" in snippet),
+    }
+
+def _p_low(x: Dict[str, int], w: Dict[str, float]) -> float:
+    z = w["bias"] + sum(w[k] * x[k] for k in FEATURES)
+    return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+def _kind(x: Dict[str, int]) -> str:
+    return next((kind for feat, kind in _KINDS if x[feat]), "Bulk mail")
+
+def classify(f: Dict[str, Any]) -> Optional[Verdict]:
+    """A local summary for clearly low-value mail, or None to escalate to the LLM."""
+    t0 = time.perf_counter()
+    x = features(f)
+    with _lock:
+        w = _weights
+    p = _p_low(x, w)
+    verdict = None
+    if p >= config.TRIAGE_THRESHOLD and _strong(x):
+        kind = _kind(x)
+        subject = f.get("subject") or (f.get("snippet") or "")[:80]
+        verdict = Verdict(AISummary(summary_160=f"{kind}: {subject}"[:160], importance="low", urgency="low",
+                                    actionable=False, next_steps=[], suggested_due_iso=None,
+                                    confidence=round(p, 3)), p, kind)
+    us = (time.perf_counter() - t0) * 1e6
+    with _lock:
+        _counters["seen"] += 1
+        _counters["local" if verdict else "escalated"] += 1
+        _counters["classify_us"] += us
+        _counters["max_classify_us"] = max(_counters["max_classify_us"], us)
+        if verdict:
+            _by_kind[verdict.kind] = _by_kind.get(verdict.kind, 0) + 1
+    return verdict
+
+# ---------- training ----------
+def is_low_value(s: AISummary) -> bool:
+    return s.importance == "low" and s.urgency == "low" and not s.actionable
+
+def observe(f: Dict[str, Any], s: AISummary):
+    """Record an escalated message with the LLM's verdict as a training example. Skipped for
+    fields without triage signals (rows rebuilt from the sync index): every header and label
+    feature would read 0 and skew train()."""
+    if "labels" not in f or "headers" not in f:
+        return
+    with _lock:
+        _conn.execute("INSERT OR REPLACE INTO examples(id, features, low_value, created_at) VALUES (?,?,?,?)",
+                      (f["id"], json.dumps(features(f)), int(is_low_value(s)), utils.now_ms()))
+        _conn.execute("DELETE FROM examples WHERE id IN (SELECT id FROM examples ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                      (config.TRIAGE_MAX_EXAMPLES,))
+
+def train(epochs: int = 300, lr: float = 0.5, l2: float = 1e-3) -> Dict[str, Any]:
+    """Refit the weights (logistic regression, batch gradient descent from the current ones)
+    on recorded examples and save them; keeps the current weights if there's too little data."""
+    global _weights, _trained
+    with _lock:
+        rows = _conn.execute("SELECT features, low_value FROM examples").fetchall()
+        w = dict(_weights)
+    # features are binary, so examples collapse into few distinct vectors: (count, positives) each
+    groups: Dict[str, List[int]] = {}
+    for fs, y in rows:
+        g = groups.setdefault(fs, [0, 0])
+        g[0] += 1
+        g[1] += y
+    data = [({k: json.loads(fs).get(k, 0) for k in FEATURES}, c, p) for fs, (c, p) in groups.items()]
+    n, pos = len(rows), sum(p for _, _, p in data)
+    if n < config.TRIAGE_MIN_EXAMPLES or pos == 0 or pos == n:
+        return {"trained": False, "examples": n, "low_value": pos}
+    keys = ["bias"] + FEATURES
+    for _ in range(epochs):
+        grad = dict.fromkeys(keys, 0.0)
+        for x, c, p in data:
+            err = c * _p_low(x, w) - p
+            grad["bias"] += err
+            for k in FEATURES:
+                if x[k]:
+                    grad[k] += err
+        for k in keys:
+            w[k] -= lr * (grad[k] / n + (l2 * w[k] if k != "bias" else 0.0))
+    acc = sum(p if _p_low(x, w) >= 0.5 else c - p for x, c, p in data) / n
+    info = {"examples": n, "low_value": pos, "accuracy": round(acc, 4), "trained_at": utils.now_ms()}
+    tmp = WEIGHTS_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"weights": w, **info}, f)
+    os.replace(tmp, WEIGHTS_PATH)
+    with _lock:
+        if config.TRIAGE_MODEL:
+            _weights, _trained = w, info
+    return {"trained": True, **info}
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        out: Dict[str, Any] = dict(_counters)
+        out["by_kind"] = dict(_by_kind)
+        out["model"] = _trained or "default weights"
+        out["examples"] = _conn.execute("SELECT COUNT(*) FROM examples").fetchone()[0]
+    seen = out["seen"]
+    out["local_fraction"] = round(out["local"] / seen, 4) if seen else None
+    total_us = out.pop("classify_us")
+    out["avg_classify_us"] = round(total_us / seen, 1) if seen else None
+    out["max_classify_us"] = round(out["max_classify_us"], 1)
+    return out
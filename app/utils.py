@@ -1,47 +1,169 @@
-import os, re, uuid, time, requests
-from typing import List, Dict, Any, Optional
-from bs4 import BeautifulSoup
+import os, mmap, codecs, shutil, tempfile, time
+from typing import BinaryIO, Iterator, List, Dict, Any, Optional, Tuple
+from html.parser import HTMLParser
 from pypdf import PdfReader
-from fastapi import UploadFile
 
 def now_ms() -> int:
     return int(time.time() * 1000)
 
-def chunk_text(text: str, size: int = 1200, overlap: int = 200) -> List[str]:
-    text = re.sub(r"\s+\n", "\n", text).strip()
-    chunks, start = [], 0
-    while start < len(text):
-        end = min(start + size, len(text))
-        chunk = text[start:end]
-        if chunk.strip():
-            chunks.append(chunk)
-        if end == len(text):
-            break
-        start = end - overlap
-    return chunks
-
-def parse_file(file: UploadFile) -> str:
-    data = file.file.read()
-    if file.filename.lower().endswith(".pdf"):
-        tmp = f"/tmp/{uuid.uuid4()}.pdf"
-        with open(tmp, "wb") as f:
-            f.write(data)
-        reader = PdfReader(tmp)
-        return "\n\n".join((p.extract_text() or "") for p in reader.pages)
-    else:
-        return data.decode(errors="ignore")
-
-def fetch_url(url: str) -> str:
-    resp = requests.get(url, timeout=15)
-    resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
-    for tag in soup(["script", "style", "nav", "header", "footer", "noscript"]):
-        tag.decompose()
-    title = (soup.title.string.strip() if soup.title and soup.title.string else url)[:200]
-    body = " ".join(soup.get_text(separator=" ").split())
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "24"))  # smaller PDFs extract in one pool task
+TEXT_READ_BLOCK = 1 << 20
+
+def spool_upload(fileobj: BinaryIO, filename: str) -> str:
+    """Copy an upload to a temp file in 1 MB blocks; caller deletes the returned path."""
+    suffix = os.path.splitext(filename or "")[1]
+    with tempfile.NamedTemporaryFile(prefix="wif-", suffix=suffix, delete=False) as f:
+        shutil.copyfileobj(fileobj, f, TEXT_READ_BLOCK)
+        return f.name
+
+def _pdf_pages(path: str, start: int, end: int) -> List[str]:
+    """Extract pages [start, end) from a memory-mapped PDF (runs in the CPU process pool)."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        reader = PdfReader(mm)
+        return [(reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+def iter_pdf_pages(path: str, parallel: bool = True) -> Iterator[str]:
+    """Yield page text in order, extracted in the process pool: large PDFs are split into page
+    ranges across workers, smaller ones go to a single worker. Pass parallel=False when
+    already running inside a pool worker to extract inline."""
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        n = len(PdfReader(mm).pages)
+    if not parallel:
+        yield from _pdf_pages(path, 0, n)
+        return
+    from app.aio import cpu_pool  # lazy: keeps utils importable inside pool workers without cycles
+    pool = cpu_pool()
+    step = PDF_PAGES_PER_TASK if n >= PDF_PARALLEL_MIN_PAGES else max(1, n)
+    futs = [pool.submit(_pdf_pages, path, s, min(s + step, n)) for s in range(0, n, step)]
+    try:
+        for fut in futs:
+            yield from fut.result()
+    finally:
+        for fut in futs:
+            fut.cancel()
+
+def iter_text_file(path: str) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(TEXT_READ_BLOCK)
+            if not block:
+                break
+            yield decoder.decode(block)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+PAGE_BREAK = "\n\n"
+
+def _with_page_breaks(pages: Iterator[str]) -> Iterator[str]:
+    # the chunker concatenates pieces as-is; without a break the last word of one page
+    # would run into the first word of the next
+    for i, page in enumerate(pages):
+        if i:
+            yield PAGE_BREAK
+        yield page
+
+def iter_file_text(path: str, filename: str, parallel: bool = True) -> Iterator[str]:
+    """Stream extracted text: PDF pages (separated by a paragraph break), the main text of an
+    HTML file, or per block for text files."""
+    name = (filename or "").lower()
+    if name.endswith(".pdf"):
+        return _with_page_breaks(iter_pdf_pages(path, parallel))
+    if name.endswith((".html", ".htm")):
+        return iter([html_to_text("".join(iter_text_file(path)), filename)])
+    return iter_text_file(path)
+
+def extract_text(path: str, filename: str) -> str:
+    return "".join(iter_file_text(path, filename))
+
+# Single-pass HTML -> text (stdlib HTMLParser, no DOM). Drops boilerplate subtrees, keeps
+# block structure as paragraph breaks, and prefers <main>/<article>/role=main when present.
+_SKIP_TAGS = {"head", "script", "style", "noscript", "template", "svg", "nav", "header", "footer",
+              "aside", "form", "iframe", "button", "select"}
+_MAIN_TAGS = {"main", "article"}
+_BLOCK_TAGS = {"p", "div", "section", "article", "main", "li", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6",
+               "br", "tr", "table", "pre", "blockquote", "dd", "dt", "figcaption", "hr"}
+_VOID_TAGS = {"br", "img", "hr", "input", "meta", "link", "area", "base", "col", "embed", "source", "track", "wbr"}
+MAIN_MIN_CHARS = 200   # a <main>/<article> with less text than this is probably not the content
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title: List[str] = []
+        self.all: List[str] = []
+        self.main: List[str] = []
+        # [tag, is_skip, depth] for skip/main subtrees only; depth counts nested untracked
+        # elements of the same tag, so an inner </div> doesn't close <div role="main">
+        self._stack: List[List[Any]] = []
+        self._in_title = False
+        self._skip = self._main = 0
+
+    def _recount(self):
+        self._skip = sum(1 for entry in self._stack if entry[1])
+        self._main = len(self._stack) - self._skip
+
+    def _brk(self):
+        self.all.append("\n")
+        if self._main:
+            self.main.append("\n")
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        if tag in _BLOCK_TAGS:
+            self._brk()
+        if tag in _VOID_TAGS:
+            return
+        if tag in _SKIP_TAGS or tag in _MAIN_TAGS or ("role", "main") in attrs:
+            self._stack.append([tag, tag in _SKIP_TAGS, 0])
+            self._recount()
+            return
+        for entry in reversed(self._stack):
+            if entry[0] == tag:
+                entry[2] += 1
+                break
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        if tag in _BLOCK_TAGS:
+            self._brk()
+        for i in range(len(self._stack) - 1, -1, -1):  # tolerate unclosed children
+            if self._stack[i][0] == tag:
+                if self._stack[i][2]:
+                    self._stack[i][2] -= 1
+                else:
+                    del self._stack[i:]
+                    self._recount()
+                break
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title.append(data)
+        elif not self._skip:
+            self.all.append(data)
+            if self._main:
+                self.main.append(data)
+
+def _paragraphs(pieces: List[str]) -> str:
+    paras = (" ".join(p.split()) for p in "".join(pieces).split("\n"))
+    return "\n\n".join(p for p in paras if p)
+
+def html_to_text(html: str, url: str) -> str:
+    p = _TextExtractor()
+    p.feed(html)
+    p.close()
+    title = (" ".join("".join(p.title).split()) or url)[:200]
+    main = _paragraphs(p.main)
+    body = main if len(main) >= MAIN_MIN_CHARS else _paragraphs(p.all)
     return f"{title}\n\n{body}"
 
-def make_meta(doc_id: str, title: str, user_id: str, order: int, url: Optional[str] = None) -> dict:
+def make_meta(doc_id: str, title: str, user_id: str, order: int, url: Optional[str] = None,
+              span: Optional[Tuple[int, int]] = None) -> dict:
     meta = {
         "doc_id": doc_id,
         "title": title,
@@ -51,6 +173,8 @@ def make_meta(doc_id: str, title: str, user_id: str, order: int, url: Optional[s
     }
     if url is not None:
         meta["url"] = url
+    if span is not None:
+        meta["char_start"], meta["char_end"] = int(span[0]), int(span[1])
     return meta
 
 def header_lookup(headers: List[Dict[str, str]], name: str) -> Optional[str]:
@@ -1,21 +1,21 @@
 from __future__ import annotations
 from typing import Optional, List, Dict, Any
-import uuid, json
+import asyncio, os, json
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 
 from app import config
-from app.models import KBIngestResponse, KBAnswer, FlashcardSet, InboxItem, SlackSendRequest, SlackSendResult
+from app.models import KBIngestResponse, KBLinkBulkRequest, KBLinkResult, IngestJob, BulkIngestRun, KBAnswer, FlashcardSet, InboxItem, SlackSendRequest, SlackSendResult
 from app.models import TaskListResponse, Task
 from app.pm.aggregator import list_tasks_all
 from app.pm.jira_provider import JiraProvider
 
-from app import utils, ai, kb_store, priority, gmail_service
+from app import utils, ai, aio, ingest, ingest_jobs, kb_store, retrieval, answer_cache, flashcards, inbox, inbox_sync, embedder, embed_cache, summary_store
 
 from pydantic import BaseModel
-from app import slack_service
+from app import slack_delivery, fetcher, bulk_ingest, llm, triage
 from app.ai import parse_slack_send
 
 
@@ -29,6 +29,21 @@ app.add_middleware(
     allow_credentials=True,
 )
 
+@app.on_event("startup")
+def _start_background_workers():
+    ingest_jobs.start()
+    bulk_ingest.start()
+    if config.GMAIL_SYNC:
+        inbox_sync.start()
+
+@app.on_event("shutdown")
+async def _shutdown():
+    inbox_sync.stop()
+    ingest_jobs.stop()
+    bulk_ingest.stop()
+    aio.shutdown()
+    await fetcher.aclose()
+
 @app.get("/favicon.ico", include_in_schema=False)
 def favicon():
     return Response(status_code=204)
@@ -37,131 +52,167 @@ def favicon():
 def home():
     return {"message": f"🚀 {config.APP_TITLE} is running", "version": config.APP_VERSION}
 
+@app.get("/stats")
+def stats():
+    return {
+        "embeddings": embedder.stats(),
+        "embed_cache": embed_cache.stats(),
+        "summaries": summary_store.stats(),
+        "summarize": ai.stats(),
+        "triage": triage.stats(),
+        "gmail_sync": inbox_sync.stats(),
+        "ingest_jobs": ingest_jobs.stats(),
+        "bulk_ingest": bulk_ingest.stats(),
+        "kb_ingest": ingest.stats(),
+        "answer_cache": answer_cache.stats(),
+        "kb_store": kb_store.stats(),
+        "fetcher": fetcher.stats(),
+        "llm": llm.stats(),
+    }
+
 # ---------- KB: upload file ----------
+# Async routes never block the loop: parsing uses the CPU process pool (PDF page ranges
+# across workers), spooling, embedding and Chroma writes the threadpool.
 @app.post("/kb/upload", response_model=KBIngestResponse)
 async def kb_upload(file: UploadFile = File(...), title: Optional[str] = None, user_id: str = "demo"):
-    text = utils.parse_file(file)
+    # spool to disk (never the whole upload in RAM); PDF pages extract across the process pool
+    # and stream straight into the chunker
+    path = await aio.run_io(utils.spool_upload, file.file, file.filename)
+    try:
+        chunks = await aio.run_io(ingest.chunk_file, path, file.filename)
+    finally:
+        os.remove(path)
     title = title or file.filename
-    if not text.strip():
+    if not chunks:
         raise HTTPException(400, "No text extracted.")
-    chunks = utils.chunk_text(text)
-    vectors = ai.embed_batch(chunks)
-    doc_id = str(uuid.uuid4())
-    ids = [f"{doc_id}:{i}" for i in range(len(chunks))]
-    metas = [utils.make_meta(doc_id, title, user_id, i) for i in range(len(chunks))]
-    kb_store.add(ids=ids, documents=chunks, metadatas=metas, embeddings=vectors)
-    return KBIngestResponse(document_id=doc_id, chunks=len(chunks), title=title)
+    return await aio.run_io(ingest.store_chunks, chunks, title, user_id, source=file.filename)
 
 # ---------- KB: link URL ----------
+# Pages are cached on disk and revalidated with conditional GETs; an unchanged page
+# (304) that this user already ingested is not re-chunked or re-embedded.
 @app.post("/kb/link", response_model=KBIngestResponse)
 async def kb_link(url: str = Form(...), user_id: str = "demo"):
     try:
-        text = utils.fetch_url(url)
-    except Exception as e:
+        res, _ = await ingest.ingest_url(url, user_id)
+    except fetcher.FetchError as e:
         raise HTTPException(400, f"Fetch failed: {e}")
-    title = text.split("\n", 1)[0][:120]
-    chunks = utils.chunk_text(text)
-    vectors = ai.embed_batch(chunks)
-    doc_id = str(uuid.uuid4())
-    ids = [f"{doc_id}:{i}" for i in range(len(chunks))]
-    metas = [utils.make_meta(doc_id, title, user_id, i, url=url) for i in range(len(chunks))]
-    kb_store.add(ids=ids, documents=chunks, metadatas=metas, embeddings=vectors)
-    return KBIngestResponse(document_id=doc_id, chunks=len(chunks), title=title, source_url=url)
+    return res
+
+async def _link_one(url: str, user_id: str) -> KBLinkResult:
+    try:
+        res, not_modified = await ingest.ingest_url(url, user_id)
+        return KBLinkResult(url=url, ok=True, result=res, not_modified=not_modified)
+    except Exception as e:
+        return KBLinkResult(url=url, ok=False, error=str(e))
+
+@app.post("/kb/link/bulk", response_model=List[KBLinkResult])
+async def kb_link_bulk(req: KBLinkBulkRequest):
+    # fetched concurrently, capped overall (FETCH_CONCURRENCY) and per host (FETCH_PER_HOST)
+    urls = list(dict.fromkeys(u.strip() for u in req.urls if u.strip()))
+    if len(urls) > config.FETCH_BULK_MAX:
+        raise HTTPException(400, f"At most {config.FETCH_BULK_MAX} URLs per request.")
+    return await asyncio.gather(*(_link_one(u, req.user_id) for u in urls))
+
+# ---------- KB: background ingest jobs ----------
+@app.post("/kb/jobs/upload", response_model=IngestJob)
+async def kb_jobs_upload(file: UploadFile = File(...), title: Optional[str] = None, user_id: str = "demo"):
+    job_id = await aio.run_io(ingest_jobs.submit_file, file.file, file.filename, title, user_id)
+    return ingest_jobs.get(job_id)
+
+@app.post("/kb/jobs/link", response_model=IngestJob)
+def kb_jobs_link(url: str = Form(...), user_id: str = "demo"):
+    return ingest_jobs.get(ingest_jobs.submit_url(url, user_id))
+
+@app.get("/kb/jobs/{job_id}", response_model=IngestJob)
+def kb_job_status(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found.")
+    return job
+
+# ---------- KB: bulk import ----------
+@app.post("/kb/bulk", response_model=BulkIngestRun)
+async def kb_bulk(file: UploadFile = File(...), user_id: str = "demo"):
+    # a zip or tar(.gz) of documents; imported in the background, poll GET /kb/bulk/{run_id}
+    try:
+        run_id = await aio.run_io(bulk_ingest.submit_upload, file.file, file.filename, user_id)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return bulk_ingest.get(run_id)
+
+@app.get("/kb/bulk/{run_id}", response_model=BulkIngestRun)
+def kb_bulk_status(run_id: str):
+    run = bulk_ingest.get(run_id)
+    if not run:
+        raise HTTPException(404, "Run not found.")
+    return run
+
+@app.post("/kb/bulk/{run_id}/resume", response_model=BulkIngestRun)
+def kb_bulk_resume(run_id: str):
+    if not bulk_ingest.resume(run_id):
+        raise HTTPException(409, "Nothing to resume.")
+    return bulk_ingest.get(run_id)
 
 # ---------- KB: query ----------
 @app.get("/kb/query", response_model=KBAnswer)
-def kb_query(q: str, user_id: str = "demo", k: int = 6):
-    qvec = ai.embed_batch([q])[0]
-    res = kb_store.query(query_embedding=qvec, n_results=max(8, k+2), where={"user_id": user_id})
-    docs = (res.get("documents") or [[]])[0]
-    metas = (res.get("metadatas") or [[]])[0]
-    ids = (res.get("ids") or [[]])[0]
-
-    seen, picks = set(), []
-    for doc, meta, _id in zip(docs, metas, ids):
-        if not meta: continue
-        key = (meta.get("doc_id"), int(meta.get("order", 0)) // 2)
-        if key in seen: continue
-        seen.add(key); picks.append((doc, meta, _id))
-        if len(picks) >= k: break
-
+def kb_query(q: str, user_id: str = "demo", k: int = 6, mode: Optional[str] = None):
+    # mode: hybrid (BM25 + vectors, RRF-fused) | vector | lexical (no embedding call)
+    if mode is not None and mode not in retrieval.MODES:
+        raise HTTPException(400, f"mode must be one of {', '.join(retrieval.MODES)}")
+    mode = mode or config.KB_RETRIEVAL
+    # lexical mode never embeds; its cache hits need the same question text
+    qvec = retrieval.embed_query(q) if mode != "lexical" else None
+    picks = retrieval.search(q, user_id, k, mode, qvec=qvec)
     if not picks:
         return KBAnswer(answer="I don't have enough information to answer that yet.", citations=[], used_chunks=0)
 
-    context_blocks, cits = [], []
-    for i, (doc, meta, _id) in enumerate(picks, 1):
-        context_blocks.append(f"[{i}] Title: {meta.get('title')}\nURL: {meta.get('url')}\nExcerpt:\n{doc}\n")
-        cits.append({"doc_id": meta.get("doc_id"), "title": meta.get("title"),
-                     "url": meta.get("url"), "chunk_preview": (doc or "")[:200]})
+    chunk_ids = [p[2] for p in picks]
+    cached = answer_cache.lookup(user_id, q, qvec, chunk_ids)
+    if cached is not None:
+        return cached
+    prompt, cits = retrieval.build_prompt(q, picks)
+    answer = ai.generate_text(prompt, temperature=0.2, max_output_tokens=400, site="kb.answer")
+    out = KBAnswer(answer=answer.strip(), citations=cits, used_chunks=len(picks))
+    answer_cache.put(user_id, q, qvec, chunk_ids, out)
+    return out
 
-    system = ("You are a precise research assistant. Answer using ONLY the provided context. "
-              "If missing, say you don't have enough info. Cite sources inline like [1], [2]. "
-              "Provide a concise, actionable answer.")
-    prompt = system + "\n\nCONTEXT:\n" + "\n\n".join(context_blocks) + f"\n\nQUESTION: {q}\n\nANSWER WITH CITATIONS:"
+# ---------- KB: streamed query (SSE) ----------
+def _sse(events):
+    for event, data in events:
+        yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    answer = ai.generate_text(prompt, temperature=0.2, max_output_tokens=400)
-    return KBAnswer(answer=answer.strip(), citations=cits, used_chunks=len(picks))
+@app.get("/kb/query/stream")
+def kb_query_stream(q: str, user_id: str = "demo", k: int = 6, mode: Optional[str] = None):
+    # headers go out immediately; citations follow retrieval, then tokens as Gemini emits them
+    if mode is not None and mode not in retrieval.MODES:
+        raise HTTPException(400, f"mode must be one of {', '.join(retrieval.MODES)}")
+    return StreamingResponse(_sse(retrieval.answer_events(q, user_id, k, mode)), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # ---------- KB: flashcards ----------
 @app.get("/kb/flashcards", response_model=FlashcardSet)
 def kb_flashcards(doc_id: str, user_id: str = "demo", n: int = 10):
-    res = kb_store.get(where={"doc_id": doc_id, "user_id": user_id})
-    docs = res.get("documents") or []
-    metas = res.get("metadatas") or []
-    if not docs:
+    # map-reduce over the whole document; cached until the document's content changes
+    cards = flashcards.generate(doc_id, user_id, n)
+    if cards is None:
         raise HTTPException(404, "Doc not found for this user.")
-    text = "\n\n".join(docs)
-    title = (metas[0].get("title") if metas and isinstance(metas[0], dict) else "Untitled")
-
-    prompt = (
-        f"Create {n} compact flashcards from the content below. "
-        f"Focus on key definitions, decisions, and cause-effect.\n"
-        f'Return JSON: {{ "cards": [{{"q":"...","a":"..."}}] }}\n'
-        f"CONTENT:\n{text[:12000]}\n"
-    )
-    try:
-        data = ai.generate_json(prompt, temperature=0.3, max_output_tokens=800)
-        return FlashcardSet(source_title=title, cards=data["cards"])
-    except Exception:
-        return FlashcardSet(source_title=title, cards=[{"q": "What is the main idea?", "a": text[:200]}])
+    return cards
 
 # ---------- Gmail: prioritized recent ----------
 @app.get("/gmail/recent", response_model=List[InboxItem])
 def gmail_recent(max_results: int = 5):
     try:
-        msgs = gmail_service.list_recent_messages(max_results=max_results)
-        items: List[InboxItem] = []
-        for m in msgs:
-            full = gmail_service.get_message(m["id"])
-            headers = full.get("payload", {}).get("headers", [])
-            subject = utils.header_lookup(headers, "Subject")
-            sender = utils.header_lookup(headers, "From")
-            snippet = full.get("snippet", "") or ""
-            internal_ts = int(full.get("internalDate", "0"))
-
-            ai_sum = ai.gemini_summarize(snippet, subject, sender)
-            lower = snippet.lower()
-            blocked = any(k in lower for k in ["waiting on you", "blocked", "need by", "asap", "urgent", "eod", "by eod"])
-
-            score = priority.compute_priority(ai_sum, internal_ms=internal_ts, sender_role=None, blocked_flag=blocked)
-
-            items.append(InboxItem(
-                source="gmail",
-                id=full.get("id"),
-                thread_id=full.get("threadId"),
-                subject=subject,
-                from_=sender,
-                snippet=snippet,
-                internal_ts=internal_ts,
-                url=f"https://mail.google.com/mail/u/0/#inbox/{full.get('id')}",
-                ai=ai_sum,
-                priority_score=score
-            ))
-        items.sort(key=lambda x: x.priority_score or 0, reverse=True)
-        return items
+        if config.GMAIL_SYNC:
+            return inbox_sync.recent_items(max_results=max_results)
+        return inbox.recent_items(max_results=max_results)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch Gmail: {e}")
 
+@app.post("/gmail/triage/train")
+async def gmail_triage_train():
+    # refit the local pre-classifier on LLM-labelled mail (see app/triage.py)
+    return await aio.run_io(triage.train)
+
 # ---------- Gmail: single email summary ----------
 @app.get("/summarize_email")
 def summarize_email():
@@ -198,40 +249,19 @@ def slack_send(req: SlackSendRequest):
     if not targets or not text:
         raise HTTPException(400, "Need a recipient and message text (provide 'q' or 'to' + 'text').")
 
-    # 2) Resolve & send
-    deliveries = []
-    for tgt in targets:
-        ttype = tgt.get("type"); name = tgt.get("name")
-        try:
-            if ttype == "channel_id":
-                res = slack_service.send_message_channel(name, text, thread_ts=req.thread_ts)
-            elif ttype == "channel":
-                cid = slack_service.get_channel_id_by_name(name)
-                if not cid: raise HTTPException(404, f"Channel {name} not found or bot not invited.")
-                res = slack_service.send_message_channel(cid, text, thread_ts=req.thread_ts)
-            elif ttype == "user":
-                uid = slack_service.find_user_id_by_name(name)
-                if not uid: raise HTTPException(404, f"User {name} not found.")
-                res = slack_service.send_message_user(uid, text)
-            else:
-                raise HTTPException(400, f"Unsupported target type: {ttype}")
-            # add a permalink if possible
-            link = slack_service.permalink(res["channel"], res["ts"]) if "ts" in res else None
-            deliveries.append({"target": tgt, "ok": True, "channel": res.get("channel"), "ts": res.get("ts"), "permalink": link})
-        except HTTPException as he:
-            raise he
-        except Exception as e:
-            deliveries.append({"target": tgt, "ok": False, "error": str(e)})
+    # 2) Resolve & send (all targets concurrently)
+    deliveries = slack_delivery.deliver(targets, text, thread_ts=req.thread_ts, with_permalink=req.permalink)
     return SlackSendResult(deliveries=deliveries)
 
 # ---------- PM: unified prioritized tasks ----------
 @app.get("/pm/tasks", response_model=TaskListResponse)
-def pm_tasks(limit_per_provider: int = 30, assignee_me: bool = True):
+def pm_tasks(limit_per_provider: int = 30, assignee_me: bool = True, deadline_s: Optional[float] = None):
     """
     Returns a unified, prioritized list of tasks across connected project tools.
     Currently supports Jira (add Trello/Asana providers similarly).
+    Tasks not AI-enriched within `deadline_s` come back with a heuristic score.
     """
-    return list_tasks_all(limit_per_provider=limit_per_provider, assignee_me=assignee_me)
+    return list_tasks_all(limit_per_provider=limit_per_provider, assignee_me=assignee_me, deadline_s=deadline_s)
 
 # ---------- PM: Jira actions (example) ----------
 @app.post("/pm/jira/{issue_id}/comment")
@@ -0,0 +1,68 @@
+"""
+Fixed-window vs sentence chunking over a document corpus:
+
+    python scripts/bench_chunker.py                      # scripts/fixtures/corpus
+    python scripts/bench_chunker.py ~/docs --repeat 1    # your own files (.pdf/.html/.md/.txt)
+
+For each chunker prints the chunk count, chunk size (approx tokens), how many chunks end in
+the middle of a sentence, and chunking throughput. Text is extracted once up front; the
+timed part is chunking only, over the corpus repeated --repeat times. Needs no API keys.
+"""
+import argparse, os, sys, time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app import chunker, utils
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "corpus")
+
+def load(root: str) -> List[str]:
+    texts = []
+    for dirpath, _, files in os.walk(root):
+        for name in sorted(files):
+            texts.append(utils.extract_text(os.path.join(dirpath, name), name))
+    return [t for t in texts if t.strip()]
+
+def ragged(text: str, c: chunker.Chunk) -> bool:
+    """Chunk ends mid-sentence: not on sentence punctuation and not at a paragraph break."""
+    if c.text.rstrip()[-1:] in ".!?\"')]":
+        return False
+    rest = text[c.end:c.end + 64]
+    return bool(rest.strip()) and not rest.lstrip(" \t").startswith("\n")
+
+def bench(label: str, make, texts: List[str], repeat: int) -> str:
+    chunks = [(t, c) for t in texts for c in make().chunks([t])]
+    sizes = sorted(chunker.approx_tokens(c.text) for _, c in chunks)
+    mid = sum(1 for t, c in chunks if ragged(t, c))
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for t in texts:
+            for _ in make().chunks([t]):
+                pass
+    secs = time.perf_counter() - t0
+    mb = sum(len(t) for t in texts) * repeat / 1e6
+    return (f"{label:<9} chunks {len(chunks):<6} tokens avg {sum(sizes) / len(sizes):.0f} "
+            f"p50 {sizes[len(sizes) // 2]} max {sizes[-1]:<5} mid-sentence ends {mid:<5} "
+            f"({mid / len(chunks):.0%})  {mb / secs:.1f} MB/s")
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Compare the fixed and sentence chunkers.")
+    ap.add_argument("corpus", nargs="?", default=FIXTURES, help="directory of documents")
+    ap.add_argument("--repeat", type=int, default=200, help="passes over the corpus for throughput")
+    ap.add_argument("--max-tokens", type=int, default=chunker.CHUNK_MAX_TOKENS)
+    ap.add_argument("--overlap-tokens", type=int, default=chunker.CHUNK_OVERLAP_TOKENS)
+    args = ap.parse_args(argv)
+
+    texts = load(args.corpus)
+    if not texts:
+        print(f"no text extracted from {args.corpus}", file=sys.stderr)
+        return 1
+    print(f"{len(texts)} documents, {sum(len(t) for t in texts) / 1e3:.0f} kB of text, x{args.repeat}")
+    print(bench("fixed", chunker.FixedChunker, texts, args.repeat))
+    print(bench("sentence", lambda: chunker.SentenceChunker(args.max_tokens, args.overlap_tokens),
+                texts, args.repeat))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+/kb/query latency while uploads are being parsed, against a running server:
+
+    uvicorn main:app --port 8000
+    python scripts/bench_query_under_upload.py --url http://127.0.0.1:8000 --uploaders 4
+
+Runs the same query load twice, first with no other traffic, then with --uploaders clients
+posting documents to /kb/upload back to back, and prints p50/p95/p99 for both phases.
+Parsing runs in the CPU process pool, so the second phase's p99 should stay close to the
+first. Uploads are generated text unless --file points at a real document (e.g. a large
+PDF). Use --mode lexical to leave the embedding API out of the query path. Answers still go
+to Gemini unless the answer cache serves them, so vary --questions to control that.
+"""
+import argparse, asyncio, os, random, sys, time
+from typing import List, Optional
+import httpx
+
+WORDS = ("latency cache vector query document embedding batch token stream incident deploy "
+         "service queue retry timeout budget shard index release rollback owner").split()
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 24))).capitalize() + "."
+
+def make_doc(rng: random.Random, kb: int) -> bytes:
+    paras, size = [], 0
+    while size < kb * 1024:
+        p = " ".join(_sentence(rng) for _ in range(rng.randint(3, 8)))
+        paras.append(p)
+        size += len(p) + 2
+    return "\n\n".join(paras).encode("utf-8")
+
+def pct(xs: List[float], q: float) -> Optional[float]:
+    if not xs:
+        return None
+    xs = sorted(xs)
+    return round(xs[min(len(xs) - 1, int(q * len(xs)))], 1)
+
+async def query_load(c: httpx.AsyncClient, args, questions: List[str], stop: asyncio.Event) -> List[float]:
+    lat: List[float] = []
+
+    async def one(i: int):
+        rng = random.Random(i)
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            r = await c.get("/kb/query", params={"q": rng.choice(questions), "user_id": args.user_id,
+                                                 "mode": args.mode})
+            r.raise_for_status()
+            lat.append((time.perf_counter() - t0) * 1000)
+            await asyncio.sleep(args.think)
+
+    await asyncio.gather(*(one(i) for i in range(args.queriers)))
+    return lat
+
+async def upload_load(c: httpx.AsyncClient, args, stop: asyncio.Event) -> List[float]:
+    lat: List[float] = []
+    fixed = open(args.file, "rb").read() if args.file else None
+    name = os.path.basename(args.file) if args.file else "load.txt"
+
+    async def one(i: int):
+        rng = random.Random(1000 + i)
+        while not stop.is_set():
+            body = fixed or make_doc(rng, args.upload_kb)
+            t0 = time.perf_counter()
+            r = await c.post("/kb/upload", params={"user_id": f"{args.user_id}-load-{i}"},
+                             files={"file": (name, body)})
+            r.raise_for_status()
+            lat.append((time.perf_counter() - t0) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(args.uploaders)))
+    return lat
+
+async def phase(c: httpx.AsyncClient, args, questions: List[str], uploads: bool):
+    stop = asyncio.Event()
+    q = asyncio.create_task(query_load(c, args, questions, stop))
+    u = asyncio.create_task(upload_load(c, args, stop)) if uploads else None
+    await asyncio.sleep(args.seconds)
+    stop.set()
+    return await q, (await u if u else [])
+
+def line(label: str, lat: List[float]) -> str:
+    return (f"{label:<16} n={len(lat):<6} p50 {pct(lat, 0.5)} ms  p95 {pct(lat, 0.95)} ms  "
+            f"p99 {pct(lat, 0.99)} ms  max {pct(lat, 1.0)} ms")
+
+async def main_async(args) -> int:
+    rng = random.Random(0)
+    questions = [" ".join(rng.sample(WORDS, 3)) + "?" for _ in range(args.questions)]
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as c:
+        # something for the queries to find
+        r = await c.post("/kb/upload", params={"user_id": args.user_id},
+                         files={"file": ("seed.txt", make_doc(rng, 64))})
+        r.raise_for_status()
+        base, _ = await phase(c, args, questions, uploads=False)
+        loaded, ups = await phase(c, args, questions, uploads=True)
+    print(line("query (idle)", base))
+    print(line("query (uploads)", loaded))
+    print(line("upload", ups))
+    p_base, p_load = pct(base, 0.99), pct(loaded, 0.99)
+    if p_base and p_load:
+        print(f"p99 under upload load: {p_load / p_base:.2f}x idle")
+    return 0
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Measure /kb/query latency under concurrent /kb/upload traffic.")
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--user-id", default="bench")
+    ap.add_argument("--mode", default="lexical", choices=["hybrid", "vector", "lexical"])
+    ap.add_argument("--queriers", type=int, default=8, help="concurrent query clients")
+    ap.add_argument("--uploaders", type=int, default=4, help="concurrent upload clients in the loaded phase")
+    ap.add_argument("--upload-kb", type=int, default=512, help="size of each generated upload")
+    ap.add_argument("--file", help="upload this file instead of generated text")
+    ap.add_argument("--questions", type=int, default=20, help="distinct questions to cycle through")
+    ap.add_argument("--seconds", type=float, default=20.0, help="length of each phase")
+    ap.add_argument("--think", type=float, default=0.05, help="pause between a client's queries")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    return asyncio.run(main_async(ap.parse_args(argv)))
+
+if __name__ == "__main__":
+    sys.exit(main())
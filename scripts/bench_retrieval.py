@@ -0,0 +1,93 @@
+"""
+Recall and latency of the /kb/query retrieval modes (lexical, vector, hybrid):
+
+    GEMINI_API_KEY=... python scripts/bench_retrieval.py
+    GEMINI_API_KEY=... python scripts/bench_retrieval.py ~/docs --queries my_queries.json -k 6
+
+Ingests the corpus into a throwaway store (temporary DATA_DIR/CHROMA_DIR, unless --keep-dir
+is given) with the real embedder, then runs each query in each mode. A query is a hit at k
+when one of the top-k chunks comes from its labelled document. Queries are embedded once up
+front, so the per-mode latency is retrieval only; the embedding round-trip is reported on
+its own line (lexical mode doesn't pay it). The queries file is a JSON list of
+{"q": ..., "doc": <file name>}; the default pairs with scripts/fixtures/corpus.
+"""
+import argparse, json, os, shutil, sys, tempfile, time
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+FIXTURES = os.path.join(ROOT, "scripts", "fixtures")
+sys.path.insert(0, ROOT)
+
+def pct(xs: List[float], q: float) -> Optional[float]:
+    xs = sorted(xs)
+    return round(xs[min(len(xs) - 1, int(q * len(xs)))], 2) if xs else None
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Compare lexical, vector and hybrid KB retrieval.")
+    ap.add_argument("corpus", nargs="?", default=os.path.join(FIXTURES, "corpus"), help="directory of documents")
+    ap.add_argument("--queries", default=os.path.join(FIXTURES, "queries.json"))
+    ap.add_argument("-k", type=int, default=3, help="cut-off for recall@k")
+    ap.add_argument("--rounds", type=int, default=20, help="timed passes over the queries per mode")
+    ap.add_argument("--chunk-tokens", type=int, default=80,
+                    help="chunk size for the bench store; small, so a small corpus gives many chunks")
+    ap.add_argument("--keep-dir", help="store directory to use and keep (default: a temp dir)")
+    args = ap.parse_args(argv)
+
+    # the store location and chunk size are read at import time
+    work = args.keep_dir or tempfile.mkdtemp(prefix="kb-bench-")
+    os.environ["DATA_DIR"] = os.path.join(work, "data")
+    os.environ["CHROMA_DIR"] = os.path.join(work, "chroma")
+    os.environ["CHUNK_MAX_TOKENS"] = str(args.chunk_tokens)
+    os.environ["CHUNK_OVERLAP_TOKENS"] = str(args.chunk_tokens // 8)
+    os.makedirs(os.environ["DATA_DIR"], exist_ok=True)
+    from app import chunker, ingest, retrieval
+
+    user_id = "bench"
+    queries: List[Dict[str, Any]] = json.load(open(args.queries))
+    try:
+        n_chunks = 0
+        t0 = time.perf_counter()
+        for dirpath, _, files in os.walk(args.corpus):
+            for name in sorted(files):
+                chunks = chunker.chunk_file(os.path.join(dirpath, name), name, False)
+                if chunks:
+                    ingest.store_chunks(chunks, name, user_id, source=name)
+                    n_chunks += len(chunks)
+        print(f"ingested {n_chunks} chunks in {time.perf_counter() - t0:.1f}s; {len(queries)} queries, k={args.k}")
+
+        embed_ms, qvecs = [], []
+        for item in queries:
+            t = time.perf_counter()
+            qvecs.append(retrieval.embed_query(item["q"]))
+            embed_ms.append((time.perf_counter() - t) * 1000)
+
+        for mode in ("lexical", "vector", "hybrid"):
+            hits1 = hitsk = 0
+            rr = 0.0
+            lat: List[float] = []
+            for r in range(args.rounds):
+                for item, qvec in zip(queries, qvecs):
+                    t = time.perf_counter()
+                    picks = retrieval.search(item["q"], user_id, args.k, mode,
+                                             qvec=qvec if mode != "lexical" else None)
+                    lat.append((time.perf_counter() - t) * 1000)
+                    if r:
+                        continue
+                    titles = [meta.get("title") for _, meta, _ in picks]
+                    if item["doc"] in titles:
+                        rank = titles.index(item["doc"]) + 1
+                        hits1 += rank == 1
+                        hitsk += 1
+                        rr += 1.0 / rank
+            n = len(queries)
+            print(f"{mode:<8} recall@1 {hits1 / n:.2f}  recall@{args.k} {hitsk / n:.2f}  MRR {rr / n:.2f}  "
+                  f"latency p50 {pct(lat, 0.5)} ms  p95 {pct(lat, 0.95)} ms")
+        print(f"{'(embed)':<8} query embedding p50 {pct(embed_ms, 0.5)} ms  p95 {pct(embed_ms, 0.95)} ms "
+              f"(vector and hybrid pay this per uncached question)")
+    finally:
+        if not args.keep_dir:
+            shutil.rmtree(work, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
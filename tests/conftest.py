@@ -0,0 +1,13 @@
+import os, sys, tempfile
+
+# app.config reads the environment at import time: point all local state at a scratch
+# directory and give it placeholder keys (nothing here talks to Gemini or Slack).
+_tmp = tempfile.mkdtemp(prefix="workinflow-tests-")
+os.environ["GEMINI_API_KEY"] = "test"
+os.environ["DATA_DIR"] = os.path.join(_tmp, "data")
+os.environ["CHROMA_DIR"] = os.path.join(_tmp, "chroma")
+os.environ["TRIAGE"] = "false"
+os.environ["SLACK_BOT_TOKEN"] = "xoxb-test"
+os.makedirs(os.environ["DATA_DIR"], exist_ok=True)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
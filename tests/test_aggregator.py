@@ -0,0 +1,109 @@
+import threading, time, uuid
+import pytest
+
+from app import ai, config, summary_store
+from app.models import AISummary, Task
+from app.pm import aggregator
+from app.pm.base import PMProvider
+
+class FakeJira(PMProvider):
+    """Yields tasks the way JiraProvider does: a page at a time, optionally failing partway."""
+    name = "jira"
+
+    def __init__(self, n: int, fail_after: int = None):
+        run = uuid.uuid4().hex[:8]  # the summary store outlives a test; keep ids unique
+        self.tasks = [Task(provider="jira", id=f"{run}-{i}", key=f"ABC-{i}", title=f"Task {i}",
+                           description=f"Do thing {i}", status="todo", priority=("High" if i % 2 else "Low"))
+                      for i in range(n)]
+        self.fail_after = fail_after
+
+    def list_tasks(self, assignee_me: bool = True, limit: int = 50):
+        for i, t in enumerate(self.tasks[:limit]):
+            if i == self.fail_after:
+                raise RuntimeError("Jira went away")
+            yield t.copy()
+
+class FakeLLM:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def __call__(self, items, site="default"):
+        with self._lock:
+            self.batches.append([i["id"] for i in items])
+        time.sleep(self.delay)
+        return {i["id"]: AISummary(summary_160=i["subject"], importance="high", urgency="medium", actionable=True,
+                                   next_steps=[], suggested_due_iso=None, confidence=0.9) for i in items}
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(ai, "gemini_summarize_batch", fake)
+    return fake
+
+def _use(monkeypatch, *providers):
+    monkeypatch.setattr(aggregator, "active_providers", lambda: list(providers))
+
+def test_tasks_are_enriched_in_summary_batches(monkeypatch, llm):
+    monkeypatch.setattr(config, "SUMMARY_BATCH", 4)
+    _use(monkeypatch, FakeJira(10))
+    res = aggregator.list_tasks_all(limit_per_provider=30, deadline_s=5)
+    assert len(res.tasks) == 10
+    assert all(t.ai is not None for t in res.tasks)
+    assert sorted(len(b) for b in llm.batches) == [2, 4, 4]
+    assert (res.timings["enriched"], res.timings["heuristic"], res.timings["cached"]) == (10, 0, 0)
+    scores = [t.priority_score for t in res.tasks]
+    assert scores == sorted(scores, reverse=True)
+
+def test_limit_per_provider(monkeypatch, llm):
+    _use(monkeypatch, FakeJira(10))
+    assert len(aggregator.list_tasks_all(limit_per_provider=3, deadline_s=5).tasks) == 3
+
+def test_deadline_falls_back_to_heuristic_scores(monkeypatch):
+    slow = FakeLLM(delay=1.0)
+    monkeypatch.setattr(ai, "gemini_summarize_batch", slow)
+    _use(monkeypatch, FakeJira(6))
+    t0 = time.perf_counter()
+    res = aggregator.list_tasks_all(deadline_s=0.2)
+    assert time.perf_counter() - t0 < 0.9
+    assert len(res.tasks) == 6
+    assert res.timings["heuristic"] == 6
+    assert all(t.ai is None and t.priority_score is not None for t in res.tasks)
+    # heuristic scores still follow the provider priority label
+    assert {t.priority for t in res.tasks[:3]} == {"High"}
+
+def test_cached_summaries_skip_the_llm_with_one_lookup_per_page(monkeypatch, llm):
+    monkeypatch.setattr(config, "JIRA_PAGE_SIZE", 10)
+    jira = FakeJira(25)
+    _use(monkeypatch, jira)
+    aggregator.list_tasks_all(limit_per_provider=30, deadline_s=5)
+    n_llm = len(llm.batches)
+
+    lookups = []
+    real = summary_store.get_many
+
+    def counting(namespace, fingerprints):
+        lookups.append(len(fingerprints))
+        return real(namespace, fingerprints)
+    monkeypatch.setattr(summary_store, "get_many", counting)
+    res = aggregator.list_tasks_all(limit_per_provider=30, deadline_s=5)
+    assert len(llm.batches) == n_llm
+    assert res.timings["cached"] == 25
+    assert lookups == [10, 10, 5]
+
+def test_changed_task_is_resummarized(monkeypatch, llm):
+    jira = FakeJira(3)
+    _use(monkeypatch, jira)
+    aggregator.list_tasks_all(deadline_s=5)
+    jira.tasks[1] = jira.tasks[1].copy(update={"status": "blocked"})
+    llm.batches.clear()
+    res = aggregator.list_tasks_all(deadline_s=5)
+    assert llm.batches == [[f"jira:{jira.tasks[1].id}"]]
+    assert res.timings["cached"] == 2
+
+def test_provider_failure_keeps_tasks_yielded_so_far(monkeypatch, llm):
+    _use(monkeypatch, FakeJira(10, fail_after=7))
+    res = aggregator.list_tasks_all(deadline_s=5)
+    assert len(res.tasks) == 7
+    assert all(t.ai is not None for t in res.tasks)
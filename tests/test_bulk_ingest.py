@@ -0,0 +1,58 @@
+import hashlib, threading, uuid
+from concurrent.futures import Future
+
+import pytest
+
+from app import ai, aio, bulk_ingest, ingest, kb_docs, kb_store
+
+class InlinePool:
+    def submit(self, fn, *args):
+        fut = Future()
+        fut.set_result(fn(*args))
+        return fut
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    monkeypatch.setattr(aio, "cpu_pool", lambda: InlinePool())
+    monkeypatch.setattr(ai, "embed_batch",
+                        lambda texts: [[b / 255 for b in hashlib.sha256(t.encode()).digest()[:8]] for t in texts])
+
+def _corpus(tmp_path, files):
+    root = tmp_path / "docs"
+    root.mkdir()
+    for name, text in files.items():
+        (root / name).write_text(text)
+    return str(root)
+
+def _user():
+    return f"bulk-{uuid.uuid4().hex[:8]}"
+
+def test_identical_members_in_one_run_are_stored_once(tmp_path):
+    user = _user()
+    same = "Release checklist. Tag the build. Publish the notes.\n\n" * 5
+    root = _corpus(tmp_path, {"a.md": same, "b.md": same, "c.md": "Something else entirely. " * 20})
+    r = bulk_ingest.run(bulk_ingest.open_path(root, user))
+    assert r.status == "done"
+    assert (r.docs_done, r.docs_unchanged) == (2, 1)
+    doc_ids = {m["doc_id"] for m in kb_store.get(user, include=["metadatas"])["metadatas"]}
+    assert len(doc_ids) == 2
+
+def test_run_waits_for_an_upload_holding_the_same_source(tmp_path):
+    user = _user()
+    root = _corpus(tmp_path, {"a.md": "Alpha document. " * 20})
+    run_id = bulk_ingest.open_path(root, user)
+    lock = ingest.doc_lock(user, "a.md")
+    lock.acquire()
+    t = threading.Thread(target=bulk_ingest.run, args=(run_id,))
+    t.start()
+    try:
+        t.join(0.3)
+        assert t.is_alive()
+        assert kb_docs.by_source(user, "a.md") is None
+    finally:
+        lock.release()
+    t.join(10)
+    assert bulk_ingest.get(run_id).status == "done"
+    assert kb_docs.by_source(user, "a.md") is not None
+    assert lock.acquire(blocking=False)  # released after finish
+    lock.release()
@@ -0,0 +1,187 @@
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from app import ai, gmail_service, inbox_sync
+from app.models import AISummary
+
+class _Req:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self):
+        return self.fn()
+
+class _Batch:
+    def __init__(self, svc, callback):
+        self.svc, self.callback, self.reqs = svc, callback, []
+
+    def add(self, req, request_id):
+        self.reqs.append((request_id, req))
+
+    def execute(self):
+        self.svc.batch_sizes.append(len(self.reqs))
+        for rid, req in self.reqs:
+            try:
+                self.callback(rid, req.execute(), None)
+            except Exception as e:
+                self.callback(rid, None, e)
+
+class FakeGmail:
+    """The slice of the Gmail discovery client that gmail_service uses."""
+
+    def __init__(self, messages=None, history_id="100"):
+        self.store = {m["id"]: m for m in (messages or [])}
+        self.history_id = history_id
+        self.history_pages = []        # users.history.list responses, in page order
+        self.history_error = None      # raised by users.history.list, e.g. a 404
+        self.batch_sizes = []
+        self.get_kwargs = []
+        self.history_calls = []
+
+    def users(self):
+        return self
+
+    # users().messages()
+    def messages(self):
+        return self
+
+    def list(self, userId, maxResults=None, startHistoryId=None, pageToken=None, historyTypes=None):
+        if startHistoryId is not None:
+            return _Req(lambda: self._history(startHistoryId, pageToken))
+        newest = sorted(self.store.values(), key=lambda m: -int(m["internalDate"]))[:maxResults]
+        return _Req(lambda: {"messages": [{"id": m["id"], "threadId": m["threadId"]} for m in newest]})
+
+    def get(self, userId, id, format, metadataHeaders=None):
+        self.get_kwargs.append({"id": id, "format": format, "metadataHeaders": metadataHeaders})
+
+        def run():
+            if id not in self.store:
+                raise HttpError(httplib2.Response({"status": 404}), b"not found")
+            return self.store[id]
+        return _Req(run)
+
+    # users().history()
+    def history(self):
+        return self
+
+    def _history(self, start, token):
+        self.history_calls.append((start, token))
+        if self.history_error is not None:
+            raise self.history_error
+        return self.history_pages[int(token or 0)]
+
+    def getProfile(self, userId):
+        return _Req(lambda: {"historyId": self.history_id})
+
+    def new_batch_http_request(self, callback):
+        return _Batch(self, callback)
+
+def message(i: int, subject: str = None):
+    return {"id": f"m{i}", "threadId": f"t{i}", "snippet": f"snippet {i}", "internalDate": str(1_000_000 + i),
+            "labelIds": ["INBOX"],
+            "payload": {"headers": [{"name": "Subject", "value": subject or f"Subject {i}"},
+                                    {"name": "From", "value": f"person{i}@example.com"}]}}
+
+@pytest.fixture
+def fake(monkeypatch):
+    svc = FakeGmail([message(i) for i in range(5)])
+    monkeypatch.setattr(gmail_service, "gmail_service", lambda: svc)
+    return svc
+
+@pytest.fixture
+def summarize(monkeypatch):
+    calls = []
+
+    def fake_batch(items, site="default"):
+        calls.append([i["id"] for i in items])
+        return {i["id"]: AISummary(summary_160=f"about {i['subject']}", importance="medium", urgency="low",
+                                   actionable=False, next_steps=[], suggested_due_iso=None, confidence=0.9)
+                for i in items}
+    monkeypatch.setattr(ai, "gemini_summarize_batch", fake_batch)
+    return calls
+
+@pytest.fixture
+def empty_index():
+    with inbox_sync._lock:
+        inbox_sync._conn.execute("DELETE FROM messages")
+        inbox_sync._conn.execute("DELETE FROM sync_state")
+
+def _ids():
+    with inbox_sync._lock:
+        return {r[0] for r in inbox_sync._conn.execute("SELECT id FROM messages")}
+
+# ---------- batch fetch ----------
+def test_batch_fetch_splits_at_batch_limit_and_keeps_order(monkeypatch):
+    svc = FakeGmail([message(i) for i in range(120)])
+    monkeypatch.setattr(gmail_service, "gmail_service", lambda: svc)
+    ids = [f"m{i}" for i in reversed(range(120))]
+    got = gmail_service.get_messages_batch(ids)
+    assert svc.batch_sizes == [50, 50, 20]
+    assert [m["id"] for m in got] == ids
+
+def test_batch_fetch_asks_for_metadata_headers_only(fake):
+    gmail_service.get_messages_batch(["m1"])
+    assert fake.get_kwargs == [{"id": "m1", "format": "metadata", "metadataHeaders": gmail_service.METADATA_HEADERS}]
+
+def test_batch_fetch_failed_message_is_none(fake):
+    got = gmail_service.get_messages_batch(["m1", "gone", "m2"])
+    assert got[0]["id"] == "m1" and got[1] is None and got[2]["id"] == "m2"
+
+# ---------- history ----------
+def test_list_history_follows_pages_and_drops_deleted(fake):
+    fake.history_pages = [
+        {"history": [{"messagesAdded": [{"message": {"id": "a"}}, {"message": {"id": "b"}}]}],
+         "nextPageToken": "1", "historyId": "150"},
+        {"history": [{"messagesAdded": [{"message": {"id": "a"}}, {"message": {"id": "c"}}]},
+                     {"messagesDeleted": [{"message": {"id": "b"}}]}], "historyId": "160"},
+    ]
+    added, deleted, latest = gmail_service.list_history("100")
+    assert added == ["a", "c"]
+    assert deleted == ["b"]
+    assert latest == "160"
+    assert fake.history_calls == [("100", None), ("100", "1")]
+
+# ---------- inbox_sync ----------
+def test_first_sync_is_full(fake, summarize, empty_index):
+    res = inbox_sync.sync_once()
+    assert res["mode"] == "full" and res["added"] == 5
+    assert _ids() == {f"m{i}" for i in range(5)}
+    assert inbox_sync._get_state("history_id") == "100"
+
+def test_delta_sync_applies_adds_and_deletes(fake, summarize, empty_index):
+    inbox_sync.sync_once()
+    fake.store["m9"] = message(9)
+    fake.history_pages = [{"history": [{"messagesAdded": [{"message": {"id": "m9"}}]},
+                                       {"messagesDeleted": [{"message": {"id": "m0"}}]}], "historyId": "120"}]
+    res = inbox_sync.sync_once()
+    assert (res["mode"], res["added"], res["deleted"]) == ("delta", 1, 1)
+    assert fake.history_calls == [("100", None)]
+    assert summarize[-1] == ["m9"]  # the rest were summarized on the first sync
+    assert _ids() == {"m1", "m2", "m3", "m4", "m9"}
+    assert inbox_sync._get_state("history_id") == "120"
+
+def test_expired_history_falls_back_to_full_sync(fake, summarize, empty_index):
+    inbox_sync.sync_once()
+    del fake.store["m0"]
+    fake.history_id = "500"
+    fake.history_error = HttpError(httplib2.Response({"status": 404}), b"history too old")
+    res = inbox_sync.sync_once()
+    assert res["mode"] == "full"
+    assert _ids() == {"m1", "m2", "m3", "m4"}  # the full listing replaces the index
+    assert inbox_sync._get_state("history_id") == "500"
+
+def test_other_history_errors_propagate(fake, summarize, empty_index):
+    inbox_sync.sync_once()
+    fake.history_error = HttpError(httplib2.Response({"status": 500}), b"boom")
+    with pytest.raises(HttpError):
+        inbox_sync.sync_once()
+    assert inbox_sync._get_state("history_id") == "100"
+
+def test_recent_items_cold_start_syncs_and_serves_from_index(fake, summarize, empty_index):
+    items = inbox_sync.recent_items(max_results=3)
+    assert {i.id for i in items} == {"m4", "m3", "m2"}
+    assert all(i.ai is not None for i in items)
+    fake.history_error = RuntimeError("warm reads must not call Gmail")
+    fake.store.clear()
+    assert [i.id for i in inbox_sync.recent_items(max_results=3)] == [i.id for i in items]
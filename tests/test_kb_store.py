@@ -0,0 +1,22 @@
+import pytest
+
+from app import config, kb_store
+
+class FlakyBackend(kb_store.ChromaBackend):
+    """Lists a shard that is gone by the time it is opened."""
+
+    def names(self):
+        return super().names() + [f"{config.KB_COLLECTION}-gone"]
+
+def test_shards_skips_shards_that_fail_to_open(monkeypatch):
+    kb_store.add("alice", ["a1"], ["hello"], [{"user_id": "alice"}], [[0.1, 0.2, 0.3]])
+    monkeypatch.setattr(kb_store, "backend", FlakyBackend())
+    shards = list(kb_store._shards())
+    assert shards and all(s is not None for s in shards)
+    assert sum(s.count() for s in shards) >= 1
+
+def test_interfaces_are_abstract():
+    with pytest.raises(TypeError):
+        kb_store.Shard()
+    with pytest.raises(TypeError):
+        kb_store.Backend()
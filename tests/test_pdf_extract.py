@@ -0,0 +1,61 @@
+from concurrent.futures import Future
+
+import pytest
+from pypdf import PdfWriter
+
+from app import aio, chunker, ingest, utils
+
+class RecordingPool:
+    """Runs submitted work inline and records each task's arguments."""
+
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, fn, *args):
+        self.tasks.append((fn.__name__, args))
+        fut = Future()
+        fut.set_result(fn(*args))
+        return fut
+
+@pytest.fixture
+def pool(monkeypatch):
+    p = RecordingPool()
+    monkeypatch.setattr(aio, "cpu_pool", lambda: p)
+    return p
+
+def blank_pdf(tmp_path, pages: int) -> str:
+    w = PdfWriter()
+    for _ in range(pages):
+        w.add_blank_page(width=200, height=200)
+    path = str(tmp_path / f"{pages}.pdf")
+    with open(path, "wb") as f:
+        w.write(f)
+    return path
+
+def test_large_pdf_is_split_into_page_ranges(tmp_path, pool):
+    n = utils.PDF_PARALLEL_MIN_PAGES
+    pages = list(utils.iter_pdf_pages(blank_pdf(tmp_path, n)))
+    assert len(pages) == n
+    ranges = [args[1:] for name, args in pool.tasks if name == "_pdf_pages"]
+    assert len(ranges) > 1
+    assert ranges[0][0] == 0 and ranges[-1][1] == n
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))  # contiguous, in order
+
+def test_small_pdf_is_one_pool_task(tmp_path, pool):
+    list(utils.iter_pdf_pages(blank_pdf(tmp_path, 3)))
+    assert [args[1:] for _, args in pool.tasks] == [(0, 3)]
+
+def test_inside_a_worker_extracts_inline(tmp_path, pool):
+    assert len(list(utils.iter_pdf_pages(blank_pdf(tmp_path, 30), parallel=False))) == 30
+    assert pool.tasks == []
+
+def test_upload_chunking_fans_pdf_pages_out(tmp_path, pool):
+    ingest.chunk_file(blank_pdf(tmp_path, utils.PDF_PARALLEL_MIN_PAGES), "big.pdf")
+    assert sum(1 for name, _ in pool.tasks if name == "_pdf_pages") > 1
+
+def test_upload_chunking_parses_text_in_one_worker(tmp_path, pool):
+    path = tmp_path / "notes.txt"
+    path.write_text("First sentence. Second sentence.\n\nNext paragraph.")
+    chunks = ingest.chunk_file(str(path), "notes.txt")
+    assert [name for name, _ in pool.tasks] == ["chunk_file"]
+    assert chunks and isinstance(chunks[0], chunker.Chunk)
@@ -0,0 +1,36 @@
+import pytest
+from fastapi import HTTPException
+from slack_sdk.errors import SlackApiError
+
+from app import slack_delivery, slack_service
+
+@pytest.fixture
+def slack(monkeypatch):
+    sent = []
+
+    def user_id(name):
+        if name == "flaky":
+            raise SlackApiError("users.list failed", {"ok": False, "error": "internal_error"})
+        return {"alice": "U1"}.get(name)
+
+    monkeypatch.setattr(slack_service, "find_user_id_by_name", user_id)
+    monkeypatch.setattr(slack_service, "get_channel_id_by_name", lambda name: {"general": "C1"}.get(name))
+    monkeypatch.setattr(slack_service, "send_message_user",
+                        lambda uid, text: sent.append(uid) or {"channel": "D" + uid, "ts": "1.0"})
+    monkeypatch.setattr(slack_service, "send_message_channel",
+                        lambda cid, text, thread_ts=None: sent.append(cid) or {"channel": cid, "ts": "2.0"})
+    monkeypatch.setattr(slack_service, "permalink", lambda ch, ts: f"https://slack/{ch}/{ts}")
+    return sent
+
+def test_lookup_failure_is_reported_per_target(slack):
+    out = slack_delivery.deliver([{"type": "user", "name": "flaky"}, {"type": "channel", "name": "general"}], "hi")
+    assert out[0]["ok"] is False and "users.list failed" in out[0]["error"]
+    assert "resolve_ms" in out[0]["timing"] and "send_ms" not in out[0]["timing"]
+    assert out[1]["ok"] is True and out[1]["permalink"] == "https://slack/C1/2.0"
+    assert slack == ["C1"]  # nothing sent for the failed target
+
+def test_unknown_target_still_fails_the_request(slack):
+    with pytest.raises(HTTPException) as e:
+        slack_delivery.deliver([{"type": "user", "name": "alice"}, {"type": "user", "name": "nobody"}], "hi")
+    assert e.value.status_code == 404
+    assert slack == []
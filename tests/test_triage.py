@@ -0,0 +1,52 @@
+from app import triage
+
+def _mail(**kw):
+    return {"id": kw.pop("id", "x"), "subject": "", "sender": "", "snippet": "", "labels": [], "headers": {}, **kw}
+
+def test_calendar_invite_stays_local():
+    v = triage.classify(_mail(subject="Invitation: Design review @ Tue 3pm",
+                              sender="Dana <calendar-notification@google.com>", labels=["INBOX"]))
+    assert v is not None and v.kind == "Calendar"
+
+def test_calendar_response_with_auto_submitted_stays_local():
+    v = triage.classify(_mail(subject="Accepted: Design review", sender="dana@example.com",
+                              headers={"Auto-Submitted": "auto-generated"}))
+    assert v is not None and v.kind == "Calendar"
+
+def test_security_alert_escalates():
+    assert triage.classify(_mail(subject="Security alert: new sign-in", sender="no-reply@accounts.example.com",
+                                 labels=["CATEGORY_UPDATES"])) is None
+
+def test_bounce_escalates():
+    assert triage.classify(_mail(subject="Delivery Status Notification (Failure)",
+                                 sender="MAILER-DAEMON@example.com")) is None
+
+def test_promotion_stays_local():
+    v = triage.classify(_mail(subject="50% off this weekend", sender="news@shop.example.com",
+                              labels=["CATEGORY_PROMOTIONS"], headers={"List-Unsubscribe": "<mailto:u@shop>"}))
+    assert v is not None and v.kind == "Promotion"
+
+def test_urgent_invite_escalates():
+    assert triage.classify(_mail(subject="Invitation: urgent outage bridge", snippet="join asap",
+                                 sender="calendar-notification@google.com")) is None
+
+def _examples():
+    with triage._lock:
+        return triage._conn.execute("SELECT COUNT(*) FROM examples").fetchone()[0]
+
+def _summary():
+    from app.models import AISummary
+    return AISummary(summary_160="s", importance="low", urgency="low", actionable=False, next_steps=[],
+                     suggested_due_iso=None, confidence=0.9)
+
+def test_observe_records_fetched_mail():
+    n = _examples()
+    triage.observe(_mail(id="fetched-1", subject="Hello"), _summary())
+    assert _examples() == n + 1
+
+def test_observe_skips_rows_without_triage_signals():
+    n = _examples()
+    # what inbox_sync._backfill rebuilds from the index: no labels, no headers
+    triage.observe({"id": "backfill-1", "thread_id": "t", "subject": "Hi", "sender": "a@b.c", "snippet": "",
+                    "internal_ts": 0}, _summary())
+    assert _examples() == n